@@ -12,6 +12,12 @@ from config import Config
 from models import db, User, Location, Item, InventoryItem, Inventory, InventoryDetail, AuditLog, PasswordResetToken
 from forms import LoginForm, UserForm, LocationForm, ItemForm, InventoryItemForm, InventoryForm, SearchForm
 from routes import main_bp, admin_bp, inventory_bp, attendance_bp
+from attendance_service import badge_index
+from search import search_backend_for, search_index
+from result_cache import result_cache
+from compression import init_compression
+from assets import init_assets
+from template_cache import init_template_cache
 
 def create_app():
     app = Flask(__name__)
@@ -43,6 +49,19 @@ def create_app():
     app.register_blueprint(inventory_bp, url_prefix='/inventory')
     app.register_blueprint(attendance_bp, url_prefix='/attendance')
     
+    # Kiosk check-in badge index
+    badge_index.ttl = app.config['BADGE_INDEX_TTL']
+    
+    # Indexed text search for the configured database
+    if not app.config.get('SEARCH_BACKEND'):
+        app.config['SEARCH_BACKEND'] = search_backend_for(app.config['SQLALCHEMY_DATABASE_URI'])
+    search_index.ttl = app.config['SEARCH_INDEX_TTL']
+    result_cache.configure(app.config['RESULT_CACHE_SIZE'], app.config['RESULT_CACHE_TTL'],
+                           app.config.get('RESULT_CACHE_DIR'))
+    init_compression(app)
+    init_assets(app)
+    init_template_cache(app)
+    
     # Initialize database
     with app.app_context():
         try:
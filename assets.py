@@ -0,0 +1,67 @@
+"""
+Fingerprinted static assets for the EMS Inventory System
+
+At startup every file under static/ is hashed, and url_for('static', ...)
+links to a name carrying the hash (js/app.js -> js/app.3f9c0a1b2d4e.js).
+Those URLs change whenever the file does, so they are served with a
+one-year ``immutable`` Cache-Control and browsers never ask for them
+again. Plain names keep working and are revalidated as before.
+
+There is no build step: the manifest is rebuilt each time the app starts,
+so a deploy picks up changed files on its own.
+"""
+
+import hashlib
+import os
+
+from flask import current_app, send_from_directory
+
+HASH_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # one year, in seconds
+
+class AssetManifest:
+    """Static file names and their fingerprinted names"""
+
+    def __init__(self):
+        self.hashed = {}   # 'js/app.js' -> 'js/app.<hash>.js'
+        self.sources = {}  # and back
+
+    def build(self, static_folder):
+        hashed = {}
+        for dirpath, _, filenames in os.walk(static_folder):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+                stem, ext = os.path.splitext(name)
+                hashed[name] = f'{stem}.{digest}{ext}'
+
+        self.hashed = hashed
+        self.sources = {fingerprinted: name for name, fingerprinted in hashed.items()}
+        return len(hashed)
+
+asset_manifest = AssetManifest()
+
+def serve_static(filename):
+    """The app's static view: fingerprinted names are cached for good"""
+    source = asset_manifest.sources.get(filename)
+    if source is None:
+        return current_app.send_static_file(filename)
+
+    response = send_from_directory(current_app.static_folder, source, max_age=IMMUTABLE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
+def init_assets(app):
+    # In debug, files change under a running server, so links stay plain
+    if app.debug or not app.config['ASSET_FINGERPRINTS']:
+        return
+
+    asset_manifest.build(app.static_folder)
+    app.view_functions['static'] = serve_static
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = asset_manifest.hashed.get(values['filename'], values['filename'])
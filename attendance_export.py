@@ -0,0 +1,114 @@
+"""
+Attendance exports for the EMS Inventory System
+
+Exports are generated row by row: records are read in batches with
+``yield_per`` and written out as they arrive, so a multi-year export holds
+one batch in memory rather than the whole result. CSV is streamed straight
+to the client. XLSX (which needs openpyxl) is built with a write-only
+workbook, which spools rows to a temporary file, and that file is then sent
+in chunks.
+"""
+
+import csv
+import os
+import tempfile
+from collections import namedtuple
+from io import StringIO
+
+from models import db, AttendanceRecord, Event, Member
+from attendance_stats import member_summary
+
+EXPORT_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+ExportTable = namedtuple('ExportTable', 'name header rows')
+
+RECORD_HEADER = ['Date', 'Event', 'Type', 'Badge #', 'Last Name', 'First Name',
+                 'Status', 'Method', 'Check-In Time', 'Check-Out Time', 'Notes']
+
+SUMMARY_HEADER = ['Member', 'Badge #', 'Events Held', 'Attended', 'Excused', 'Absent',
+                  'Attendance %', 'Hours', 'Current Streak', 'Longest Streak']
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else ''
+
+def record_rows(org_id, start=None, end=None, member_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """Attendance records matching the report filters, oldest event first"""
+    query = db.session.query(
+        Event.starts_at, Event.title, Event.type,
+        Member.badge_number, Member.last_name, Member.first_name,
+        AttendanceRecord.status, AttendanceRecord.method,
+        AttendanceRecord.check_in_time, AttendanceRecord.check_out_time, AttendanceRecord.notes
+    ).join(
+        Event, AttendanceRecord.event_id == Event.id
+    ).join(
+        Member, AttendanceRecord.member_id == Member.id
+    ).filter(AttendanceRecord.org_id == org_id)
+    if member_id:
+        query = query.filter(AttendanceRecord.member_id == member_id)
+    if start:
+        query = query.filter(Event.starts_at >= start)
+    if end:
+        query = query.filter(Event.starts_at <= end)
+    query = query.order_by(Event.starts_at, Event.id, Member.last_name, Member.first_name)
+
+    for (starts_at, title, event_type, badge_number, last_name, first_name,
+         status, method, check_in_time, check_out_time, notes) in query.yield_per(batch_size):
+        yield [starts_at.strftime('%Y-%m-%d %H:%M'), title, event_type, badge_number or '',
+               last_name, first_name, status, method,
+               _format_time(check_in_time), _format_time(check_out_time), notes or '']
+
+def summary_rows(org_id, start=None, end=None, member_id=None):
+    """Per-member attendance statistics for the report filters"""
+    for row in member_summary(org_id, start, end, member_id=member_id):
+        yield [row.name, row.badge_number or '', row.events_held, row.attended, row.excused,
+               row.absent, row.attendance_rate, row.hours, row.current_streak, row.longest_streak]
+
+def records_table(org_id, start=None, end=None, member_id=None):
+    return ExportTable('Attendance Records', RECORD_HEADER, record_rows(org_id, start, end, member_id))
+
+def summary_table(org_id, start=None, end=None, member_id=None):
+    return ExportTable('Member Summary', SUMMARY_HEADER, summary_rows(org_id, start, end, member_id))
+
+def iter_csv(table):
+    """CSV text of an ExportTable, yielded in chunks of roughly CHUNK_SIZE"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(table.header)
+    for row in table.rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def xlsx_available():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def iter_xlsx(table):
+    """XLSX bytes of an ExportTable, yielded in chunks of CHUNK_SIZE"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(table.name)
+    sheet.append(table.header)
+    for row in table.rows:
+        sheet.append(row)
+
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            workbook.save(output)
+        with open(path, 'rb') as output:
+            while True:
+                chunk = output.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
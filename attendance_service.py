@@ -0,0 +1,230 @@
+"""
+Attendance recording for the EMS Inventory System
+
+Check-ins are written with a single INSERT ... ON CONFLICT DO UPDATE against
+the unique (event_id, member_id) constraint, so simultaneous taps for the
+same member can never create duplicate records and each batch of check-ins
+costs one statement (two when it mixes set statuses with plain check-ins).
+The statement returns the member's name alongside the record, so callers
+don't have to load the Member afterwards.
+
+Kiosk check-ins resolve badge numbers from an in-process BadgeIndex, so a
+scan costs the upsert and nothing else.
+
+QR check-ins carry a signed token naming the event and its validity window,
+so a scan is verified with an HMAC and a clock comparison, no database read.
+"""
+
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select, case, literal, literal_column, func, event
+
+from models import db, AttendanceRecord, Member, dialect_insert
+from attendance_stats import refresh_rollups
+
+ATTENDANCE_STATUSES = ('present', 'late', 'excused', 'absent')
+CHECK_IN_METHODS = ('roster', 'qr', 'pin', 'kiosk', 'admin')
+
+UpsertedAttendance = namedtuple('UpsertedAttendance', 'record_id member_id status member_name created')
+
+def upsert_attendance(org_id, event_id, entries, user_id=None):
+    """Create or update attendance records for one event (the caller commits).
+
+    ``entries`` is a list of dicts with member_id and optional status, method
+    and notes. If a member appears more than once, the last entry wins.
+    An entry without a status records the member as present, but on an
+    existing record it only replaces 'absent', so a check-in never
+    downgrades 'late' or 'excused'. Empty notes keep the existing notes.
+    Members marked present get a check-in time unless they already have one.
+    Returns an UpsertedAttendance per member, in the order given.
+    """
+    now = datetime.utcnow()
+    rows = {}
+    explicit = {}
+    for entry in entries:
+        status = entry.get('status') or 'present'
+        method = entry.get('method') or 'admin'
+        if status not in ATTENDANCE_STATUSES:
+            raise ValueError(f'Unknown attendance status: {status}')
+        if method not in CHECK_IN_METHODS:
+            raise ValueError(f'Unknown check-in method: {method}')
+
+        member_id = int(entry['member_id'])
+        rows.pop(member_id, None)
+        rows[member_id] = {
+            'org_id': org_id,
+            'event_id': event_id,
+            'member_id': member_id,
+            'status': status,
+            'method': method,
+            'notes': entry.get('notes') or '',
+            'check_in_time': now if status == 'present' else None,
+            'created_by': user_id,
+            'created_at': now,
+            'updated_at': now,
+        }
+        explicit[member_id] = bool(entry.get('status'))
+    if not rows:
+        return []
+
+    results = {}
+    # One statement per kind of entry, since they update status differently
+    for explicit_status in (True, False):
+        batch = [row for member_id, row in rows.items() if explicit[member_id] == explicit_status]
+        if batch:
+            for record_id, member_id, status, created_at, name in db.session.execute(
+                    _upsert_statement(batch, explicit_status)):
+                # Updated rows keep their original created_at
+                results[member_id] = UpsertedAttendance(record_id, member_id, status, name, created_at == now)
+
+    refresh_rollups(org_id, [event_id], member_ids=list(rows))
+
+    return [results[member_id] for member_id in rows if member_id in results]
+
+def _upsert_statement(rows, explicit_status):
+    table = AttendanceRecord.__table__
+    # RETURNING is rendered without table qualifiers, so the correlation to
+    # the upserted row is spelled out
+    member_name = select(
+        Member.first_name + literal(' ') + Member.last_name
+    ).select_from(Member.__table__).where(
+        literal_column('member.id') == literal_column('attendance_record.member_id')
+    ).scalar_subquery()
+
+    stmt = dialect_insert()(table).values(rows)
+    if explicit_status:
+        status = stmt.excluded.status
+    else:
+        status = case((table.c.status == 'absent', stmt.excluded.status), else_=table.c.status)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.event_id, table.c.member_id],
+        set_={
+            'status': status,
+            'method': stmt.excluded.method,
+            'notes': func.coalesce(func.nullif(stmt.excluded.notes, ''), table.c.notes),
+            'updated_at': stmt.excluded.updated_at,
+            # Keep the first check-in time
+            'check_in_time': case(
+                (table.c.check_in_time.is_(None), stmt.excluded.check_in_time),
+                else_=table.c.check_in_time
+            ),
+        }
+    ).returning(
+        table.c.id, table.c.member_id, table.c.status, table.c.created_at, member_name
+    )
+
+KioskMember = namedtuple('KioskMember', 'member_id org_id name')
+
+def normalize_badge(badge_number):
+    return (badge_number or '').strip().upper()
+
+class BadgeIndex:
+    """Badge number to member lookup held in memory.
+
+    Member writes in this process invalidate the index immediately. Changes
+    made by other workers are picked up when the index revalidates, at most
+    every ``ttl`` seconds, by comparing the member count and newest
+    updated_at with the values it was built from.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._members = {}
+        self._signature = None
+        self._checked_at = 0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._stale = True
+
+    def lookup(self, org_id, badge_number):
+        """KioskMember for an active member's badge, or None"""
+        self._refresh()
+        return self._members.get((org_id, normalize_badge(badge_number)))
+
+    def _refresh(self):
+        if not self._stale and time.monotonic() - self._checked_at < self.ttl:
+            return
+
+        with self._lock:
+            if not self._stale and time.monotonic() - self._checked_at < self.ttl:
+                return
+            rebuild = self._stale
+            # Cleared before reading, so an invalidation during the rebuild
+            # triggers another one
+            self._stale = False
+
+            signature = tuple(db.session.query(func.count(Member.id), func.max(Member.updated_at)).one())
+            if rebuild or signature != self._signature:
+                rows = db.session.query(
+                    Member.id, Member.org_id, Member.badge_number, Member.first_name, Member.last_name
+                ).filter(
+                    Member.deleted_at == None,
+                    Member.is_active == True,
+                    Member.badge_number != None
+                ).all()
+                self._members = {
+                    (org_id, normalize_badge(badge)): KioskMember(member_id, org_id, f'{first_name} {last_name}')
+                    for member_id, org_id, badge, first_name, last_name in rows
+                    if normalize_badge(badge)
+                }
+                self._signature = signature
+            self._checked_at = time.monotonic()
+
+QrClaims = namedtuple('QrClaims', 'event_id org_id not_before expires')
+
+def _qr_signing_key(secret_key):
+    # Derived so QR signatures can't be replayed against other uses of SECRET_KEY
+    return hmac.new(secret_key.encode(), b'attendance-qr-token', hashlib.sha256).digest()
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def make_qr_token(secret_key, event_id, org_id, not_before, expires):
+    """Signed check-in token for an event, valid between two Unix timestamps"""
+    payload = f'{event_id}:{org_id}:{int(not_before)}:{int(expires)}'.encode()
+    signature = hmac.new(_qr_signing_key(secret_key), payload, hashlib.sha256).digest()[:16]
+    return f'{_b64encode(payload)}.{_b64encode(signature)}'
+
+def verify_qr_token(secret_key, token, now=None):
+    """Return the QrClaims of a valid token; raise ValueError otherwise"""
+    try:
+        payload_part, signature_part = token.split('.')
+        payload = _b64decode(payload_part)
+        signature = _b64decode(signature_part)
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError('Invalid check-in code')
+
+    expected = hmac.new(_qr_signing_key(secret_key), payload, hashlib.sha256).digest()[:16]
+    if not hmac.compare_digest(signature, expected):
+        raise ValueError('Invalid check-in code')
+
+    try:
+        claims = QrClaims(*(int(part) for part in payload.decode().split(':')))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid check-in code')
+
+    now = time.time() if now is None else now
+    if now < claims.not_before:
+        raise ValueError('Check-in for this event has not opened yet')
+    if now > claims.expires:
+        raise ValueError('This check-in code has expired')
+    return claims
+
+badge_index = BadgeIndex()
+
+@event.listens_for(Member, 'after_insert')
+@event.listens_for(Member, 'after_update')
+@event.listens_for(Member, 'after_delete')
+def _member_changed(mapper, connection, target):
+    badge_index.invalidate()
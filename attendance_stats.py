@@ -0,0 +1,411 @@
+"""
+Attendance statistics for the EMS Inventory System
+
+Per-member attendance rates, hours and event-type breakdowns are computed in
+the database with GROUP BY queries and returned as compact rows, so reports
+never load AttendanceRecord objects. Streaks need event order, so they are
+worked out in Python from (member_id, event_id) pairs only.
+
+AttendanceRollup keeps per member, month and event type totals. Every
+attendance upsert recomputes the cells it touches, and reports spanning at
+least ROLLUP_MIN_RANGE_DAYS read whole months from the rollups and only the
+partial months at either end from the raw records.
+
+The member x event attendance matrix is pivoted with NumPy from a single
+columnar fetch of (member_id, event_id, status).
+"""
+
+from collections import namedtuple, defaultdict
+from datetime import datetime, date, timedelta
+
+import numpy as np
+from sqlalchemy import func, case, and_
+
+from models import db, AttendanceRecord, AttendanceRollup, Event, Member, dialect_insert
+
+# Report ranges at least this long read whole months from the rollup table
+ROLLUP_MIN_RANGE_DAYS = 90
+
+# Statuses that count as having attended an event
+ATTENDED_STATUSES = ('present', 'late')
+
+MemberAttendanceRow = namedtuple(
+    'MemberAttendanceRow',
+    'member_id name badge_number events_held attended excused absent attendance_rate hours '
+    'current_streak longest_streak'
+)
+EventTypeRow = namedtuple('EventTypeRow', 'event_type events attended excused absent hours')
+
+def hours_between(end, start):
+    """SQL expression for the hours between two datetime columns"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.extract('epoch', end - start) / 3600.0
+    return (func.julianday(end) - func.julianday(start)) * 24.0
+
+def attended_hours():
+    """SQL expression for the hours a record counts towards.
+
+    Uses the member's own check-in/check-out times when both are recorded,
+    otherwise the event's start and end; 0 if neither is known or the member
+    didn't attend.
+    """
+    return case(
+        (AttendanceRecord.status.notin_(ATTENDED_STATUSES), 0.0),
+        (and_(AttendanceRecord.check_in_time != None, AttendanceRecord.check_out_time != None),
+         hours_between(AttendanceRecord.check_out_time, AttendanceRecord.check_in_time)),
+        (Event.ends_at != None, hours_between(Event.ends_at, Event.starts_at)),
+        else_=0.0
+    )
+
+def _event_filters(org_id, start=None, end=None, event_type=None):
+    filters = [Event.org_id == org_id, Event.deleted_at == None]
+    if start:
+        filters.append(Event.starts_at >= start)
+    if end:
+        filters.append(Event.starts_at <= end)
+    if event_type:
+        filters.append(Event.type == event_type)
+    return filters
+
+def _status_count(*statuses):
+    return func.sum(case((AttendanceRecord.status.in_(statuses), 1), else_=0))
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+def _next_month(month):
+    return date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+def _split_range(start, end):
+    """Split a report range into whole months and the partial ranges around them.
+
+    Returns ((first_month, end_month) or None, [(start, end), ...]) where
+    end_month is exclusive and the partial ranges are inclusive datetimes.
+    """
+    after_end = end + timedelta(microseconds=1)
+    first = start if start is None or (start.day == 1 and start.time() == datetime.min.time()) \
+        else datetime.combine(_next_month(month_start(start)), datetime.min.time())
+    last = datetime.combine(month_start(after_end), datetime.min.time())
+
+    if first is not None and first >= last:
+        return None, [(start, end)]
+
+    partial = []
+    if first is not None and start < first:
+        partial.append((start, first - timedelta(microseconds=1)))
+    if last <= end:
+        partial.append((last, end))
+    return (first.date() if first else None, last.date()), partial
+
+def _use_rollups(start, end):
+    return start is None or (end - start).days >= ROLLUP_MIN_RANGE_DAYS
+
+def _raw_totals(by, org_id, start, end, event_type=None, member_id=None):
+    """{key: [attended, excused, absent, hours]} from the raw records.
+
+    ``by`` is 'member' (keyed by member_id) or 'event_type'.
+    """
+    key = AttendanceRecord.member_id if by == 'member' else Event.type
+    query = db.session.query(
+        key,
+        _status_count(*ATTENDED_STATUSES),
+        _status_count('excused'),
+        _status_count('absent'),
+        func.sum(attended_hours())
+    ).join(
+        Event, AttendanceRecord.event_id == Event.id
+    ).filter(
+        AttendanceRecord.org_id == org_id,
+        *_event_filters(org_id, start, end, event_type)
+    )
+    if member_id:
+        query = query.filter(AttendanceRecord.member_id == member_id)
+    return {
+        row_key: [int(attended or 0), int(excused or 0), int(absent or 0), float(hours or 0)]
+        for row_key, attended, excused, absent, hours in query.group_by(key)
+    }
+
+def _rollup_totals(by, org_id, first_month, end_month, event_type=None, member_id=None):
+    """{key: [attended, excused, absent, hours]} from the rollup table"""
+    key = AttendanceRollup.member_id if by == 'member' else AttendanceRollup.event_type
+    query = db.session.query(
+        key,
+        func.sum(AttendanceRollup.attended),
+        func.sum(AttendanceRollup.excused),
+        func.sum(AttendanceRollup.absent),
+        func.sum(AttendanceRollup.hours)
+    ).filter(
+        AttendanceRollup.org_id == org_id,
+        AttendanceRollup.month < end_month
+    )
+    if first_month:
+        query = query.filter(AttendanceRollup.month >= first_month)
+    if event_type:
+        query = query.filter(AttendanceRollup.event_type == event_type)
+    if member_id:
+        query = query.filter(AttendanceRollup.member_id == member_id)
+    return {
+        row_key: [int(attended or 0), int(excused or 0), int(absent or 0), float(hours or 0)]
+        for row_key, attended, excused, absent, hours in query.group_by(key)
+    }
+
+def _totals(by, org_id, start, end, event_type=None, member_id=None):
+    """Totals keyed per ``by``, and whether the rollups were used.
+
+    Wide ranges read whole months from the rollups and add the partial
+    months at either end from the raw records.
+    """
+    months, partial = _split_range(start, end) if _use_rollups(start, end) else (None, None)
+    if months is None:
+        return _raw_totals(by, org_id, start, end, event_type, member_id), False
+
+    totals = _rollup_totals(by, org_id, months[0], months[1], event_type, member_id)
+    for partial_start, partial_end in partial:
+        for row_key, values in _raw_totals(by, org_id, partial_start, partial_end,
+                                           event_type, member_id).items():
+            merged = totals.setdefault(row_key, [0, 0, 0, 0.0])
+            for index, value in enumerate(values):
+                merged[index] += value
+    return totals, True
+
+def _streaks(org_id, start, end, event_type, member_ids):
+    """(current, longest) run of consecutive attended events per member"""
+    event_ids = [event_id for (event_id,) in db.session.query(Event.id).filter(
+        *_event_filters(org_id, start, end, event_type)
+    ).order_by(Event.starts_at, Event.id)]
+
+    attended = defaultdict(set)
+    pairs = db.session.query(AttendanceRecord.member_id, AttendanceRecord.event_id).join(
+        Event, AttendanceRecord.event_id == Event.id
+    ).filter(
+        *_event_filters(org_id, start, end, event_type),
+        AttendanceRecord.status.in_(ATTENDED_STATUSES)
+    )
+    if len(member_ids) == 1:
+        pairs = pairs.filter(AttendanceRecord.member_id == member_ids[0])
+    for member_id, event_id in pairs:
+        attended[member_id].add(event_id)
+
+    streaks = {}
+    for member_id in member_ids:
+        events = attended.get(member_id, ())
+        longest = run = 0
+        for event_id in event_ids:
+            run = run + 1 if event_id in events else 0
+            longest = max(longest, run)
+        streaks[member_id] = (run, longest)
+    return streaks
+
+def member_summary(org_id, start=None, end=None, member_id=None, event_type=None):
+    """One MemberAttendanceRow per member (active or with records), by name.
+
+    Rates and streaks only count events that have already started. Totals
+    for wide ranges come from the rollups; streaks depend on the order of
+    events, so they are always walked from the raw records.
+    """
+    end = min(end, datetime.now()) if end else datetime.now()
+    events_held = db.session.query(func.count(Event.id)).filter(
+        *_event_filters(org_id, start, end, event_type)
+    ).scalar() or 0
+
+    totals, _ = _totals('member', org_id, start, end, event_type, member_id)
+
+    query = db.session.query(
+        Member.id, Member.first_name, Member.last_name, Member.badge_number, Member.is_active
+    ).filter(
+        Member.org_id == org_id,
+        Member.deleted_at == None
+    )
+    if member_id:
+        query = query.filter(Member.id == member_id)
+    rows = [row for row in query.order_by(Member.last_name, Member.first_name) if row[4] or row[0] in totals]
+
+    streaks = _streaks(org_id, start, end, event_type, [row[0] for row in rows])
+
+    summary = []
+    for member_id, first_name, last_name, badge_number, _ in rows:
+        attended, excused, absent, hours = totals.get(member_id, (0, 0, 0, 0.0))
+        summary.append(MemberAttendanceRow(
+            member_id=member_id,
+            name=f'{first_name} {last_name}',
+            badge_number=badge_number,
+            events_held=events_held,
+            attended=attended,
+            excused=excused,
+            absent=absent,
+            attendance_rate=round(100.0 * attended / events_held, 1) if events_held else 0.0,
+            hours=round(hours, 2),
+            current_streak=streaks[member_id][0],
+            longest_streak=streaks[member_id][1]
+        ))
+    return summary
+
+def event_type_breakdown(org_id, start=None, end=None, member_id=None):
+    """One EventTypeRow per event type held in the range"""
+    end = min(end, datetime.now()) if end else datetime.now()
+    events = dict(db.session.query(Event.type, func.count(Event.id)).filter(
+        *_event_filters(org_id, start, end)
+    ).group_by(Event.type).all())
+    totals, _ = _totals('event_type', org_id, start, end, member_id=member_id)
+
+    rows = []
+    for event_type in sorted(events):
+        attended, excused, absent, hours = totals.get(event_type, (0, 0, 0, 0.0))
+        rows.append(EventTypeRow(event_type, events[event_type], attended, excused, absent, round(hours, 2)))
+    return rows
+
+def refresh_rollups(org_id, event_ids, member_ids=None):
+    """Recompute the rollup cells covering these events (the caller commits).
+
+    Each touched (month, event type) cell is rebuilt from the raw records,
+    for the given members or for everyone, so status changes and repeat
+    check-ins can never double count. Cells are upserted rather than deleted
+    and re-inserted, so two transactions refreshing the same cell (a double
+    tapped check-in) don't collide on its unique constraint.
+    """
+    cells = {
+        (month_start(starts_at), event_type)
+        for starts_at, event_type in db.session.query(Event.starts_at, Event.type).filter(Event.id.in_(event_ids))
+    }
+
+    table = AttendanceRollup.__table__
+    now = datetime.utcnow()
+    for month, event_type in cells:
+        month_begin = datetime.combine(month, datetime.min.time())
+        month_end = datetime.combine(_next_month(month), datetime.min.time()) - timedelta(microseconds=1)
+
+        query = db.session.query(
+            AttendanceRecord.member_id,
+            _status_count(*ATTENDED_STATUSES),
+            _status_count('excused'),
+            _status_count('absent'),
+            func.sum(attended_hours())
+        ).join(
+            Event, AttendanceRecord.event_id == Event.id
+        ).filter(
+            AttendanceRecord.org_id == org_id,
+            *_event_filters(org_id, month_begin, month_end, event_type)
+        )
+        if member_ids is not None:
+            query = query.filter(AttendanceRecord.member_id.in_(member_ids))
+
+        rows = [
+            {'org_id': org_id, 'member_id': member_id, 'month': month, 'event_type': event_type,
+             'attended': int(attended or 0), 'excused': int(excused or 0),
+             'absent': int(absent or 0), 'hours': float(hours or 0), 'updated_at': now}
+            for member_id, attended, excused, absent, hours in query.group_by(AttendanceRecord.member_id)
+        ]
+
+        # Members left with no records in the cell (deleted events or records)
+        stale = AttendanceRollup.query.filter_by(org_id=org_id, month=month, event_type=event_type)
+        if member_ids is not None:
+            stale = stale.filter(AttendanceRollup.member_id.in_(member_ids))
+        if rows:
+            stale = stale.filter(AttendanceRollup.member_id.notin_([row['member_id'] for row in rows]))
+        stale.delete(synchronize_session=False)
+
+        if rows:
+            stmt = dialect_insert()(table).values(rows)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.org_id, table.c.member_id, table.c.month, table.c.event_type],
+                set_={column: stmt.excluded[column] for column in ('attended', 'excused', 'absent', 'hours', 'updated_at')}
+            ))
+    return len(cells)
+
+def rebuild_rollups(org_id=None):
+    """Recompute every rollup from the raw records. Returns the rows written."""
+    stale = AttendanceRollup.query
+    if org_id is not None:
+        stale = stale.filter_by(org_id=org_id)
+    stale.delete(synchronize_session=False)
+
+    query = db.session.query(Event.org_id, Event.id).filter(Event.deleted_at == None)
+    if org_id is not None:
+        query = query.filter(Event.org_id == org_id)
+    events_by_org = defaultdict(list)
+    for event_org_id, event_id in query:
+        events_by_org[event_org_id].append(event_id)
+
+    for event_org_id, event_ids in events_by_org.items():
+        refresh_rollups(event_org_id, event_ids)
+    db.session.commit()
+
+    return AttendanceRollup.query.count() if org_id is None else \
+        AttendanceRollup.query.filter_by(org_id=org_id).count()
+
+# Matrix cell codes; index 0 means no record
+MATRIX_STATUSES = ('', 'present', 'late', 'excused', 'absent')
+MATRIX_LABELS = np.array(['', 'P', 'L', 'E', 'A'])
+
+AttendanceMatrix = namedtuple('AttendanceMatrix', 'members events cells member_attended event_attended')
+
+def attendance_matrix(org_id, start, end):
+    """Members x events grid of status codes (see MATRIX_STATUSES).
+
+    ``members`` is a list of (member_id, name) rows and ``events`` a list of
+    (event_id, title, type, starts_at) columns, in display order; ``cells``
+    is an int8 array of shape (len(members), len(events)). Attended counts
+    per member and per event come along as arrays.
+    """
+    events = db.session.query(Event.id, Event.title, Event.type, Event.starts_at).filter(
+        *_event_filters(org_id, start, end)
+    ).order_by(Event.starts_at, Event.id).all()
+
+    records = db.session.query(
+        AttendanceRecord.member_id, AttendanceRecord.event_id, AttendanceRecord.status
+    ).join(
+        Event, AttendanceRecord.event_id == Event.id
+    ).filter(
+        AttendanceRecord.org_id == org_id,
+        *_event_filters(org_id, start, end)
+    ).all()
+
+    if records:
+        member_ids, event_ids, statuses = (np.array(column) for column in zip(*records))
+    else:
+        member_ids = event_ids = np.array([], dtype=np.int64)
+        statuses = np.array([], dtype=object)
+
+    recorded_member_ids = set(np.unique(member_ids).tolist())
+    members = [
+        (member_id, f'{first_name} {last_name}')
+        for member_id, first_name, last_name, is_active in db.session.query(
+            Member.id, Member.first_name, Member.last_name, Member.is_active
+        ).filter(
+            Member.org_id == org_id,
+            Member.deleted_at == None
+        ).order_by(Member.last_name, Member.first_name)
+        if is_active or member_id in recorded_member_ids
+    ]
+
+    row_ids = np.array([member_id for member_id, _ in members], dtype=np.int64)
+    column_ids = np.array([event.id for event in events], dtype=np.int64)
+    cells = np.zeros((len(row_ids), len(column_ids)), dtype=np.int8)
+
+    if len(member_ids) and len(row_ids) and len(column_ids):
+        # Positions of each record's member and event in the display order
+        row_order = np.argsort(row_ids)
+        column_order = np.argsort(column_ids)
+        row_pos = np.searchsorted(row_ids, member_ids, sorter=row_order).clip(max=len(row_ids) - 1)
+        column_pos = np.searchsorted(column_ids, event_ids, sorter=column_order).clip(max=len(column_ids) - 1)
+        rows = row_order[row_pos]
+        columns = column_order[column_pos]
+        known = (row_ids[rows] == member_ids) & (column_ids[columns] == event_ids)
+
+        codes = np.zeros(len(statuses), dtype=np.int8)
+        for code, status in enumerate(MATRIX_STATUSES[1:], start=1):
+            codes[statuses == status] = code
+        cells[rows[known], columns[known]] = codes[known]
+
+    attended = (cells == MATRIX_STATUSES.index('present')) | (cells == MATRIX_STATUSES.index('late'))
+    return AttendanceMatrix(
+        members=members,
+        events=events,
+        cells=cells,
+        member_attended=attended.sum(axis=1),
+        event_attended=attended.sum(axis=0)
+    )
+
+def matrix_labels(matrix):
+    """Cells as one-letter status labels (P, L, E, A or blank)"""
+    return MATRIX_LABELS[matrix.cells]
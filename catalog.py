@@ -0,0 +1,79 @@
+"""
+Item and location reference data for the EMS Inventory System
+
+Items and locations change rarely but are listed on most pages, so each
+process keeps them in memory as immutable records, tagged with the
+"catalog" data version they were loaded at. Every request compares that
+with the current version (one primary-key read, see data_version.py) and
+reloads only when an item or location has changed somewhere.
+
+Records carry the columns templates use; anything needing relationships
+or writes should load the model instead.
+"""
+
+import threading
+from collections import namedtuple
+
+from models import db, Item, Location
+from data_version import current_version
+
+CATALOG_VERSION = 'catalog'
+
+ItemRecord = namedtuple('ItemRecord', 'id name item_number manufacturer is_required required_quantity '
+                                      'minimum_threshold is_active')
+LocationRecord = namedtuple('LocationRecord', 'id name description location_type vehicle_id has_sections is_active')
+
+CatalogSnapshot = namedtuple('CatalogSnapshot', 'version items locations items_by_id locations_by_id')
+
+class CatalogCache:
+    """Items and locations (not deleted), sorted by name"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        version = current_version(CATALOG_VERSION)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                # Loaded after reading the version, so a concurrent change
+                # can only make the snapshot newer than its label
+                snapshot = self._load(version)
+                self._snapshot = snapshot
+        return snapshot
+
+    def items(self, active_only=True):
+        items = self.snapshot().items
+        return [item for item in items if item.is_active] if active_only else list(items)
+
+    def locations(self, active_only=True):
+        locations = self.snapshot().locations
+        return [location for location in locations if location.is_active] if active_only else list(locations)
+
+    def item(self, item_id):
+        return self.snapshot().items_by_id.get(item_id)
+
+    def location(self, location_id):
+        return self.snapshot().locations_by_id.get(location_id)
+
+    def _load(self, version):
+        items = tuple(ItemRecord(*row) for row in db.session.query(
+            Item.id, Item.name, Item.item_number, Item.manufacturer, Item.is_required,
+            Item.required_quantity, Item.minimum_threshold, Item.is_active
+        ).filter(Item.deleted_at == None).order_by(Item.name, Item.id))
+
+        locations = tuple(LocationRecord(*row) for row in db.session.query(
+            Location.id, Location.name, Location.description, Location.location_type,
+            Location.vehicle_id, Location.has_sections, Location.is_active
+        ).filter(Location.deleted_at == None).order_by(Location.name, Location.id))
+
+        return CatalogSnapshot(version, items, locations,
+                               {item.id: item for item in items},
+                               {location.id: location for location in locations})
+
+catalog = CatalogCache()
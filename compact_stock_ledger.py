@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Stock ledger compaction for EMS Inventory System
+Folds recent stock movements into snapshot rows so balance lookups stay fast.
+Safe to run repeatedly (e.g. from a nightly cron job).
+"""
+
+from datetime import datetime
+
+def compact_stock_ledger():
+    """Fold stock movements into snapshots"""
+    try:
+        from app import create_app
+        from stock_ledger import compact_ledger
+        
+        app = create_app()
+        
+        with app.app_context():
+            print("=" * 60)
+            print("EMS Inventory System - Stock Ledger Compaction")
+            print("=" * 60)
+            print(f"Compaction started at: {datetime.now()}")
+            
+            snapshots_written = compact_ledger()
+            print(f"✓ Wrote {snapshots_written} stock snapshots")
+            
+            print("=" * 60)
+            print("Stock ledger compaction completed successfully!")
+            print("=" * 60)
+    
+    except Exception as e:
+        print(f"❌ Compaction failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == '__main__':
+    compact_stock_ledger()
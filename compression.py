@@ -0,0 +1,129 @@
+"""
+Response compression for the EMS Inventory System
+
+HTML, JSON and CSV responses are compressed with brotli or gzip, whichever
+the browser prefers (brotli only when the Brotli package is installed).
+Small bodies are sent as-is. Streamed responses (the CSV/XLSX exports) are
+compressed chunk by chunk and flushed after every chunk, so they still
+reach the browser as they are produced.
+
+Files sent with send_file (static assets, downloads) are left alone.
+"""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+from flask import request
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html',
+    'text/csv',
+    'text/plain',
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+}
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # fast enough to run on every response
+
+def brotli_available():
+    return brotli is not None
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None for a request's Accept-Encoding"""
+    best = None
+    best_quality = 0
+    for encoding in (('br', 'gzip') if brotli_available() else ('gzip',)):
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class _Compressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self):
+        # Emits what has been compressed so far without ending the stream
+        if self.encoding == 'br':
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+def _compress_body(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = _Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+def _compress_stream(encoding, chunks):
+    compressor = _Compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def compress_response(response, min_size):
+    """after_request hook body: compress ``response`` in place when worthwhile"""
+    if (request.method == 'HEAD'
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or 'no-transform' in response.headers.get('Cache-Control', '')
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(encoding, response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(_compress_body(encoding, data))
+
+    response.headers['Content-Encoding'] = encoding
+    # A compressed body isn't byte-for-byte the resource the ETag named;
+    # If-None-Match compares weakly, so revalidation still matches
+    if 'ETag' in response.headers:
+        etag, weak = response.get_etag()
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_compression(app):
+    min_size = app.config['COMPRESS_MIN_SIZE']
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, min_size)
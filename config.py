@@ -47,6 +47,51 @@ class Config:
     # Password Reset Configuration
     PASSWORD_RESET_EXPIRY = 3600  # 1 hour in seconds
     
+    # How long a retried request with the same Idempotency-Key replays the first response
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL') or 86400)  # 24 hours in seconds
+    # A key still marked in progress after this long belongs to a request that
+    # died before storing its response; a retry may then run the request again
+    IDEMPOTENCY_PENDING_TIMEOUT = int(os.environ.get('IDEMPOTENCY_PENDING_TIMEOUT') or 60)  # seconds
+    
+    # Kiosk check-in: how often the in-memory badge index revalidates against
+    # the database
+    BADGE_INDEX_TTL = int(os.environ.get('BADGE_INDEX_TTL') or 30)  # seconds
+    
+    # QR check-in codes open this long before an event starts, and close when
+    # it ends (or this long after the start for events without an end time)
+    QR_CHECKIN_EARLY_SECONDS = int(os.environ.get('QR_CHECKIN_EARLY_SECONDS') or 3600)
+    QR_CHECKIN_DEFAULT_DURATION = int(os.environ.get('QR_CHECKIN_DEFAULT_DURATION') or 4 * 3600)
+    
+    # How far ahead recurring events are scheduled
+    EVENT_RECURRENCE_HORIZON_DAYS = int(os.environ.get('EVENT_RECURRENCE_HORIZON_DAYS') or 180)
+    
+    # Text search backend: pg_trgm, fts5 or like. Chosen from the database
+    # URI when not set (see search.py)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND')
+    
+    # Longest the navbar search index goes without picking up other workers' changes
+    SEARCH_INDEX_TTL = int(os.environ.get('SEARCH_INDEX_TTL') or 60)  # seconds
+    
+    # Report and dashboard results, cached per data version (see result_cache.py).
+    # Set RESULT_CACHE_DIR to share them between the workers on one host
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE') or 256)  # entries per process
+    RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL') or 600)  # seconds
+    RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR')
+    
+    # HTML, JSON and CSV responses smaller than this are sent uncompressed
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 500)  # bytes
+    
+    # Link static files by content hash and let browsers cache them for a year
+    # (see assets.py). Turn off while editing JS/CSS without restarting
+    ASSET_FINGERPRINTS = os.environ.get('ASSET_FINGERPRINTS', 'true').lower() in ['true', 'on', '1']
+    
+    # Compiled templates, shared by every worker and filled at deploy by
+    # precompile_templates.py (see template_cache.py). Empty disables it
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR',
+                                        os.path.join(os.path.dirname(os.path.abspath(__file__)), '.jinja_cache'))
+    # Load every template when a worker starts rather than on first use
+    TEMPLATE_PRELOAD = os.environ.get('TEMPLATE_PRELOAD', 'true').lower() in ['true', 'on', '1']
+    
     # EMS/Fire Service Color Scheme
     PRIMARY_COLOR = '#D32F2F'      # Fire Engine Red
     SECONDARY_COLOR = '#1976D2'    # EMS Blue
@@ -0,0 +1,136 @@
+"""
+Data versions for the EMS Inventory System
+
+Each versioned model belongs to a named group, and every transaction that
+creates, changes or deletes one of its rows bumps the group's DataVersion
+row once, just before it commits. Bumping at commit rather than at the
+first flush means writers only hold the shared row's lock for the commit
+itself. A process holding cached copies of the data
+compares its version with one primary-key read to know whether it's
+stale, however and wherever the change was made (any ORM write or statement
+run through the session, in any worker). Raw SQL on other connections
+must call bump_versions itself.
+"""
+
+from datetime import datetime
+
+from flask import g, has_app_context
+from sqlalchemy import event, select, update, insert, func
+from sqlalchemy.orm import Session
+
+from models import db, DataVersion, Item, Location, Inventory, InventoryItem, InventoryDetail, StockMovement, StockSnapshot, \
+    Organization, Member, Event, AttendanceRecord, AttendanceRollup
+
+# Version group of each versioned model
+VERSIONED_MODELS = {
+    Item: 'catalog',
+    Location: 'catalog',
+    Inventory: 'inventory',
+    InventoryItem: 'inventory',
+    InventoryDetail: 'inventory',
+    StockMovement: 'inventory',
+    StockSnapshot: 'inventory',
+    Organization: 'attendance',
+    Member: 'attendance',
+    Event: 'attendance',
+    AttendanceRecord: 'attendance',
+    AttendanceRollup: 'attendance',
+}
+
+# The same groups by table, for Core statements run through the session
+VERSIONED_TABLES = {model.__table__: group for model, group in VERSIONED_MODELS.items()}
+
+@event.listens_for(DataVersion.__table__, 'after_create')
+def _seed_versions(target, connection, **kw):
+    # One row per group up front, so concurrent first writes only ever UPDATE
+    now = datetime.utcnow()
+    connection.execute(insert(target), [
+        {'name': name, 'version': 0, 'updated_at': now} for name in sorted(set(VERSIONED_MODELS.values()))
+    ])
+
+def current_version(name):
+    """The group's version, read at most once per request"""
+    versions = g.setdefault('data_versions', {}) if has_app_context() else {}
+    if name not in versions:
+        versions[name] = db.session.execute(
+            select(DataVersion.version).where(DataVersion.name == name)
+        ).scalar() or 0
+    return versions[name]
+
+def current_versions(names):
+    """Versions of several groups, in the order given"""
+    return tuple(current_version(name) for name in names)
+
+def last_changed(names):
+    """When any of the named groups last changed (UTC), or None"""
+    return db.session.execute(
+        select(func.max(DataVersion.updated_at)).where(DataVersion.name.in_(names))
+    ).scalar()
+
+def bump_versions(connection, names):
+    """Increment the named versions on ``connection`` (the caller's transaction)"""
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+    for name in sorted(names):
+        result = connection.execute(
+            update(table).where(table.c.name == name).values(version=table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(name=name, version=1, updated_at=now))
+
+    # This request must not keep reading the version it saw before the change
+    if has_app_context() and 'data_versions' in g:
+        for name in names:
+            g.data_versions.pop(name, None)
+
+def _changed_groups(session):
+    groups = set()
+    for instance in session.new | session.deleted:
+        groups.add(VERSIONED_MODELS.get(type(instance)))
+    for instance in session.dirty:
+        group = VERSIONED_MODELS.get(type(instance))
+        if group and session.is_modified(instance, include_collections=False):
+            groups.add(group)
+    groups.discard(None)
+    return groups
+
+# Session.info key of the groups the open transaction has written
+PENDING_GROUPS = 'data_version_groups'
+
+def _mark_changed(session, groups):
+    if groups:
+        session.info.setdefault(PENDING_GROUPS, set()).update(groups)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_groups(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    _mark_changed(session, _changed_groups(session))
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_groups(orm_execute_state):
+    # Query.update()/delete(), session.execute(update(Model)) and Core
+    # upserts on a model's table all skip the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            group = VERSIONED_MODELS.get(mapper.class_)
+        else:
+            group = VERSIONED_TABLES.get(getattr(orm_execute_state.statement, 'table', None))
+        _mark_changed(orm_execute_state.session, {group} if group else None)
+
+@event.listens_for(Session, 'before_commit')
+def _bump_pending_versions(session):
+    # Savepoint commits leave the bump to the enclosing transaction
+    if session.in_nested_transaction():
+        return
+    # commit() flushes after this hook; flush now so those writes count too
+    session.flush()
+    groups = session.info.pop(PENDING_GROUPS, None)
+    if groups:
+        bump_versions(session.connection(), groups)
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_pending_versions(session, transaction):
+    # A rolled back transaction changed nothing
+    if transaction.parent is None:
+        session.info.pop(PENDING_GROUPS, None)
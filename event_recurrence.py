@@ -0,0 +1,115 @@
+"""
+Recurring events for the EMS Inventory System
+
+A recurring series is an ordinary Event with ``recurrence`` set. Its
+occurrences are materialized as their own Event rows (pointing back through
+``series_id``) over a rolling horizon, so attendance, reports and the
+upcoming-events list treat them like any other event. Expansion inserts all
+missing occurrences of a series in one statement and skips existing ones via
+the unique (series_id, starts_at) constraint, so it is safe to re-run.
+
+The horizon (EVENT_RECURRENCE_HORIZON_DAYS) rolls forward every day. The
+events list extends every series once a day per process, so occurrences
+keep getting scheduled even where the nightly expand_recurring_events.py
+job isn't set up.
+"""
+
+from datetime import datetime, date, timedelta
+
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import or_
+
+from models import db, Event, dialect_insert
+from search import search_index
+
+RECURRENCE_RULES = {
+    'weekly': relativedelta(weeks=1),
+    'biweekly': relativedelta(weeks=2),
+    'monthly': relativedelta(months=1),
+}
+
+# The day this process last extended every series
+_extended_on = None
+
+def horizon_end():
+    """End of the rolling horizon occurrences are scheduled out to"""
+    return datetime.now() + timedelta(days=current_app.config['EVENT_RECURRENCE_HORIZON_DAYS'])
+
+def occurrence_starts(series, until):
+    """Start times of every occurrence after the first, up to ``until``.
+
+    Each is computed from the series start (not the previous occurrence) so
+    monthly series on the 29th-31st clamp to short months without drifting.
+    """
+    step = RECURRENCE_RULES[series.recurrence]
+    if series.recurrence_until:
+        until = min(until, series.recurrence_until)
+
+    n = 1
+    while True:
+        starts_at = series.starts_at + step * n
+        if starts_at > until:
+            return
+        yield starts_at
+        n += 1
+
+def expand_series(series, horizon_end):
+    """Insert the series' missing occurrences up to ``horizon_end`` (the caller commits).
+
+    Returns the number of rows inserted.
+    """
+    if series.recurrence not in RECURRENCE_RULES or series.deleted_at:
+        return 0
+
+    duration = series.ends_at - series.starts_at if series.ends_at else None
+    rows = [{
+        'org_id': series.org_id,
+        'type': series.type,
+        'title': series.title,
+        'description': series.description,
+        'starts_at': starts_at,
+        'ends_at': starts_at + duration if duration is not None else None,
+        'location_id': series.location_id,
+        'created_by': series.created_by,
+        'created_at': datetime.utcnow(),
+        'updated_at': datetime.utcnow(),
+        'series_id': series.id,
+    } for starts_at in occurrence_starts(series, horizon_end)]
+    if not rows:
+        return 0
+
+    stmt = dialect_insert()(Event.__table__).values(rows).on_conflict_do_nothing(
+        index_elements=['series_id', 'starts_at']
+    )
+    inserted = db.session.execute(stmt).rowcount
+    # Core inserts skip the mapper events that normally do this
+    search_index.invalidate()
+    return inserted
+
+def expand_all(org_id=None):
+    """Extend every active series to the rolling horizon and commit.
+
+    Returns the number of occurrences inserted.
+    """
+    query = Event.query.filter(
+        Event.recurrence != None,
+        Event.deleted_at == None,
+        or_(Event.recurrence_until == None, Event.recurrence_until >= datetime.now())
+    )
+    if org_id is not None:
+        query = query.filter(Event.org_id == org_id)
+
+    until = horizon_end()
+    inserted = sum(expand_series(series, until) for series in query.all())
+    db.session.commit()
+    return inserted
+
+def extend_series_daily():
+    """expand_all() at most once a day in this process; returns occurrences inserted"""
+    global _extended_on
+    if _extended_on == date.today():
+        return 0
+    inserted = expand_all()
+    _extended_on = date.today()
+    return inserted
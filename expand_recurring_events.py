@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Recurring event expansion for EMS Inventory System
+Schedules upcoming occurrences of recurring events out to the rolling
+horizon (EVENT_RECURRENCE_HORIZON_DAYS). Safe to run repeatedly (e.g. from a
+nightly cron job); occurrences that already exist are skipped.
+"""
+
+from datetime import datetime
+
+def expand_recurring_events():
+    """Materialize upcoming occurrences of every recurring event"""
+    try:
+        from app import create_app
+        from event_recurrence import expand_all
+        
+        app = create_app()
+        
+        with app.app_context():
+            print("=" * 60)
+            print("EMS Inventory System - Recurring Event Expansion")
+            print("=" * 60)
+            print(f"Expansion started at: {datetime.now()}")
+            
+            inserted = expand_all()
+            print(f"✓ Scheduled {inserted} new event occurrences")
+            
+            print("=" * 60)
+            print("Recurring event expansion completed successfully!")
+            print("=" * 60)
+    
+    except Exception as e:
+        print(f"❌ Expansion failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == '__main__':
+    expand_recurring_events()
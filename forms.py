@@ -98,6 +98,13 @@ class EventForm(FlaskForm):
     starts_at = StringField('Start Date/Time', validators=[DataRequired()])
     ends_at = StringField('End Date/Time')
     location_id = SelectField('Location', coerce=int, validators=[Optional()])
+    recurrence = SelectField('Repeats', choices=[
+        ('', 'Does not repeat'),
+        ('weekly', 'Weekly'),
+        ('biweekly', 'Every 2 weeks'),
+        ('monthly', 'Monthly')
+    ], validators=[Optional()])
+    recurrence_until = StringField('Repeat Until')
     submit = SubmitField('Save Event')
 
 class MemberForm(FlaskForm):
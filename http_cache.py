@@ -0,0 +1,100 @@
+"""
+HTTP conditional GET for the EMS Inventory System
+
+Dashboards, reports and exports only change when the data versions they
+read change (see data_version.py), so their ETag is a hash of the page
+URL, the user, those versions and today's date. A browser revalidating
+with a matching If-None-Match (or an If-Modified-Since no older than the
+last change) gets a 304 before any query runs or template renders.
+
+Pages for signed-in users are marked ``private, no-cache``: browsers may
+keep them but must revalidate, and shared proxies must not store them.
+"""
+
+import hashlib
+import os
+from datetime import datetime, date, time, timezone
+from functools import wraps
+
+from flask import current_app, request, session, make_response
+from flask.globals import request_ctx
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+from data_version import current_versions, last_changed
+
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+def _build_id():
+    # Templates and static files ship with each deploy; their newest mtime
+    # keeps ETags from a previous release from matching the new pages
+    root = os.path.dirname(os.path.abspath(__file__))
+    newest = 0
+    for folder in ('templates', 'static'):
+        for dirpath, _, filenames in os.walk(os.path.join(root, folder)):
+            for filename in filenames:
+                try:
+                    newest = max(newest, os.path.getmtime(os.path.join(dirpath, filename)))
+                except OSError:
+                    pass
+    return str(int(newest))
+
+BUILD_ID = _build_id()
+
+def page_validators(groups):
+    """ETag and Last-Modified for the current request over ``groups``"""
+    today = date.today()
+    parts = [BUILD_ID, request.full_path, current_user.get_id() or '', today.isoformat()]
+    parts.extend(str(version) for version in current_versions(groups))
+    etag = hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+    # Expiry windows move at midnight, so nothing is older than today
+    midnight = datetime.combine(today, time()).astimezone(timezone.utc).replace(tzinfo=None)
+    changed = last_changed(groups)
+    last_modified = max(changed, midnight) if changed else midnight
+    return etag, last_modified
+
+def private_cache_headers(response):
+    """after_request hook: authenticated pages are private and always revalidated"""
+    if current_user.is_authenticated and 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = PRIVATE_CACHE_CONTROL
+        response.vary.add('Cookie')
+    return response
+
+def _shows_flashes():
+    # get_flashed_messages() keeps what it popped from the session on the
+    # request context; a page showing them must not be revalidated later
+    return bool(getattr(request_ctx, 'flashes', None))
+
+def conditional(*groups):
+    """Answer GETs with 304 Not Modified while ``groups`` are unchanged
+
+    Goes below @login_required. Views may still redirect or flash; only
+    plain 200 responses get validators.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages will be rendered into this page
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            etag, last_modified = page_validators(groups)
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                versions = current_versions(groups)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or _shows_flashes():
+                    return response
+                # The view wrote something itself (e.g. the default organization)
+                if current_versions(groups) != versions:
+                    etag, last_modified = page_validators(groups)
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.headers['Cache-Control'] = PRIVATE_CACHE_CONTROL
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
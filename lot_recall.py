@@ -0,0 +1,99 @@
+"""
+Lot recall lookups for the EMS Inventory System
+
+Inventory lines carry a normalized ``lot_key`` (the lot number with case
+and whitespace folded, see models.normalize_lot_key), which is indexed, so
+finding every unit of a recalled lot is an index lookup per lot instead of
+a scan of every line. Each match comes back with the count it was last
+recorded in.
+"""
+
+import re
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from models import db, Item, Location, InventoryItem, Inventory, InventoryDetail, User, normalize_lot_key
+from attendance_export import ExportTable
+
+MAX_RECALL_LOTS = 500
+RECALL_BATCH_SIZE = 1000
+
+RecallLine = namedtuple('RecallLine', 'lot_key lot_number item_name item_number location_id location_name '
+                                      'location_type section quantity expiration_date inventory_id counted_at counted_by')
+RecallLot = namedtuple('RecallLot', 'lot_key lines quantity locations')
+
+RECALL_HEADER = ['Lot Key', 'Lot Number', 'Item', 'Item Number', 'Location', 'Location Type', 'Section',
+                 'Quantity', 'Expiration Date', 'Count ID', 'Counted At', 'Counted By']
+
+def parse_lot_numbers(text):
+    """Normalized lot keys from a pasted list (one per line, or comma/semicolon separated).
+
+    Keys keep the order given, without repeats; raises ValueError when
+    there are more than MAX_RECALL_LOTS.
+    """
+    keys = []
+    for part in re.split(r'[\n,;]+', text or ''):
+        key = normalize_lot_key(part)
+        if key and key not in keys:
+            keys.append(key)
+    if len(keys) > MAX_RECALL_LOTS:
+        raise ValueError(f'Please look up at most {MAX_RECALL_LOTS} lot numbers at a time')
+    return keys
+
+def recall_query(lot_keys):
+    """Active inventory lines in any of ``lot_keys`` with the count each was last recorded in"""
+    matching_lines = db.session.query(InventoryItem.id).filter(InventoryItem.lot_key.in_(lot_keys))
+    latest_detail = db.session.query(
+        InventoryDetail.inventory_item_id,
+        func.max(InventoryDetail.id).label('detail_id')
+    ).filter(
+        InventoryDetail.inventory_item_id.in_(matching_lines.scalar_subquery())
+    ).group_by(InventoryDetail.inventory_item_id).subquery()
+
+    return db.session.query(
+        InventoryItem.lot_key, InventoryItem.lot_number,
+        Item.name, Item.item_number,
+        Location.id, Location.name, Location.location_type,
+        InventoryItem.section, InventoryItem.quantity, InventoryItem.expiration_date,
+        Inventory.id, Inventory.inventory_date, User.username
+    ).join(
+        Item, InventoryItem.item_id == Item.id
+    ).join(
+        Location, InventoryItem.location_id == Location.id
+    ).outerjoin(
+        latest_detail, latest_detail.c.inventory_item_id == InventoryItem.id
+    ).outerjoin(
+        InventoryDetail, InventoryDetail.id == latest_detail.c.detail_id
+    ).outerjoin(
+        Inventory, Inventory.id == InventoryDetail.inventory_id
+    ).outerjoin(
+        User, User.id == Inventory.user_id
+    ).filter(
+        InventoryItem.lot_key.in_(lot_keys),
+        InventoryItem.is_active == True,
+        InventoryItem.deleted_at == None
+    ).order_by(InventoryItem.lot_key, Location.name, InventoryItem.section, Item.name)
+
+def find_recalled_lots(lot_keys):
+    """A RecallLot per key, in the order given; lots with no stock have no lines"""
+    lines = {key: [] for key in lot_keys}
+    if lot_keys:
+        for row in recall_query(lot_keys):
+            lines[row[0]].append(RecallLine(*row))
+    return [RecallLot(key, key_lines, sum(line.quantity for line in key_lines),
+                      len({line.location_id for line in key_lines}))
+            for key, key_lines in lines.items()]
+
+def recall_table(lot_keys):
+    """Recall results as an ExportTable, read in batches"""
+    def rows():
+        for line in recall_query(lot_keys).yield_per(RECALL_BATCH_SIZE):
+            line = RecallLine(*line)
+            yield [line.lot_key, line.lot_number, line.item_name, line.item_number or '', line.location_name,
+                   (line.location_type or '').replace('_', ' ').title(), line.section or '', line.quantity,
+                   line.expiration_date.strftime('%Y-%m-%d') if line.expiration_date else '',
+                   line.inventory_id or '',
+                   line.counted_at.strftime('%Y-%m-%d %H:%M') if line.counted_at else '',
+                   line.counted_by or '']
+    return ExportTable('Lot Recall', RECALL_HEADER, rows())
@@ -0,0 +1,125 @@
+"""
+Member roster import for the EMS Inventory System
+
+A roster file is validated as a whole before anything is written: every
+badge number in the file is checked against the organization's existing
+badges, which are loaded with a single query, and each problem is
+reported against its row. Valid rows are then written with one bulk
+INSERT for new members and one bulk UPDATE, by primary key, for members
+matched on badge number.
+"""
+
+import csv
+from collections import namedtuple
+from datetime import datetime
+from io import StringIO
+
+from email_validator import validate_email, EmailNotValidError
+from sqlalchemy import insert, update
+
+from models import db, Member
+from attendance_service import badge_index, normalize_badge
+from search import search_index
+
+MEMBER_IMPORT_COLUMNS = ['Badge Number', 'First Name', 'Last Name', 'Email', 'Phone', 'Membership Type']
+MEMBERSHIP_TYPES = ('active', 'reserve', 'probationary', 'life', 'inactive')
+
+# Column lengths from the Member model
+FIELD_LIMITS = {'Badge Number': 50, 'First Name': 100, 'Last Name': 100, 'Email': 120, 'Phone': 20}
+
+MemberImportPlan = namedtuple('MemberImportPlan', 'creates updates errors total_rows')
+RowError = namedtuple('RowError', 'row badge_number error')
+
+def read_member_file(content, delimiter=','):
+    """Rows of a roster file as (row number, dict) pairs; raise ValueError on a bad header"""
+    reader = csv.DictReader(StringIO(content), delimiter=delimiter)
+    headers = [header.strip() for header in (reader.fieldnames or [])]
+    missing = [column for column in ('First Name', 'Last Name') if column not in headers]
+    if missing:
+        raise ValueError(f"File is missing required column(s): {', '.join(missing)}. Please use the provided template.")
+    reader.fieldnames = headers
+
+    rows = []
+    for row in reader:
+        values = {column: (row.get(column) or '').strip() for column in MEMBER_IMPORT_COLUMNS}
+        # Skip blank lines, which spreadsheets often leave at the end
+        if any(values.values()):
+            rows.append((reader.line_num, values))
+    return rows
+
+def _validate_row(values):
+    for column, limit in FIELD_LIMITS.items():
+        if len(values[column]) > limit:
+            return f'{column} is longer than {limit} characters'
+    if not values['First Name'] or not values['Last Name']:
+        return 'First Name and Last Name are required'
+    if values['Membership Type'] and values['Membership Type'].lower() not in MEMBERSHIP_TYPES:
+        return f"Unknown Membership Type \"{values['Membership Type']}\" (use {', '.join(MEMBERSHIP_TYPES)})"
+    if values['Email']:
+        try:
+            validate_email(values['Email'], check_deliverability=False)
+        except EmailNotValidError:
+            return f"Invalid email address \"{values['Email']}\""
+    return None
+
+def plan_member_import(org_id, rows):
+    """Sort parsed rows into members to create, members to update and row errors.
+
+    Rows are matched to existing members on badge number, compared the same
+    way the kiosk compares them (case and surrounding spaces ignored). Rows
+    without a badge number always create a new member.
+    """
+    existing = {}
+    for member_id, badge_number in db.session.query(Member.id, Member.badge_number).filter(
+        Member.org_id == org_id,
+        Member.deleted_at == None,
+        Member.badge_number != None
+    ):
+        # Members saved with a blank badge ('') have nothing to match on
+        key = normalize_badge(badge_number)
+        if key:
+            existing.setdefault(key, member_id)
+
+    now = datetime.utcnow()
+    creates, updates, errors = [], [], []
+    seen_badges = {}
+    for row_number, values in rows:
+        badge = normalize_badge(values['Badge Number'])
+        error = _validate_row(values)
+        if error is None and badge in seen_badges:
+            error = f'Badge number {values["Badge Number"]} also appears on row {seen_badges[badge]}'
+        if error:
+            errors.append(RowError(row_number, values['Badge Number'], error))
+            continue
+        if badge:
+            seen_badges[badge] = row_number
+
+        member = {
+            'badge_number': values['Badge Number'] or None,
+            'first_name': values['First Name'],
+            'last_name': values['Last Name'],
+            'email': values['Email'] or None,
+            'phone': values['Phone'] or None,
+            'membership_type': values['Membership Type'].lower() or None,
+            'updated_at': now,
+        }
+        if badge and badge in existing:
+            # Blank optional cells leave the member's current value alone
+            changes = {key: value for key, value in member.items() if value is not None}
+            updates.append(dict(changes, id=existing[badge]))
+        else:
+            member['membership_type'] = member['membership_type'] or 'active'
+            creates.append(dict(member, org_id=org_id, is_active=True, created_at=now))
+
+    return MemberImportPlan(creates, updates, errors, len(rows))
+
+def apply_member_import(plan):
+    """Write a MemberImportPlan in two bulk statements (the caller commits)"""
+    if plan.creates:
+        # render_nulls keeps rows with blank cells in the same executemany
+        db.session.execute(insert(Member).execution_options(render_nulls=True), plan.creates)
+    if plan.updates:
+        db.session.execute(update(Member), plan.updates)
+    # Bulk statements skip the mapper events that normally do this
+    badge_index.invalidate()
+    search_index.invalidate()
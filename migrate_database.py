@@ -40,6 +40,20 @@ def migrate_database():
             else:
                 print(f"Found {len(existing_tables)} existing tables. Applying migrations...")
                 
+                # Data versions for per-process caches (created and seeded together).
+                # Created first: later steps write versioned tables, which bumps these rows
+                if 'data_version' not in existing_tables:
+                    try:
+                        from models import DataVersion
+                        import data_version  # registers the table's seed listener
+                        print("Creating data_version table...")
+                        DataVersion.__table__.create(db.session.connection())
+                        print("✓ Created data_version table")
+                    except Exception as e:
+                        print(f"Warning: Could not create data_version table: {e}")
+                else:
+                    print("✓ data_version table already exists")
+                
                 # Check if we need to add new columns to User table
                 if 'user' in existing_tables:
                     try:
@@ -144,6 +158,215 @@ def migrate_database():
                 else:
                     print("✓ attendance_record table already exists")
                 
+                # Member change tracking (kiosk badge index revalidation)
+                if 'member' in existing_tables:
+                    try:
+                        member_columns = [col['name'] for col in inspector.get_columns('member')]
+                        if 'updated_at' not in member_columns:
+                            print("Adding updated_at column to member table...")
+                            db.session.execute(text("ALTER TABLE member ADD COLUMN updated_at TIMESTAMP"))
+                            db.session.execute(text("UPDATE member SET updated_at = created_at"))
+                            print("✓ Added updated_at column")
+                    except Exception as e:
+                        print(f"Warning: Could not add updated_at column to member table: {e}")
+                
+                # Recurring event columns and indexes
+                if 'event' in existing_tables:
+                    try:
+                        event_columns = [col['name'] for col in inspector.get_columns('event')]
+                        for column_name, column_type in [
+                            ('recurrence', 'VARCHAR(20)'),
+                            ('recurrence_until', 'TIMESTAMP'),
+                            ('series_id', 'INTEGER REFERENCES event(id)'),
+                        ]:
+                            if column_name not in event_columns:
+                                print(f"Adding {column_name} column to event table...")
+                                db.session.execute(text(f"ALTER TABLE event ADD COLUMN {column_name} {column_type}"))
+                                print(f"✓ Added {column_name} column")
+                        
+                        db.session.execute(text(
+                            "CREATE INDEX IF NOT EXISTS ix_event_org_starts_at ON event (org_id, starts_at)"
+                        ))
+                        db.session.execute(text(
+                            "CREATE UNIQUE INDEX IF NOT EXISTS uq_event_series_starts_at ON event (series_id, starts_at)"
+                        ))
+                        print("✓ Event indexes are in place")
+                    except Exception as e:
+                        print(f"Warning: Could not add recurrence columns to event table: {e}")
+                
+                # Optimistic concurrency version on inventory lines
+                if 'inventory_item' in existing_tables:
+                    try:
+                        inventory_item_columns = [col['name'] for col in inspector.get_columns('inventory_item')]
+                        if 'version' not in inventory_item_columns:
+                            print("Adding version column to inventory_item table...")
+                            db.session.execute(text("ALTER TABLE inventory_item ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+                            print("✓ Added version column")
+                    except Exception as e:
+                        print(f"Warning: Could not add version column to inventory_item table: {e}")
+                
+                # Inventory history (point-in-time stock) columns and indexes
+                if 'inventory_detail' in existing_tables:
+                    try:
+                        detail_columns = [col['name'] for col in inspector.get_columns('inventory_detail')]
+                        new_detail_columns = {
+                            'location_id': 'INTEGER REFERENCES location (id)',
+                            'inventory_item_id': 'INTEGER REFERENCES inventory_item (id)',
+                            'section': 'VARCHAR(5)'
+                        }
+                        for column_name, column_type in new_detail_columns.items():
+                            if column_name not in detail_columns:
+                                print(f"Adding {column_name} column to inventory_detail table...")
+                                db.session.execute(text(f"ALTER TABLE inventory_detail ADD COLUMN {column_name} {column_type}"))
+                                print(f"✓ Added {column_name} column")
+                        
+                        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_inventory_location_date ON inventory (location_id, inventory_date)"))
+                        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_inventory_detail_inventory ON inventory_detail (inventory_id)"))
+                        print("✓ Inventory history indexes in place")
+                        
+                        # Seed history with today's lines so "stock as of" works from now on
+                        history_count = db.session.execute(text("SELECT COUNT(*) FROM inventory_detail WHERE inventory_item_id IS NOT NULL")).scalar()
+                        if not history_count:
+                            seeded = db.session.execute(text("""
+                                INSERT INTO inventory_detail
+                                    (inventory_id, location_id, inventory_item_id, item_id, section,
+                                     quantity, expiration_date, lot_number, is_active, created_at)
+                                SELECT latest.id, ii.location_id, ii.id, ii.item_id, ii.section,
+                                       ii.quantity, ii.expiration_date, ii.lot_number, :active, :now
+                                FROM inventory_item ii
+                                JOIN inventory latest ON latest.id = (
+                                    SELECT inv.id FROM inventory inv
+                                    WHERE inv.location_id = ii.location_id
+                                      AND inv.is_active = :active AND inv.deleted_at IS NULL
+                                    ORDER BY inv.inventory_date DESC LIMIT 1
+                                )
+                                WHERE ii.is_active = :active AND ii.deleted_at IS NULL
+                            """), {'active': True, 'now': datetime.utcnow()})
+                            print(f"✓ Seeded inventory history with {seeded.rowcount} current lines")
+                    except Exception as e:
+                        print(f"Warning: Could not migrate inventory_detail table: {e}")
+                
+                # Stock movement ledger tables
+                from models import StockMovement, StockSnapshot
+                
+                if 'stock_movement' not in existing_tables:
+                    print("Creating stock_movement table...")
+                    StockMovement.__table__.create(db.session.connection())
+                    print("✓ Created stock_movement table")
+                else:
+                    print("✓ stock_movement table already exists")
+                
+                # Open the ledger with the stock on hand today. Decided by whether the
+                # ledger is empty, not whether the table is new: create_app() may have
+                # created it already. Movements are never deleted, so this runs once.
+                if not db.session.execute(text("SELECT 1 FROM stock_movement LIMIT 1")).first():
+                    opened = db.session.execute(text("""
+                        INSERT INTO stock_movement (location_id, item_id, movement_type, quantity, notes, created_at)
+                        SELECT location_id, item_id, 'adjust', SUM(quantity), 'Opening balance', :now
+                        FROM inventory_item
+                        WHERE is_active = :active AND deleted_at IS NULL
+                        GROUP BY location_id, item_id
+                        HAVING SUM(quantity) <> 0
+                    """), {'active': True, 'now': datetime.utcnow()})
+                    print(f"✓ Recorded {opened.rowcount} opening balances")
+                
+                if 'stock_snapshot' not in existing_tables:
+                    print("Creating stock_snapshot table...")
+                    StockSnapshot.__table__.create(db.session.connection())
+                    print("✓ Created stock_snapshot table")
+                else:
+                    print("✓ stock_snapshot table already exists")
+                
+                # Idempotency keys for retried inventory requests
+                from models import IdempotencyKey
+                
+                if 'idempotency_key' not in existing_tables:
+                    print("Creating idempotency_key table...")
+                    IdempotencyKey.__table__.create(db.session.connection())
+                    print("✓ Created idempotency_key table")
+                else:
+                    print("✓ idempotency_key table already exists")
+                
+                # One attendance record per member per event (attendance upserts)
+                if 'attendance_record' in existing_tables:
+                    try:
+                        attendance_indexes = [idx['name'] for idx in inspector.get_indexes('attendance_record')]
+                        attendance_constraints = [uc['name'] for uc in inspector.get_unique_constraints('attendance_record')]
+                        if 'uq_attendance_record_event_member' not in attendance_indexes + attendance_constraints:
+                            # Keep the most recently updated record of each duplicate pair
+                            result = db.session.execute(text("""
+                                DELETE FROM attendance_record
+                                WHERE EXISTS (
+                                    SELECT 1 FROM attendance_record newer
+                                    WHERE newer.event_id = attendance_record.event_id
+                                    AND newer.member_id = attendance_record.member_id
+                                    AND (COALESCE(newer.updated_at, newer.created_at) > COALESCE(attendance_record.updated_at, attendance_record.created_at)
+                                         OR (COALESCE(newer.updated_at, newer.created_at) = COALESCE(attendance_record.updated_at, attendance_record.created_at)
+                                             AND newer.id > attendance_record.id))
+                                )
+                            """))
+                            print(f"✓ Removed {result.rowcount} duplicate attendance records")
+                            db.session.execute(text(
+                                "CREATE UNIQUE INDEX IF NOT EXISTS uq_attendance_record_event_member "
+                                "ON attendance_record (event_id, member_id)"
+                            ))
+                            print("✓ Added unique (event_id, member_id) index to attendance_record")
+                        else:
+                            print("✓ attendance_record unique index already exists")
+                    except Exception as e:
+                        print(f"Warning: Could not add unique index to attendance_record table: {e}")
+                
+                # Monthly attendance rollups for wide-range reports
+                from models import AttendanceRollup
+                
+                if 'attendance_rollup' not in existing_tables:
+                    print("Creating attendance_rollup table...")
+                    AttendanceRollup.__table__.create(db.session.connection())
+                    print("✓ Created attendance_rollup table")
+                else:
+                    print("✓ attendance_rollup table already exists")
+                
+                # Backfill from existing records. Decided by whether the rollups are
+                # empty, not whether the table is new: create_app() may have created it
+                if (not db.session.execute(text("SELECT 1 FROM attendance_rollup LIMIT 1")).first()
+                        and db.session.execute(text("SELECT 1 FROM attendance_record LIMIT 1")).first()):
+                    from attendance_stats import rebuild_rollups
+                    print(f"✓ Built {rebuild_rollups()} attendance rollup rows")
+                
+                # Normalized lot numbers for recall lookups
+                if 'inventory_item' in existing_tables:
+                    try:
+                        inventory_item_columns = [col['name'] for col in inspector.get_columns('inventory_item')]
+                        if 'lot_key' not in inventory_item_columns:
+                            print("Adding lot_key column to inventory_item table...")
+                            db.session.execute(text("ALTER TABLE inventory_item ADD COLUMN lot_key VARCHAR(100)"))
+                            
+                            from models import normalize_lot_key
+                            lots = db.session.execute(text(
+                                "SELECT id, lot_number FROM inventory_item WHERE lot_number IS NOT NULL"
+                            )).fetchall()
+                            if lots:
+                                db.session.execute(text("UPDATE inventory_item SET lot_key = :lot_key WHERE id = :id"), [
+                                    {'id': line_id, 'lot_key': normalize_lot_key(lot_number)} for line_id, lot_number in lots
+                                ])
+                            print(f"✓ Added lot_key column ({len(lots)} lines backfilled)")
+                        
+                        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_inventory_item_lot_key ON inventory_item (lot_key)"))
+                        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_inventory_detail_inventory_item ON inventory_detail (inventory_item_id)"))
+                        print("✓ Lot recall indexes in place")
+                    except Exception as e:
+                        print(f"Warning: Could not add lot_key column to inventory_item table: {e}")
+                
+                # Trigram search indexes (pg_trgm GIN on PostgreSQL, FTS5 on SQLite).
+                # In a savepoint, so a failure here doesn't roll back the steps above
+                try:
+                    from search import install_search_indexes
+                    with db.session.begin_nested():
+                        install_search_indexes(db.session.connection())
+                    print("✓ Search indexes installed")
+                except Exception as e:
+                    print(f"Warning: Could not install search indexes: {e}")
+                
                 # Commit all changes
                 db.session.commit()
                 print("✓ All migrations applied successfully")
@@ -1,10 +1,31 @@
 from datetime import datetime, date
+import re
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import validates
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+_DIALECT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+def dialect_insert():
+    """The PostgreSQL or SQLite insert construct, which supports ON CONFLICT"""
+    dialect_name = db.session.get_bind().dialect.name
+    try:
+        return _DIALECT_INSERTS[dialect_name]
+    except KeyError:
+        raise NotImplementedError(f'ON CONFLICT inserts are not supported on {dialect_name}')
+
+def normalize_lot_key(lot_number):
+    """Lot number with case and whitespace folded, as stored in InventoryItem.lot_key"""
+    key = re.sub(r'\s+', '', lot_number or '').upper()
+    return key or None
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -80,17 +101,36 @@ class InventoryItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False, default=0)
     expiration_date = db.Column(db.Date)
     lot_number = db.Column(db.String(100))
+    # Normalized lot number for recall lookups; kept in step with lot_number
+    lot_key = db.Column(db.String(100), index=True)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Optimistic concurrency: every UPDATE is issued as "... WHERE version = ?"
+    # and bumps the version, so simultaneous counters can't silently overwrite
+    # each other (a lost race raises StaleDataError)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    
     # Soft delete
     deleted_at = db.Column(db.DateTime)
     
     # Relationships
     item = db.relationship('Item', backref='inventory_items')
     location = db.relationship('Location', backref='inventory_items')
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    @validates('lot_number')
+    def _set_lot_key(self, key, lot_number):
+        self.lot_key = normalize_lot_key(lot_number)
+        return lot_number
 
 class Inventory(db.Model):
+    __table_args__ = (
+        # Point-in-time lookups ("stock as of") scan counts per location by date
+        db.Index('ix_inventory_location_date', 'location_id', 'inventory_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -107,9 +147,24 @@ class Inventory(db.Model):
     user = db.relationship('User', backref='inventories')
 
 class InventoryDetail(db.Model):
+    """Append-only history of counted lines.
+
+    A new row is written every time an inventory line is counted, changed or
+    removed during a count. Rows are never updated; a quantity of 0 records
+    that the line was removed.
+    """
+    __table_args__ = (
+        db.Index('ix_inventory_detail_inventory', 'inventory_id'),
+        # Latest count of a line, e.g. for recall lookups
+        db.Index('ix_inventory_detail_inventory_item', 'inventory_item_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     inventory_id = db.Column(db.Integer, db.ForeignKey('inventory.id'), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'))
+    inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_item.id'))
     item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
+    section = db.Column(db.String(5))
     quantity = db.Column(db.Integer, nullable=False, default=0)
     expiration_date = db.Column(db.Date)
     lot_number = db.Column(db.String(100))
@@ -122,6 +177,52 @@ class InventoryDetail(db.Model):
     # Relationships
     inventory = db.relationship('Inventory', backref='details')
     item = db.relationship('Item', backref='inventory_details')
+    location = db.relationship('Location')
+    inventory_item = db.relationship('InventoryItem', backref='history')
+
+class StockMovement(db.Model):
+    """Append-only ledger of stock changes per location and item.
+    
+    ``quantity`` is signed: positive for stock coming in, negative for stock
+    going out. Rows are only ever inserted, so concurrent writers never
+    contend on a shared balance row.
+    """
+    __table_args__ = (
+        db.Index('ix_stock_movement_location_item', 'location_id', 'item_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
+    inventory_item_id = db.Column(db.Integer, db.ForeignKey('inventory_item.id'))
+    movement_type = db.Column(db.String(20), nullable=False)  # receive, use, transfer, adjust, expire
+    quantity = db.Column(db.Integer, nullable=False)
+    lot_number = db.Column(db.String(100))
+    notes = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    location = db.relationship('Location')
+    item = db.relationship('Item')
+    user = db.relationship('User')
+
+class StockSnapshot(db.Model):
+    """Balance of a location/item folded up to ``last_movement_id``.
+    
+    Written by the ledger compaction job; the current balance is the newest
+    snapshot plus the movements recorded after it.
+    """
+    __table_args__ = (
+        db.Index('ix_stock_snapshot_location_item', 'location_id', 'item_id', 'last_movement_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    last_movement_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class PasswordResetToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -134,6 +235,31 @@ class PasswordResetToken(db.Model):
     # Relationships
     user = db.relationship('User', backref='password_reset_tokens')
 
+class IdempotencyKey(db.Model):
+    """Response of a mutation request, replayed when the client retries it"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_key'),
+        db.Index('ix_idempotency_key_created_at', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    status_code = db.Column(db.Integer)  # None while the original request is still running
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DataVersion(db.Model):
+    """Version counter for a group of reference data (e.g. "catalog").
+    
+    Bumped in the same transaction as any change to the group's tables, so
+    processes caching that data can tell it changed with one primary-key read.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class AuditLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
@@ -175,6 +301,7 @@ class Member(db.Model):
     membership_type = db.Column(db.String(50))  # active, reserve, probationary, etc.
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Soft delete
     deleted_at = db.Column(db.DateTime)
@@ -190,6 +317,13 @@ class Member(db.Model):
         return f'<Member {self.get_full_name()}>'
 
 class Event(db.Model):
+    __table_args__ = (
+        # Upcoming/recent event lists scan an organization's events by date
+        db.Index('ix_event_org_starts_at', 'org_id', 'starts_at'),
+        # Expanding a recurring series never creates the same occurrence twice
+        db.UniqueConstraint('series_id', 'starts_at', name='uq_event_series_starts_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     org_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
     type = db.Column(db.String(50), nullable=False)  # training, drill, incident, meeting, other
@@ -202,11 +336,18 @@ class Event(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Recurrence: set on the first event of a series; generated occurrences
+    # point back to it through series_id
+    recurrence = db.Column(db.String(20))  # weekly, biweekly, monthly
+    recurrence_until = db.Column(db.DateTime)
+    series_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=True)
+    
     # Soft delete
     deleted_at = db.Column(db.DateTime)
     
     # Relationships
     organization = db.relationship('Organization', backref='events')
+    series = db.relationship('Event', remote_side=[id], backref='occurrences')
     location = db.relationship('Location', backref='events')
     created_by_user = db.relationship('User', backref='created_events')
     
@@ -214,6 +355,11 @@ class Event(db.Model):
         return f'<Event {self.title}>'
 
 class AttendanceRecord(db.Model):
+    __table_args__ = (
+        # One record per member per event; check-ins upsert against it
+        db.UniqueConstraint('event_id', 'member_id', name='uq_attendance_record_event_member'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     org_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
     event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
@@ -235,3 +381,25 @@ class AttendanceRecord(db.Model):
     
     def __repr__(self):
         return f'<AttendanceRecord {self.member_id} at {self.event_id}>'
+
+class AttendanceRollup(db.Model):
+    """Attendance totals for one member, month and event type.
+    
+    Derived from AttendanceRecord and kept current as attendance is
+    recorded; wide-range reports read these instead of the raw records.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('org_id', 'member_id', 'month', 'event_type', name='uq_attendance_rollup_cell'),
+        db.Index('ix_attendance_rollup_org_month', 'org_id', 'month'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    org_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+    member_id = db.Column(db.Integer, db.ForeignKey('member.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # First day of the month
+    event_type = db.Column(db.String(50), nullable=False)
+    attended = db.Column(db.Integer, nullable=False, default=0)
+    excused = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    hours = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Template precompilation for EMS Inventory System
+Compiles every template into the template bytecode cache (TEMPLATE_CACHE_DIR)
+so workers started after a deploy load compiled templates instead of
+compiling them on their first requests. Run as part of the build; a
+template that fails to compile fails the build.
+"""
+
+from datetime import datetime
+
+def precompile_templates():
+    """Compile all templates into the bytecode cache"""
+    try:
+        from app import create_app
+        from template_cache import preload_templates
+        
+        app = create_app()
+        
+        print("=" * 60)
+        print("EMS Inventory System - Template Precompilation")
+        print("=" * 60)
+        print(f"Precompile started at: {datetime.now()}")
+        
+        if app.jinja_env.bytecode_cache is None:
+            print("Template cache is disabled (TEMPLATE_CACHE_DIR not set or not writable); nothing to do")
+            return
+        
+        compiled = preload_templates(app)
+        print(f"✓ Compiled {compiled} templates into {app.config['TEMPLATE_CACHE_DIR']}")
+        
+        print("=" * 60)
+        print("Template precompilation completed successfully!")
+        print("=" * 60)
+    
+    except Exception as e:
+        print(f"❌ Precompilation failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == '__main__':
+    precompile_templates()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Attendance rollup rebuild for EMS Inventory System
+Recomputes the monthly per-member, per-event-type attendance totals from the
+raw attendance records. Rollups are kept current as attendance is recorded;
+run this after bulk data fixes or if the totals are ever in doubt.
+"""
+
+from datetime import datetime
+
+def rebuild_attendance_rollups():
+    """Rebuild every attendance rollup row"""
+    try:
+        from app import create_app
+        from attendance_stats import rebuild_rollups
+        
+        app = create_app()
+        
+        with app.app_context():
+            print("=" * 60)
+            print("EMS Inventory System - Attendance Rollup Rebuild")
+            print("=" * 60)
+            print(f"Rebuild started at: {datetime.now()}")
+            
+            rows_written = rebuild_rollups()
+            print(f"✓ Wrote {rows_written} attendance rollup rows")
+            
+            print("=" * 60)
+            print("Attendance rollup rebuild completed successfully!")
+            print("=" * 60)
+    
+    except Exception as e:
+        print(f"❌ Rebuild failed: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == '__main__':
+    rebuild_attendance_rollups()
@@ -0,0 +1,142 @@
+"""
+Cached view results for the EMS Inventory System
+
+Reports and dashboards give the same answer until someone writes inventory
+(or item/location) data, so their query results are cached under the view
+name, its filters and the data versions they depend on (see
+data_version.py). A write bumps a version, which changes the key, so stale
+results are never served; they just age out of the cache.
+
+Results are kept in a per-process LRU with a TTL. With RESULT_CACHE_DIR
+set, they are also pickled to that directory so every gunicorn worker on
+the host shares them. Cached values must be picklable (result rows,
+dicts, lists), never ORM instances.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from data_version import current_versions
+
+# Disk entries older than the TTL are swept after this many writes
+PRUNE_INTERVAL = 200
+
+class ResultCache:
+    """LRU + TTL cache of view results, optionally backed by a shared directory"""
+
+    def __init__(self, max_entries=256, ttl=300, directory=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def configure(self, max_entries, ttl, directory=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory or None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self.clear()
+
+    def key(self, view, filters, groups):
+        """Key for ``view`` with ``filters`` at the current versions of ``groups``
+
+        Today's date is part of every key, since expiry windows move with it.
+        """
+        return (view, tuple(sorted((filters or {}).items())), tuple(groups),
+                current_versions(groups), date.today().isoformat())
+
+    def get_or_set(self, view, filters, groups, producer):
+        """The cached result for this key, or ``producer()`` (which is then cached)"""
+        key = self.key(view, filters, groups)
+        found, value = self.get(key)
+        if not found:
+            value = producer()
+            self.set(key, value)
+        return value
+
+    def get(self, key):
+        """``(True, value)`` for a live entry, otherwise ``(False, None)``"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return True, entry[1]
+                del self._entries[key]
+
+        if self.directory:
+            entry = self._read(key, now)
+            if entry is not None:
+                self._remember(key, entry)
+                return True, entry[1]
+        return False, None
+
+    def set(self, key, value):
+        entry = (time.time() + self.ttl, value)
+        self._remember(key, entry)
+        if self.directory:
+            self._write(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.cache')
+
+    def _read(self, key, now):
+        try:
+            with open(self._path(key), 'rb') as f:
+                stored_key, expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Warning: Could not read cached result: {e}")
+            return None
+        if stored_key != key or expires_at <= now:
+            return None
+        return expires_at, value
+
+    def _write(self, key, entry):
+        # Written to a temporary file and renamed, so readers never see half a file
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((key, entry[0], entry[1]), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except Exception as e:
+            print(f"Warning: Could not write cached result: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % PRUNE_INTERVAL == 0:
+            self._prune()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith(('.cache', '.tmp')) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+result_cache = ResultCache()
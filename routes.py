@@ -1,9 +1,24 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, current_app, make_response, send_from_directory, stream_with_context
 import os
+from functools import wraps
 from flask_login import login_required, current_user, login_user, logout_user
 from datetime import datetime, date, timedelta
-from models import db, User, Location, Item, InventoryItem, Inventory, InventoryDetail, AuditLog, PasswordResetToken, Organization, Member, Event, AttendanceRecord
+from models import db, User, Location, Item, InventoryItem, Inventory, InventoryDetail, AuditLog, PasswordResetToken, Organization, Member, Event, AttendanceRecord, IdempotencyKey
+from stock_ledger import MOVEMENT_TYPES, record_movement, get_balance, get_balances, get_movement_history
+from attendance_stats import member_summary, event_type_breakdown, attendance_matrix, matrix_labels
+from event_recurrence import expand_series, extend_series_daily, horizon_end
+from catalog import catalog
+from result_cache import result_cache
+from http_cache import conditional, private_cache_headers
+from lot_recall import parse_lot_numbers, find_recalled_lots, recall_table
+from search import text_match, text_rank, search_index
+from member_import import MEMBER_IMPORT_COLUMNS, MEMBERSHIP_TYPES, read_member_file, plan_member_import, apply_member_import
+from attendance_export import summary_table, records_table, iter_csv, iter_xlsx, xlsx_available
+from attendance_service import upsert_attendance, badge_index, make_qr_token, verify_qr_token
 from sqlalchemy import and_, or_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm.exc import StaleDataError
 from forms import LoginForm, UserForm, LocationForm, ItemForm, InventoryItemForm, InventoryForm, SearchForm, PasswordResetRequestForm, PasswordResetForm, ProfileForm, ChangePasswordForm, EventForm, MemberForm, AttendanceRecordForm
 import csv
 from io import StringIO
@@ -17,8 +32,14 @@ admin_bp = Blueprint('admin', __name__)
 inventory_bp = Blueprint('inventory', __name__)
 attendance_bp = Blueprint('attendance', __name__)
 
-def log_audit(action, table_name, record_id, old_values=None, new_values=None):
-    """Log audit trail for all changes"""
+for blueprint in (main_bp, admin_bp, inventory_bp, attendance_bp):
+    blueprint.after_request(private_cache_headers)
+
+def log_audit(action, table_name, record_id, old_values=None, new_values=None, commit=True):
+    """Log audit trail for all changes.
+    
+    Pass commit=False to add the entry to the caller's transaction instead.
+    """
     log = AuditLog(
         user_id=current_user.id if current_user.is_authenticated else None,
         action=action,
@@ -29,64 +50,323 @@ def log_audit(action, table_name, record_id, old_values=None, new_values=None):
         ip_address=request.remote_addr
     )
     db.session.add(log)
+    if commit:
+        db.session.commit()
+
+def idempotent(view):
+    """Replay the stored response when a request is retried with the same Idempotency-Key.
+    
+    Only successful responses are stored; a failed request wrote nothing, so
+    its key is released and the retry runs normally. A key left in progress
+    for longer than IDEMPOTENCY_PENDING_TIMEOUT (the process died before the
+    response was stored) is taken over by the next retry. Requests without
+    the header are handled as before.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key', '').strip()
+        if not key:
+            return view(*args, **kwargs)
+        
+        if len(key) > 100:
+            return jsonify({'success': False, 'error': 'Idempotency-Key is too long'}), 400
+        
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])
+        IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+        
+        record = IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).first()
+        if record is None:
+            record = IdempotencyKey(user_id=current_user.id, key=key, endpoint=request.endpoint,
+                                    created_at=datetime.utcnow())
+            db.session.add(record)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # A concurrent retry reserved the key first
+                db.session.rollback()
+                record = IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).first()
+            else:
+                return _run_idempotent_view(record, view, *args, **kwargs)
+        else:
+            db.session.commit()
+        
+        if record is not None and record.endpoint != request.endpoint:
+            return jsonify({'success': False, 'error': 'Idempotency-Key was already used for a different request'}), 422
+        
+        if record is not None and record.status_code is None and _take_over_abandoned_key(record):
+            return _run_idempotent_view(record, view, *args, **kwargs)
+        
+        if record is None or record.status_code is None:
+            response = jsonify({'success': False, 'error': 'The original request is still being processed', 'retry': True})
+            response.status_code = 409
+            response.headers['Retry-After'] = '1'
+            return response
+        
+        response = make_response(record.response_body, record.status_code)
+        response.mimetype = 'application/json'
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+    
+    return wrapper
+
+def _take_over_abandoned_key(record):
+    """Re-reserve a key whose request never finished; False if it is still live"""
+    now = datetime.utcnow()
+    abandoned_before = now - timedelta(seconds=current_app.config['IDEMPOTENCY_PENDING_TIMEOUT'])
+    if record.created_at >= abandoned_before:
+        return False
+    
+    # Conditional on the old timestamp, so only one of several retries wins
+    taken = IdempotencyKey.query.filter(
+        IdempotencyKey.id == record.id,
+        IdempotencyKey.status_code == None,
+        IdempotencyKey.created_at == record.created_at
+    ).update({'created_at': now}, synchronize_session=False)
+    db.session.commit()
+    return taken == 1
+
+def _run_idempotent_view(record, view, *args, **kwargs):
+    record_id = record.id
+    try:
+        response = make_response(view(*args, **kwargs))
+    except Exception:
+        db.session.rollback()
+        IdempotencyKey.query.filter_by(id=record_id).delete()
+        db.session.commit()
+        raise
+    
+    if 200 <= response.status_code < 300:
+        IdempotencyKey.query.filter_by(id=record_id).update({
+            'status_code': response.status_code,
+            'response_body': response.get_data(as_text=True)
+        })
+    else:
+        IdempotencyKey.query.filter_by(id=record_id).delete()
     db.session.commit()
+    return response
+
+def record_inventory_detail(inventory, inventory_item):
+    """Append a history row for an inventory line as it stands now.
+    
+    Call before committing the change; the row joins the same transaction.
+    Inactive (removed) lines are recorded with a quantity of 0.
+    """
+    if inventory_item.id is None:
+        db.session.flush()
+    
+    detail = InventoryDetail(
+        inventory_id=inventory.id,
+        location_id=inventory_item.location_id,
+        inventory_item_id=inventory_item.id,
+        item_id=inventory_item.item_id,
+        section=inventory_item.section,
+        quantity=inventory_item.quantity if inventory_item.is_active else 0,
+        expiration_date=inventory_item.expiration_date,
+        lot_number=inventory_item.lot_number,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(detail)
+    return detail
+
+def record_stock_change(movement_type, inventory_item, quantity, notes=None):
+    """Add a stock ledger movement for a change to an inventory line"""
+    return record_movement(
+        movement_type,
+        inventory_item.location_id,
+        inventory_item.item_id,
+        quantity,
+        inventory_item_id=inventory_item.id,
+        lot_number=inventory_item.lot_number,
+        notes=notes,
+        user_id=current_user.id if current_user.is_authenticated else None
+    )
+
+def serialize_inventory_line(inventory_item):
+    """Editable state of an inventory line, as the count page shows it"""
+    return {
+        'inventory_item_id': inventory_item.id,
+        'quantity': inventory_item.quantity if inventory_item.is_active else 0,
+        'expiration_date': inventory_item.expiration_date.strftime('%Y-%m-%d') if inventory_item.expiration_date else '',
+        'lot_number': inventory_item.lot_number or '',
+        'section': inventory_item.section or '',
+        'is_active': bool(inventory_item.is_active and not inventory_item.deleted_at),
+        'version': inventory_item.version
+    }
+
+def inventory_conflict_response(inventory_item_id):
+    """409 response carrying the line's current state so the page can reconcile"""
+    db.session.rollback()
+    current = InventoryItem.query.get(inventory_item_id)
+    return jsonify({
+        'success': False,
+        'conflict': True,
+        'error': 'This item was changed by someone else while you were editing it',
+        'current': serialize_inventory_line(current) if current else None
+    }), 409
+
+def apply_inventory_line_values(inventory, inventory_item, quantity, expiration_date, lot_number, section):
+    """Write counted values onto an inventory line and record the change.
+    
+    A quantity of 0 removes the line. Returns the line's previous values;
+    the caller commits.
+    """
+    old_values = {
+        'quantity': inventory_item.quantity,
+        'expiration_date': inventory_item.expiration_date,
+        'lot_number': inventory_item.lot_number,
+        'section': inventory_item.section
+    }
+    
+    inventory_item.quantity = quantity
+    # Handle expiration_date - convert empty strings to None and validate format
+    if expiration_date and expiration_date.strip():
+        try:
+            inventory_item.expiration_date = datetime.strptime(expiration_date.strip(), '%Y-%m-%d').date()
+        except (ValueError, AttributeError):
+            inventory_item.expiration_date = None
+    else:
+        inventory_item.expiration_date = None
+    
+    # Handle lot_number - convert empty strings to None
+    inventory_item.lot_number = lot_number.strip() if lot_number and lot_number.strip() else None
+    
+    # Handle section - convert empty strings to None and enforce 5 character limit
+    if section and section.strip():
+        inventory_item.section = section.strip()[:5]  # Enforce 5 character limit
+    else:
+        inventory_item.section = None
+    
+    if quantity == 0:
+        # Soft delete if quantity is 0
+        inventory_item.is_active = False
+        inventory_item.deleted_at = datetime.now()
+    
+    record_inventory_detail(inventory, inventory_item)
+    record_stock_change('adjust', inventory_item, quantity - old_values['quantity'])
+    return old_values
+
+def get_latest_inventory(location_id):
+    """Most recent active count for a location, or None"""
+    return Inventory.query.filter(
+        Inventory.location_id == location_id,
+        Inventory.is_active == True,
+        Inventory.deleted_at == None
+    ).order_by(Inventory.inventory_date.desc()).first()
+
+def get_stock_as_of(location_id, as_of):
+    """Reconstruct the stock at a location at a point in time (UTC).
+    
+    Uses the newest history row of every inventory line recorded at or before
+    ``as_of``; lines whose newest row has a quantity of 0 had been removed.
+    """
+    latest = db.session.query(
+        InventoryDetail.inventory_item_id.label('inventory_item_id'),
+        func.max(InventoryDetail.id).label('detail_id')
+    ).join(
+        Inventory, InventoryDetail.inventory_id == Inventory.id
+    ).filter(
+        Inventory.location_id == location_id,
+        Inventory.inventory_date <= as_of,
+        InventoryDetail.location_id == location_id,
+        InventoryDetail.created_at <= as_of
+    ).group_by(InventoryDetail.inventory_item_id).subquery()
+    
+    return db.session.query(
+        InventoryDetail.inventory_item_id,
+        InventoryDetail.inventory_id,
+        InventoryDetail.created_at.label('recorded_at'),
+        Item.id.label('item_id'),
+        Item.name.label('item_name'),
+        Item.item_number.label('item_number'),
+        InventoryDetail.section,
+        InventoryDetail.quantity,
+        InventoryDetail.expiration_date,
+        InventoryDetail.lot_number
+    ).join(
+        latest, InventoryDetail.id == latest.c.detail_id
+    ).join(
+        Item, InventoryDetail.item_id == Item.id
+    ).filter(
+        InventoryDetail.quantity > 0
+    ).order_by(InventoryDetail.section, Item.name).all()
+
+def is_fragment_request():
+    """True when a filter form asks for just its results (see setupFragmentFilter in app.js)"""
+    return request.args.get('fragment') == '1'
 
 # Main routes
 @main_bp.route('/')
 @main_bp.route('/index')
 @login_required
+@conditional('inventory', 'catalog')
 def index():
     # Calculate dashboard statistics
     from sqlalchemy import func, and_
     
-    # Total active inventory items (sum of all quantities across all locations)
-    total_items = db.session.query(func.sum(InventoryItem.quantity)).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None
-    ).scalar() or 0
-    
-    # Count of locations
-    location_count = Location.query.filter_by(deleted_at=None, is_active=True).count()
-    
-    # Count of low stock items (items below minimum threshold) - ONLY for Supply Room locations
-    low_stock_count = db.session.query(func.count(Item.id)).join(
-        Location, Location.location_type == 'supply_room'
-    ).outerjoin(
-        InventoryItem, db.and_(
-            InventoryItem.item_id == Item.id,
-            InventoryItem.location_id == Location.id,
+    def load_counts():
+        # Total active inventory items (sum of all quantities across all locations)
+        total_items = db.session.query(func.sum(InventoryItem.quantity)).filter(
             InventoryItem.is_active == True,
             InventoryItem.deleted_at == None
-        )
-    ).filter(
-        Item.is_active == True,
-        Item.deleted_at == None,
-        Item.minimum_threshold > 0,
-        Location.is_active == True,
-        Location.deleted_at == None
-    ).group_by(
-        Location.id, Item.id, Item.minimum_threshold
-    ).having(
-        func.coalesce(func.sum(InventoryItem.quantity), 0) <= Item.minimum_threshold
-    ).count()
-    
-    # Count of expired items
-    today = date.today()
-    expired_count = db.session.query(func.count(InventoryItem.id)).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date < today,
-        InventoryItem.expiration_date.isnot(None)
-    ).scalar() or 0
-    
-    # Count of items expiring soon (within 30 days)
-    expiring_soon_count = db.session.query(func.count(InventoryItem.id)).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date >= today,
-        InventoryItem.expiration_date <= today + timedelta(days=30),
-        InventoryItem.expiration_date.isnot(None)
-    ).scalar() or 0
+        ).scalar() or 0
+        
+        # Count of locations
+        location_count = Location.query.filter_by(deleted_at=None, is_active=True).count()
+        
+        # Count of low stock items (items below minimum threshold) - ONLY for Supply Room locations
+        low_stock_count = db.session.query(func.count(Item.id)).join(
+            Location, Location.location_type == 'supply_room'
+        ).outerjoin(
+            InventoryItem, db.and_(
+                InventoryItem.item_id == Item.id,
+                InventoryItem.location_id == Location.id,
+                InventoryItem.is_active == True,
+                InventoryItem.deleted_at == None
+            )
+        ).filter(
+            Item.is_active == True,
+            Item.deleted_at == None,
+            Item.minimum_threshold > 0,
+            Location.is_active == True,
+            Location.deleted_at == None
+        ).group_by(
+            Location.id, Item.id, Item.minimum_threshold
+        ).having(
+            func.coalesce(func.sum(InventoryItem.quantity), 0) <= Item.minimum_threshold
+        ).count()
+        
+        # Count of expired items
+        today = date.today()
+        expired_count = db.session.query(func.count(InventoryItem.id)).filter(
+            InventoryItem.is_active == True,
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date < today,
+            InventoryItem.expiration_date.isnot(None)
+        ).scalar() or 0
+        
+        # Count of items expiring soon (within 30 days)
+        expiring_soon_count = db.session.query(func.count(InventoryItem.id)).filter(
+            InventoryItem.is_active == True,
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date >= today,
+            InventoryItem.expiration_date <= today + timedelta(days=30),
+            InventoryItem.expiration_date.isnot(None)
+        ).scalar() or 0
+        
+        return {
+            'total_items': total_items,
+            'location_count': location_count,
+            'low_stock_count': low_stock_count,
+            'expired_count': expired_count,
+            'expiring_soon_count': expiring_soon_count
+        }
+        
+    counts = result_cache.get_or_set('main.index', {}, ('inventory', 'catalog'), load_counts)
+    total_items = counts['total_items']
+    location_count = counts['location_count']
+    low_stock_count = counts['low_stock_count']
+    expired_count = counts['expired_count']
+    expiring_soon_count = counts['expiring_soon_count']
     
     # Generate alerts
     alerts = []
@@ -120,6 +400,47 @@ def index():
                          alerts=alerts,
                          now=now)
 
+@main_bp.route('/sw.js')
+def service_worker():
+    """Serve the offline service worker from the site root so it can control every page"""
+    response = send_from_directory(os.path.join(current_app.static_folder, 'js'), 'sw.js',
+                                   mimetype='application/javascript', max_age=0)
+    response.headers['Service-Worker-Allowed'] = '/'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def search_result_url(entry):
+    if entry.kind == 'item' or entry.kind == 'lot':
+        return url_for('inventory.inventory_dashboard', search=entry.label)
+    if entry.kind == 'location':
+        return url_for('inventory.inventory_dashboard', location=entry.record_id)
+    if entry.kind == 'member':
+        return url_for('attendance.reports', member_id=entry.record_id)
+    return url_for('attendance.event_detail', event_id=entry.record_id)
+
+@main_bp.route('/search')
+@login_required
+def global_search():
+    """Typeahead search across items, lots, locations, members and events"""
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 25)
+    if not query:
+        return jsonify({'success': True, 'query': query, 'results': []})
+    
+    org = get_default_organization()
+    results = search_index.search(query, org_id=org.id, limit=limit)
+    
+    return jsonify({
+        'success': True,
+        'query': query,
+        'results': [{
+            'type': entry.kind,
+            'label': entry.label,
+            'detail': entry.detail,
+            'url': search_result_url(entry)
+        } for entry in results]
+    })
+
 @main_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -277,8 +598,8 @@ def admin_dashboard():
         return redirect(url_for('main.index'))
     
     users = User.query.filter_by(deleted_at=None).all()
-    locations = Location.query.filter_by(deleted_at=None).all()
-    items = Item.query.filter_by(deleted_at=None).all()
+    locations = catalog.locations(active_only=False)
+    items = catalog.items(active_only=False)
     
     # Get attendance statistics
     organizations = Organization.query.filter_by(deleted_at=None).all()
@@ -419,7 +740,7 @@ def manage_locations():
         flash('Access denied.')
         return redirect(url_for('main.index'))
     
-    locations = Location.query.filter_by(deleted_at=None).all()
+    locations = catalog.locations(active_only=False)
     return render_template('admin/locations.html', locations=locations)
 
 @admin_bp.route('/locations/new', methods=['GET', 'POST'])
@@ -518,35 +839,36 @@ def manage_items():
     status_filter = request.args.get('status', '').strip()
     required_filter = request.args.get('required', '').strip()
     
-    # Build the base query
-    query = Item.query.filter_by(deleted_at=None)
+    # Items come from the catalog cache, sorted by name
+    items = catalog.items(active_only=False)
     
-    # Apply search filter
+    # Apply search filter, best matches first
     if search:
-        query = query.filter(
-            or_(
-                Item.name.ilike(f'%{search}%'),
-                Item.item_number.ilike(f'%{search}%'),
-                Item.manufacturer.ilike(f'%{search}%')
-            )
-        )
+        snapshot = catalog.snapshot()
+        matches = db.session.query(Item.id).filter(
+            Item.deleted_at == None,
+            text_match(Item, search)
+        ).order_by(text_rank(Item, search).desc(), Item.name)
+        items = [snapshot.items_by_id[item_id] for item_id, in matches if item_id in snapshot.items_by_id]
     
     # Apply status filter
-    if status_filter:
-        if status_filter == 'active':
-            query = query.filter_by(is_active=True)
-        elif status_filter == 'inactive':
-            query = query.filter_by(is_active=False)
+    if status_filter == 'active':
+        items = [item for item in items if item.is_active]
+    elif status_filter == 'inactive':
+        items = [item for item in items if not item.is_active]
     
     # Apply required filter
-    if required_filter:
-        if required_filter == 'required':
-            query = query.filter_by(is_required=True)
-        elif required_filter == 'optional':
-            query = query.filter_by(is_required=False)
-    
-    # Order by name
-    items = query.order_by(Item.name).all()
+    if required_filter == 'required':
+        items = [item for item in items if item.is_required]
+    elif required_filter == 'optional':
+        items = [item for item in items if not item.is_required]
+    
+    if is_fragment_request():
+        return render_template('admin/_item_results.html',
+                             items=items,
+                             search=search,
+                             status_filter=status_filter,
+                             required_filter=required_filter)
     
     return render_template('admin/items.html', 
                          items=items, 
@@ -684,156 +1006,175 @@ def delete_item(item_id):
 # Inventory routes
 @inventory_bp.route('/')
 @login_required
+@conditional('inventory', 'catalog')
 def inventory_dashboard():
-    locations = Location.query.filter_by(deleted_at=None, is_active=True).all()
-    items = Item.query.filter_by(deleted_at=None, is_active=True).all()
+    locations = catalog.locations()
+    items = catalog.items()
     
     # Get search and filter parameters
     search = request.args.get('search', '').strip()
     location_filter = request.args.get('location', '').strip()
     status_filter = request.args.get('status', '').strip()
     
-    # Build the base query - show only items from the most recent completed inventory for each location
-    # First, get the most recent inventory date for each location
-    subquery = db.session.query(
-        Inventory.location_id,
-        func.max(Inventory.inventory_date).label('max_inventory_date')
-    ).filter(
-        Inventory.is_active == True,
-        Inventory.deleted_at == None
-    ).group_by(Inventory.location_id).subquery()
+    # Today's date for expiry calculations
+    today = date.today()
+    today_plus_30 = today + timedelta(days=30)
     
-    query = db.session.query(
-        Location.name.label('location_name'),
-        Item.name.label('item_name'),
-        Item.id.label('item_id'),
-        Location.id.label('location_id'),
-        InventoryItem.quantity.label('quantity'),
-        InventoryItem.expiration_date.label('expiration_date'),
-        InventoryItem.lot_number.label('lot_number'),
-        InventoryItem.section.label('section'),
-        InventoryItem.id.label('inventory_item_id'),
-        Inventory.inventory_date.label('inventory_date')
-    ).select_from(InventoryItem).join(
-        Location, InventoryItem.location_id == Location.id
-    ).join(
-        Item, InventoryItem.item_id == Item.id
-    ).join(
-        Inventory, and_(
-            Inventory.location_id == InventoryItem.location_id,
+    def load_summary():
+        # Build the base query - show only items from the most recent completed inventory for each location
+        # First, get the most recent inventory date for each location
+        subquery = db.session.query(
+            Inventory.location_id,
+            func.max(Inventory.inventory_date).label('max_inventory_date')
+        ).filter(
             Inventory.is_active == True,
             Inventory.deleted_at == None
-        )
-    ).join(
-        subquery, and_(
-            subquery.c.location_id == Inventory.location_id,
-            subquery.c.max_inventory_date == Inventory.inventory_date
-        )
-    ).filter(
-        InventoryItem.is_active == True, 
-        InventoryItem.deleted_at == None
-    )
-    
-    # Apply search filter
-    if search:
-        query = query.filter(
-            or_(
-                Item.name.ilike(f'%{search}%'),
-                Location.name.ilike(f'%{search}%'),
-                InventoryItem.lot_number.ilike(f'%{search}%'),
-                InventoryItem.section.ilike(f'%{search}%')
+        ).group_by(Inventory.location_id).subquery()
+        
+        query = db.session.query(
+            Location.name.label('location_name'),
+            Item.name.label('item_name'),
+            Item.id.label('item_id'),
+            Location.id.label('location_id'),
+            InventoryItem.quantity.label('quantity'),
+            InventoryItem.expiration_date.label('expiration_date'),
+            InventoryItem.lot_number.label('lot_number'),
+            InventoryItem.section.label('section'),
+            InventoryItem.id.label('inventory_item_id'),
+            Inventory.inventory_date.label('inventory_date')
+        ).select_from(InventoryItem).join(
+            Location, InventoryItem.location_id == Location.id
+        ).join(
+            Item, InventoryItem.item_id == Item.id
+        ).join(
+            Inventory, and_(
+                Inventory.location_id == InventoryItem.location_id,
+                Inventory.is_active == True,
+                Inventory.deleted_at == None
             )
-        )
-    
-    # Apply location filter
-    if location_filter:
-        query = query.filter(Location.id == int(location_filter))
-    
-    # Apply status filter
-    today = date.today()
-    today_plus_30 = today + timedelta(days=30)
-    
-    if status_filter == 'low_stock':
-        query = query.filter(InventoryItem.quantity <= 2)
-    elif status_filter == 'expired':
-        query = query.filter(
-            and_(
-                InventoryItem.expiration_date.isnot(None),
-                InventoryItem.expiration_date < today
+        ).join(
+            subquery, and_(
+                subquery.c.location_id == Inventory.location_id,
+                subquery.c.max_inventory_date == Inventory.inventory_date
             )
+        ).filter(
+            InventoryItem.is_active == True, 
+            InventoryItem.deleted_at == None
         )
-    elif status_filter == 'expiring_soon':
-        query = query.filter(
-            and_(
-                InventoryItem.expiration_date.isnot(None),
-                InventoryItem.expiration_date >= today,
-                InventoryItem.expiration_date <= today_plus_30
+        
+        # Apply search filter
+        if search:
+            query = query.filter(
+                or_(
+                    text_match(Item, search, ['name']),
+                    text_match(Location, search),
+                    text_match(InventoryItem, search)
+                )
             )
-        )
+        
+        # Apply location filter
+        if location_filter:
+            query = query.filter(Location.id == int(location_filter))
+        
+        # Apply status filter
+        if status_filter == 'low_stock':
+            query = query.filter(InventoryItem.quantity <= 2)
+        elif status_filter == 'expired':
+            query = query.filter(
+                and_(
+                    InventoryItem.expiration_date.isnot(None),
+                    InventoryItem.expiration_date < today
+                )
+            )
+        elif status_filter == 'expiring_soon':
+            query = query.filter(
+                and_(
+                    InventoryItem.expiration_date.isnot(None),
+                    InventoryItem.expiration_date >= today,
+                    InventoryItem.expiration_date <= today_plus_30
+                )
+            )
+        
+        # Apply default sorting: Location, then Section, then Item name
+        return query.order_by(Location.name, InventoryItem.section, Item.name).all()
     
-    # Apply default sorting: Location, then Section, then Item name
-    inventory_summary = query.order_by(Location.name, InventoryItem.section, Item.name).all()
+    inventory_summary = result_cache.get_or_set(
+        'inventory.dashboard',
+        {'search': search, 'location': location_filter, 'status': status_filter},
+        ('inventory', 'catalog'),
+        load_summary
+    )
     
-    # Get last inventory date for each location
-    location_last_inventory = {}
-    for location in locations:
-        last_inv = Inventory.query.filter(
-            Inventory.location_id == location.id,
-            Inventory.is_active == True,
-            Inventory.deleted_at == None
-        ).order_by(Inventory.inventory_date.desc()).first()
+    # Filter changes only replace the summary table; alerts stay as they are
+    if is_fragment_request():
+        return render_template('inventory/_dashboard_summary.html',
+                             inventory_summary=inventory_summary,
+                             today=today,
+                             today_plus_30=today_plus_30)
+    
+    def load_alert_counts():
+        # Get last inventory date for each location
+        location_last_inventory = {}
+        for location in locations:
+            last_inv = Inventory.query.filter(
+                Inventory.location_id == location.id,
+                Inventory.is_active == True,
+                Inventory.deleted_at == None
+            ).order_by(Inventory.inventory_date.desc()).first()
+        
+            if last_inv:
+                location_last_inventory[location.id] = last_inv.inventory_date.date()
+            else:
+                location_last_inventory[location.id] = None
         
-        if last_inv:
-            location_last_inventory[location.id] = last_inv.inventory_date.date()
-        else:
-            location_last_inventory[location.id] = None
+        # Count expired items
+        expired_count = db.session.query(func.count(InventoryItem.id)).filter(
+            InventoryItem.is_active == True,
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date < today,
+            InventoryItem.expiration_date.isnot(None)
+        ).scalar() or 0
+        
+        # Count items expiring soon (within 30 days)
+        expiring_soon_count = db.session.query(func.count(InventoryItem.id)).filter(
+            InventoryItem.is_active == True,
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date >= today,
+            InventoryItem.expiration_date <= today_plus_30,
+            InventoryItem.expiration_date.isnot(None)
+        ).scalar() or 0
+        
+        # Count low stock items (items below minimum threshold) - ONLY for Supply Room locations
+        low_stock_count = db.session.query(func.count(Item.id)).join(
+            Location, Location.location_type == 'supply_room'
+        ).outerjoin(
+            InventoryItem, db.and_(
+                InventoryItem.item_id == Item.id,
+                InventoryItem.location_id == Location.id,
+                InventoryItem.is_active == True,
+                InventoryItem.deleted_at == None
+            )
+        ).filter(
+            Item.is_active == True,
+            Item.deleted_at == None,
+            Item.minimum_threshold > 0,
+            Location.is_active == True,
+            Location.deleted_at == None
+        ).group_by(
+            Location.id, Item.id, Item.minimum_threshold
+        ).having(
+            func.coalesce(func.sum(InventoryItem.quantity), 0) <= Item.minimum_threshold
+        ).count()
+        
+        return location_last_inventory, expired_count, expiring_soon_count, low_stock_count
     
-    # Add today's date for expiry calculations
-    today = date.today()
-    today_plus_30 = today + timedelta(days=30)
+    location_last_inventory, expired_count, expiring_soon_count, low_stock_count = result_cache.get_or_set(
+        'inventory.dashboard.alerts', {}, ('inventory', 'catalog'), load_alert_counts
+    )
     
     # Generate alerts for inventory dashboard
     alerts = []
     
-    # Count expired items
-    expired_count = db.session.query(func.count(InventoryItem.id)).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date < today,
-        InventoryItem.expiration_date.isnot(None)
-    ).scalar() or 0
-    
-    # Count items expiring soon (within 30 days)
-    expiring_soon_count = db.session.query(func.count(InventoryItem.id)).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date >= today,
-        InventoryItem.expiration_date <= today_plus_30,
-        InventoryItem.expiration_date.isnot(None)
-    ).scalar() or 0
-    
-    # Count low stock items (items below minimum threshold) - ONLY for Supply Room locations
-    low_stock_count = db.session.query(func.count(Item.id)).join(
-        Location, Location.location_type == 'supply_room'
-    ).outerjoin(
-        InventoryItem, db.and_(
-            InventoryItem.item_id == Item.id,
-            InventoryItem.location_id == Location.id,
-            InventoryItem.is_active == True,
-            InventoryItem.deleted_at == None
-        )
-    ).filter(
-        Item.is_active == True,
-        Item.deleted_at == None,
-        Item.minimum_threshold > 0,
-        Location.is_active == True,
-        Location.deleted_at == None
-    ).group_by(
-        Location.id, Item.id, Item.minimum_threshold
-    ).having(
-        func.coalesce(func.sum(InventoryItem.quantity), 0) <= Item.minimum_threshold
-    ).count()
-    
     if expired_count > 0:
         alerts.append({
             'type': 'danger',
@@ -867,6 +1208,7 @@ def inventory_dashboard():
 
 @inventory_bp.route('/export')
 @login_required
+@conditional('inventory', 'catalog')
 def export_inventory():
     # Get search and filter parameters (same as dashboard)
     search = request.args.get('search', '').strip()
@@ -918,10 +1260,9 @@ def export_inventory():
     if search:
         query = query.filter(
             or_(
-                Item.name.ilike(f'%{search}%'),
-                Location.name.ilike(f'%{search}%'),
-                InventoryItem.lot_number.ilike(f'%{search}%'),
-                InventoryItem.section.ilike(f'%{search}%')
+                text_match(Item, search, ['name']),
+                text_match(Location, search),
+                text_match(InventoryItem, search)
             )
         )
     
@@ -1002,7 +1343,7 @@ def export_inventory():
 @login_required
 def new_inventory():
     form = InventoryForm()
-    form.location_id.choices = [(l.id, l.name) for l in Location.query.filter_by(deleted_at=None, is_active=True).all()]
+    form.location_id.choices = [(l.id, l.name) for l in catalog.locations()]
     
     if form.validate_on_submit():
         inventory = Inventory(
@@ -1030,6 +1371,7 @@ def new_inventory():
             ).all()
             
             # Create new inventory items with the same data but new IDs
+            new_inventory_items = []
             for recent_item in recent_items:
                 new_inventory_item = InventoryItem(
                     item_id=recent_item.item_id,
@@ -1041,6 +1383,14 @@ def new_inventory():
                     is_active=True
                 )
                 db.session.add(new_inventory_item)
+                new_inventory_items.append(new_inventory_item)
+            
+            # Record the starting lines of this count in its history
+            db.session.flush()
+            for new_inventory_item in new_inventory_items:
+                record_inventory_detail(inventory, new_inventory_item)
+                record_stock_change('adjust', new_inventory_item, new_inventory_item.quantity,
+                                    notes=f'Copied into inventory count {inventory.id}')
             
             db.session.commit()
             
@@ -1077,10 +1427,12 @@ def edit_inventory(inventory_id):
                 'current_expiration': inv_item.expiration_date,
                 'current_lot_number': inv_item.lot_number,
                 'current_section': inv_item.section,
-                'inventory_item_id': inv_item.id
+                'inventory_item_id': inv_item.id,
+                'version': inv_item.version
             })
     
-    all_items = Item.query.filter_by(deleted_at=None, is_active=True).all()
+    # Item records for the add-item search, rendered into the page as JSON
+    all_items = [item._asdict() for item in catalog.items()]
     
     return render_template('inventory/edit_inventory.html', 
                          inventory=inventory, 
@@ -1110,58 +1462,39 @@ def update_inventory_item(inventory_id):
         lot_number = data.get('lot_number', '')
         section = data.get('section', '')
         
+        # Version the client last saw; omitted by older clients (last write wins)
+        expected_version = data.get('version')
+        try:
+            expected_version = int(expected_version) if expected_version not in (None, '') else None
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Invalid version'}), 400
+        
         inventory = Inventory.query.get_or_404(inventory_id)
         
         # Find the specific inventory item by its ID
-        inventory_item = InventoryItem.query.filter_by(
-            id=inventory_item_id,
-            is_active=True,
-            deleted_at=None
-        ).first()
+        inventory_item = InventoryItem.query.get(inventory_item_id)
         
-        if not inventory_item:
+        if not inventory_item or (expected_version is None and (not inventory_item.is_active or inventory_item.deleted_at)):
             return jsonify({'success': False, 'error': 'Inventory item not found'}), 404
         
         # Verify the inventory item belongs to the current inventory location
         if inventory_item.location_id != inventory.location_id:
             return jsonify({'success': False, 'error': 'Inventory item does not belong to this inventory'}), 403
         
-        # Update existing item
-        old_values = {
-            'quantity': inventory_item.quantity,
-            'expiration_date': inventory_item.expiration_date,
-            'lot_number': inventory_item.lot_number,
-            'section': inventory_item.section
-        }
-        
-        inventory_item.quantity = quantity
-        # Handle expiration_date - convert empty strings to None and validate format
-        if expiration_date and expiration_date.strip():
-            try:
-                inventory_item.expiration_date = datetime.strptime(expiration_date.strip(), '%Y-%m-%d').date()
-            except (ValueError, AttributeError):
-                inventory_item.expiration_date = None
-        else:
-            inventory_item.expiration_date = None
-        
-        # Handle lot_number - convert empty strings to None
-        inventory_item.lot_number = lot_number.strip() if lot_number and lot_number.strip() else None
-        
-        # Handle section - convert empty strings to None and enforce 5 character limit
-        if section and section.strip():
-            inventory_item.section = section.strip()[:5]  # Enforce 5 character limit
-        else:
-            inventory_item.section = None
+        # Someone else saved (or removed) this line since the client loaded it
+        if expected_version is not None and (
+                inventory_item.version != expected_version or not inventory_item.is_active or inventory_item.deleted_at):
+            return inventory_conflict_response(inventory_item.id)
         
-        if quantity == 0:
-            # Soft delete if quantity is 0
-            inventory_item.is_active = False
-            inventory_item.deleted_at = datetime.now()
-            action = 'DELETE'
-        else:
-            action = 'UPDATE'
+        # Update existing item
+        old_values = apply_inventory_line_values(inventory, inventory_item, quantity, expiration_date, lot_number, section)
+        action = 'DELETE' if quantity == 0 else 'UPDATE'
         
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # Lost the race between reading and writing the line
+            return inventory_conflict_response(inventory_item_id)
         
         # Log the action
         if action != 'DELETE':
@@ -1175,17 +1508,119 @@ def update_inventory_item(inventory_id):
         return jsonify({
             'success': True, 
             'message': f'Item updated successfully',
-            'inventory_item_id': inventory_item.id
+            'inventory_item_id': inventory_item.id,
+            'version': inventory_item.version
         })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
-
+@inventory_bp.route('/<int:inventory_id>/sync', methods=['POST'])
+@login_required
+@idempotent
+def sync_inventory(inventory_id):
+    """Apply a batch of line edits queued while the count page was offline.
+    
+    Operations are applied in client timestamp order in a single transaction.
+    An operation whose base version no longer matches the line is skipped and
+    returned as a conflict with the line's current state; the rest commit.
+    """
+    try:
+        data = request.get_json() or {}
+        operations = data.get('operations')
+        if not isinstance(operations, list):
+            return jsonify({'success': False, 'error': 'operations must be a list'}), 400
+        
+        inventory = Inventory.query.get_or_404(inventory_id)
+        
+        parsed = []
+        for op in operations:
+            try:
+                parsed.append({
+                    'op_id': op.get('op_id'),
+                    'inventory_item_id': int(op['inventory_item_id']),
+                    'version': int(op['version']),
+                    'quantity': int(op.get('quantity', 0)),
+                    'expiration_date': op.get('expiration_date') or '',
+                    'lot_number': op.get('lot_number') or '',
+                    'section': op.get('section') or '',
+                    'client_timestamp': float(op.get('client_timestamp') or 0)
+                })
+            except (KeyError, ValueError, TypeError, AttributeError):
+                return jsonify({'success': False, 'error': 'Each operation needs inventory_item_id, version and quantity'}), 400
+        parsed.sort(key=lambda op: op['client_timestamp'])
+        
+        lines = {}
+        if parsed:
+            lines = {
+                line.id: line for line in InventoryItem.query.filter(
+                    InventoryItem.id.in_({op['inventory_item_id'] for op in parsed})
+                ).all()
+            }
+        
+        # Several queued edits of one line share the base version the client
+        # loaded; later ones build on the earlier ones applied in this batch
+        batch_versions = {}
+        applied = []
+        conflicts = []
+        for op in parsed:
+            inventory_item = lines.get(op['inventory_item_id'])
+            if not inventory_item or inventory_item.location_id != inventory.location_id:
+                conflicts.append({'op_id': op['op_id'], 'inventory_item_id': op['inventory_item_id'], 'current': None})
+                continue
+            
+            expected_version = batch_versions.get(inventory_item.id, inventory_item.version)
+            if (op['version'] != expected_version or not inventory_item.is_active
+                    or inventory_item.deleted_at):
+                conflicts.append({
+                    'op_id': op['op_id'],
+                    'inventory_item_id': inventory_item.id,
+                    'current': serialize_inventory_line(inventory_item)
+                })
+                continue
+            
+            apply_inventory_line_values(inventory, inventory_item, op['quantity'], op['expiration_date'],
+                                        op['lot_number'], op['section'])
+            batch_versions[inventory_item.id] = op['version']
+            applied.append(op)
+        
+        try:
+            db.session.commit()
+        except StaleDataError:
+            # Another counter saved one of these lines mid-batch; nothing was
+            # written, so the client resends the same batch
+            db.session.rollback()
+            response = jsonify({'success': False, 'error': 'Inventory changed during sync', 'retry': True})
+            response.status_code = 409
+            response.headers['Retry-After'] = '1'
+            return response
+        
+        if applied:
+            log_audit('SYNC', 'inventory', inventory.id, None, {
+                'operations': len(applied),
+                'conflicts': len(conflicts),
+                'inventory_item_ids': sorted({op['inventory_item_id'] for op in applied})
+            })
+        
+        return jsonify({
+            'success': True,
+            'applied': [{
+                'op_id': op['op_id'],
+                'inventory_item_id': op['inventory_item_id'],
+                'version': lines[op['inventory_item_id']].version,
+                'is_active': bool(lines[op['inventory_item_id']].is_active)
+            } for op in applied],
+            'conflicts': conflicts
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
 
 @inventory_bp.route('/<int:inventory_id>/add-item', methods=['POST'])
 @login_required
+@idempotent
 def add_item_to_inventory(inventory_id):
     """Add a new item to the inventory in real-time"""
     try:
@@ -1238,6 +1673,8 @@ def add_item_to_inventory(inventory_id):
         if existing_item:
             # If exact same item exists, update quantity instead of creating duplicate
             existing_item.quantity += quantity
+            record_inventory_detail(inventory, existing_item)
+            record_stock_change('receive', existing_item, quantity)
             db.session.commit()
             
             # Log the action
@@ -1261,6 +1698,8 @@ def add_item_to_inventory(inventory_id):
             lot_number=normalized_lot_number
         )
         db.session.add(inventory_item)
+        record_inventory_detail(inventory, inventory_item)
+        record_stock_change('receive', inventory_item, quantity)
         db.session.commit()
         
         # Log the action
@@ -1323,6 +1762,8 @@ def remove_item_from_inventory(inventory_id):
         inventory_item.is_active = False
         inventory_item.deleted_at = datetime.now()
         
+        record_inventory_detail(inventory, inventory_item)
+        record_stock_change('adjust', inventory_item, -inventory_item.quantity)
         db.session.commit()
         
         # Log the action
@@ -1420,6 +1861,7 @@ def update_item_definition(inventory_id):
 
 @inventory_bp.route('/<int:inventory_id>/create-and-add-item', methods=['POST'])
 @login_required
+@idempotent
 def create_and_add_item(inventory_id):
     """Create a new item and add it to inventory in real-time"""
     try:
@@ -1460,6 +1902,8 @@ def create_and_add_item(inventory_id):
             lot_number=lot_number
         )
         db.session.add(inventory_item)
+        record_inventory_detail(inventory, inventory_item)
+        record_stock_change('receive', inventory_item, quantity)
         db.session.commit()
         
         # Log the actions
@@ -1501,6 +1945,7 @@ def create_and_add_item(inventory_id):
 
 @inventory_bp.route('/<int:inventory_id>/duplicate-item', methods=['POST'])
 @login_required
+@idempotent
 def duplicate_inventory_item(inventory_id):
     """Duplicate an existing inventory item"""
     try:
@@ -1541,6 +1986,9 @@ def duplicate_inventory_item(inventory_id):
             lot_number=original_item.lot_number
         )
         db.session.add(duplicate_item)
+        record_inventory_detail(inventory, duplicate_item)
+        record_stock_change('adjust', duplicate_item, duplicate_item.quantity,
+                            notes=f'Duplicated from inventory item {original_item.id}')
         db.session.commit()
         
         # Log the action
@@ -1564,21 +2012,235 @@ def duplicate_inventory_item(inventory_id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
-@inventory_bp.route('/debug/<int:inventory_id>')
+@inventory_bp.route('/<int:inventory_id>/history')
 @login_required
-def debug_inventory(inventory_id):
-    """Debug route to see what's in the inventory"""
+def inventory_history(inventory_id):
+    """Every line change recorded during a count, oldest first"""
     inventory = Inventory.query.get_or_404(inventory_id)
-    inventory_items = InventoryItem.query.filter_by(
-        location_id=inventory.location_id,
-        is_active=True,
-        deleted_at=None
-    ).all()
     
-    debug_info = {
+    details = db.session.query(InventoryDetail, Item).join(
+        Item, InventoryDetail.item_id == Item.id
+    ).filter(
+        InventoryDetail.inventory_id == inventory.id
+    ).order_by(InventoryDetail.id).all()
+    
+    return jsonify({
         'inventory_id': inventory.id,
+        'location_id': inventory.location_id,
         'location': inventory.location.name,
-        'user': inventory.user.username,
+        'inventory_date': inventory.inventory_date.isoformat(),
+        'lines': [{
+            'inventory_item_id': detail.inventory_item_id,
+            'item_id': item.id,
+            'item_name': item.name,
+            'section': detail.section,
+            'quantity': detail.quantity,
+            'expiration_date': detail.expiration_date.isoformat() if detail.expiration_date else None,
+            'lot_number': detail.lot_number,
+            'recorded_at': detail.created_at.isoformat()
+        } for detail, item in details]
+    })
+
+@inventory_bp.route('/locations/<int:location_id>/stock')
+@login_required
+def stock_as_of(location_id):
+    """Stock at a location as of a date (end of day) or date/time, in UTC"""
+    location = Location.query.get_or_404(location_id)
+    
+    as_of_param = request.args.get('as_of', '').strip()
+    if not as_of_param:
+        as_of = datetime.utcnow()
+    else:
+        try:
+            as_of = datetime.strptime(as_of_param, '%Y-%m-%dT%H:%M')
+        except ValueError:
+            try:
+                # A bare date means "at the end of that day"
+                as_of = datetime.strptime(as_of_param, '%Y-%m-%d') + timedelta(days=1, microseconds=-1)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'as_of must be YYYY-MM-DD or YYYY-MM-DDTHH:MM'}), 400
+    
+    lines = get_stock_as_of(location.id, as_of)
+    
+    return jsonify({
+        'success': True,
+        'location_id': location.id,
+        'location': location.name,
+        'as_of': as_of.isoformat(),
+        'total_quantity': sum(line.quantity for line in lines),
+        'lines': [{
+            'inventory_item_id': line.inventory_item_id,
+            'inventory_id': line.inventory_id,
+            'item_id': line.item_id,
+            'item_name': line.item_name,
+            'item_number': line.item_number,
+            'section': line.section,
+            'quantity': line.quantity,
+            'expiration_date': line.expiration_date.isoformat() if line.expiration_date else None,
+            'lot_number': line.lot_number,
+            'recorded_at': line.recorded_at.isoformat()
+        } for line in lines]
+    })
+
+@inventory_bp.route('/movements', methods=['POST'])
+@login_required
+def record_stock_movement():
+    """Receive, use, expire or transfer stock on an inventory line outside of a count"""
+    try:
+        data = request.get_json()
+        movement_type = data.get('movement_type', '')
+        notes = (data.get('notes') or '').strip() or None
+        
+        if movement_type not in MOVEMENT_TYPES or movement_type == 'adjust':
+            return jsonify({'success': False, 'error': 'movement_type must be receive, use, expire or transfer'}), 400
+        
+        try:
+            inventory_item_id = int(data.get('inventory_item_id'))
+            quantity = int(data.get('quantity', 0))
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'inventory_item_id and quantity must be integers'}), 400
+        
+        if quantity <= 0:
+            return jsonify({'success': False, 'error': 'Quantity must be greater than 0'}), 400
+        
+        inventory_item = InventoryItem.query.filter_by(
+            id=inventory_item_id,
+            is_active=True,
+            deleted_at=None
+        ).first()
+        
+        if not inventory_item:
+            return jsonify({'success': False, 'error': 'Inventory item not found'}), 404
+        
+        if movement_type != 'receive' and quantity > inventory_item.quantity:
+            return jsonify({'success': False, 'error': f'Only {inventory_item.quantity} on hand'}), 400
+        
+        destination_item = None
+        if movement_type == 'transfer':
+            try:
+                to_location_id = int(data.get('to_location_id'))
+            except (ValueError, TypeError):
+                return jsonify({'success': False, 'error': 'to_location_id is required for transfers'}), 400
+            
+            to_location = Location.query.filter_by(id=to_location_id, deleted_at=None, is_active=True).first()
+            if not to_location or to_location.id == inventory_item.location_id:
+                return jsonify({'success': False, 'error': 'Invalid destination location'}), 400
+            
+            # Merge into a matching line at the destination, otherwise start a new one
+            destination_item = InventoryItem.query.filter_by(
+                item_id=inventory_item.item_id,
+                location_id=to_location.id,
+                expiration_date=inventory_item.expiration_date,
+                lot_number=inventory_item.lot_number,
+                is_active=True,
+                deleted_at=None
+            ).first()
+            
+            if not destination_item:
+                destination_item = InventoryItem(
+                    item_id=inventory_item.item_id,
+                    location_id=to_location.id,
+                    quantity=0,
+                    expiration_date=inventory_item.expiration_date,
+                    lot_number=inventory_item.lot_number
+                )
+                db.session.add(destination_item)
+            destination_item.quantity += quantity
+        
+        old_quantity = inventory_item.quantity
+        change = quantity if movement_type == 'receive' else -quantity
+        inventory_item.quantity += change
+        if inventory_item.quantity == 0:
+            inventory_item.is_active = False
+            inventory_item.deleted_at = datetime.now()
+        
+        movement = record_stock_change(movement_type, inventory_item, change, notes=notes)
+        changed_lines = [inventory_item]
+        if destination_item is not None:
+            db.session.flush()
+            record_stock_change('transfer', destination_item, quantity, notes=notes)
+            changed_lines.append(destination_item)
+        
+        # Keep count history in step with lines changed outside of a count
+        for line in changed_lines:
+            latest_inventory = get_latest_inventory(line.location_id)
+            if latest_inventory:
+                record_inventory_detail(latest_inventory, line)
+        
+        db.session.commit()
+        
+        log_audit('STOCK_MOVEMENT', 'inventory_item', inventory_item.id,
+                  {'quantity': old_quantity},
+                  {'quantity': inventory_item.quantity, 'movement_type': movement_type,
+                   'to_inventory_item_id': destination_item.id if destination_item else None})
+        
+        return jsonify({
+            'success': True,
+            'message': f'{movement_type.capitalize()} recorded',
+            'movement_id': movement.id,
+            'inventory_item_id': inventory_item.id,
+            'quantity': inventory_item.quantity,
+            'to_inventory_item_id': destination_item.id if destination_item else None
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@inventory_bp.route('/locations/<int:location_id>/ledger')
+@login_required
+def location_ledger(location_id):
+    """Current ledger balance of every item at a location"""
+    location = Location.query.get_or_404(location_id)
+    balances = get_balances(location.id)
+    
+    items = {
+        item.id: item for item in Item.query.filter(Item.id.in_(list(balances.keys()))).all()
+    } if balances else {}
+    
+    return jsonify({
+        'location_id': location.id,
+        'location': location.name,
+        'balances': [{
+            'item_id': item_id,
+            'item_name': items[item_id].name if item_id in items else None,
+            'quantity': quantity
+        } for item_id, quantity in sorted(balances.items()) if quantity]
+    })
+
+@inventory_bp.route('/locations/<int:location_id>/ledger/<int:item_id>')
+@login_required
+def item_ledger(location_id, item_id):
+    """Recent movements of one item at a location with running balances"""
+    location = Location.query.get_or_404(location_id)
+    item = Item.query.get_or_404(item_id)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    
+    history = get_movement_history(location.id, item.id, limit=limit)
+    
+    return jsonify({
+        'location_id': location.id,
+        'item_id': item.id,
+        'item_name': item.name,
+        'balance': history[0]['balance'] if history else get_balance(location.id, item.id),
+        'movements': history
+    })
+
+@inventory_bp.route('/debug/<int:inventory_id>')
+@login_required
+def debug_inventory(inventory_id):
+    """Debug route to see what's in the inventory"""
+    inventory = Inventory.query.get_or_404(inventory_id)
+    inventory_items = InventoryItem.query.filter_by(
+        location_id=inventory.location_id,
+        is_active=True,
+        deleted_at=None
+    ).all()
+    
+    debug_info = {
+        'inventory_id': inventory.id,
+        'location': inventory.location.name,
+        'user': inventory.user.username,
         'date': inventory.inventory_date.strftime('%Y-%m-%d %H:%M:%S'),
         'total_items': len(inventory_items),
         'items': []
@@ -1639,6 +2301,7 @@ def test_inventory():
 
 @inventory_bp.route('/manage-counts')
 @login_required
+@conditional('inventory', 'catalog')
 def manage_inventory_counts():
     """Admin page to manage all inventory counts"""
     if not current_user.is_admin:
@@ -1650,56 +2313,64 @@ def manage_inventory_counts():
     start_date = request.args.get('start_date', '').strip()
     end_date = request.args.get('end_date', '').strip()
     
-    # Build the base query
-    query = db.session.query(
-        Inventory.id.label('inventory_id'),
-        Inventory.inventory_date.label('inventory_date'),
-        Location.name.label('location_name'),
-        User.username.label('user_name'),
-        func.count(InventoryItem.id).label('item_count')
-    ).select_from(Inventory).join(
-        Location, Inventory.location_id == Location.id
-    ).join(
-        User, Inventory.user_id == User.id
-    ).outerjoin(
-        InventoryItem, and_(
-            InventoryItem.location_id == Inventory.location_id,
-            InventoryItem.is_active == True,
-            InventoryItem.deleted_at == None
+    def load_counts():
+        # Build the base query
+        query = db.session.query(
+            Inventory.id.label('inventory_id'),
+            Inventory.inventory_date.label('inventory_date'),
+            Location.name.label('location_name'),
+            User.username.label('user_name'),
+            func.count(InventoryItem.id).label('item_count')
+        ).select_from(Inventory).join(
+            Location, Inventory.location_id == Location.id
+        ).join(
+            User, Inventory.user_id == User.id
+        ).outerjoin(
+            InventoryItem, and_(
+                InventoryItem.location_id == Inventory.location_id,
+                InventoryItem.is_active == True,
+                InventoryItem.deleted_at == None
+            )
+        ).filter(
+            Inventory.is_active == True,
+            Inventory.deleted_at == None
+        ).group_by(
+            Inventory.id, Inventory.inventory_date, Location.name, User.username
         )
-    ).filter(
-        Inventory.is_active == True,
-        Inventory.deleted_at == None
-    ).group_by(
-        Inventory.id, Inventory.inventory_date, Location.name, User.username
+        
+        # Apply location filter
+        if location_filter:
+            query = query.filter(Location.id == int(location_filter))
+        
+        # Apply date range filter
+        if start_date:
+            try:
+                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+                query = query.filter(Inventory.inventory_date >= start_date_obj)
+            except ValueError:
+                pass
+        
+        if end_date:
+            try:
+                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+                # Add one day to include the end date
+                end_date_obj = end_date_obj + timedelta(days=1)
+                query = query.filter(Inventory.inventory_date < end_date_obj)
+            except ValueError:
+                pass
+        
+        # Apply default sorting by date (newest first)
+        return query.order_by(Inventory.inventory_date.desc()).all()
+    
+    inventory_counts = result_cache.get_or_set(
+        'inventory.manage_counts',
+        {'location': location_filter, 'start_date': start_date, 'end_date': end_date},
+        ('inventory', 'catalog'),
+        load_counts
     )
     
-    # Apply location filter
-    if location_filter:
-        query = query.filter(Location.id == int(location_filter))
-    
-    # Apply date range filter
-    if start_date:
-        try:
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            query = query.filter(Inventory.inventory_date >= start_date_obj)
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-            # Add one day to include the end date
-            end_date_obj = end_date_obj + timedelta(days=1)
-            query = query.filter(Inventory.inventory_date < end_date_obj)
-        except ValueError:
-            pass
-    
     # Get all locations for the filter dropdown
-    locations = Location.query.filter_by(deleted_at=None, is_active=True).all()
-    
-    # Apply default sorting by date (newest first)
-    inventory_counts = query.order_by(Inventory.inventory_date.desc()).all()
+    locations = catalog.locations()
     
     return render_template('inventory/manage_counts.html',
                          inventory_counts=inventory_counts,
@@ -1710,6 +2381,7 @@ def manage_inventory_counts():
 
 @inventory_bp.route('/<int:inventory_id>/export-csv')
 @login_required
+@conditional('inventory', 'catalog')
 def export_inventory_count_csv(inventory_id):
     """Export a specific inventory count to CSV format matching import template"""
     if not current_user.is_admin:
@@ -1803,6 +2475,9 @@ def delete_inventory_count(inventory_id):
         for item in inventory_items:
             item.is_active = False
             item.deleted_at = datetime.now()
+            record_inventory_detail(inventory, item)
+            record_stock_change('adjust', item, -item.quantity,
+                                notes=f'Inventory count {inventory.id} deleted')
         
         db.session.commit()
         
@@ -1845,6 +2520,8 @@ def clear_all_inventories():
             for item in inventory_items:
                 item.is_active = False
                 item.deleted_at = datetime.now()
+                record_inventory_detail(inventory, item)
+                record_stock_change('adjust', item, -item.quantity, notes='All inventories cleared')
             
             cleared_count += 1
         
@@ -1865,144 +2542,186 @@ def clear_all_inventories():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
-@inventory_bp.route('/reports')
+@inventory_bp.route('/recall', methods=['GET', 'POST'])
 @login_required
-def reports():
-    today = date.today()
-    
-    # Get expired items
-    expired_items = db.session.query(
-        Location.name.label('location_name'),
-        Location.id.label('location_id'),
-        Item.name.label('item_name'),
-        InventoryItem.quantity,
-        InventoryItem.expiration_date,
-        InventoryItem.lot_number
-    ).select_from(InventoryItem).join(
-        Location, InventoryItem.location_id == Location.id
-    ).join(
-        Item, InventoryItem.item_id == Item.id
-    ).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date < today,
-        InventoryItem.expiration_date.isnot(None)
-    ).all()
-    
-    # Get items expiring in different time periods
-    expiring_30_days = db.session.query(
-        Location.name.label('location_name'),
-        Location.id.label('location_id'),
-        Item.name.label('item_name'),
-        InventoryItem.quantity,
-        InventoryItem.expiration_date,
-        InventoryItem.lot_number
-    ).select_from(InventoryItem).join(
-        Location, InventoryItem.location_id == Location.id
-    ).join(
-        Item, InventoryItem.item_id == Item.id
-    ).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date >= today,
-        InventoryItem.expiration_date <= today + timedelta(days=30),
-        InventoryItem.expiration_date.isnot(None)
-    ).all()
+def lot_recall():
+    """Find every unit of one or more recalled lots"""
+    lots = request.values.get('lots', '')
+    recalled = None
+    try:
+        lot_keys = parse_lot_numbers(lots)
+        if lot_keys:
+            recalled = find_recalled_lots(lot_keys)
+    except ValueError as e:
+        flash(str(e), 'error')
     
-    expiring_60_days = db.session.query(
-        Location.name.label('location_name'),
-        Location.id.label('location_id'),
-        Item.name.label('item_name'),
-        InventoryItem.quantity,
-        InventoryItem.expiration_date,
-        InventoryItem.lot_number
-    ).select_from(InventoryItem).join(
-        Location, InventoryItem.location_id == Location.id
-    ).join(
-        Item, InventoryItem.item_id == Item.id
-    ).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date > today + timedelta(days=30),
-        InventoryItem.expiration_date <= today + timedelta(days=60),
-        InventoryItem.expiration_date.isnot(None)
-    ).all()
+    return render_template('inventory/recall.html', lots=lots, recalled=recalled)
+
+@inventory_bp.route('/recall/export', methods=['GET', 'POST'])
+@login_required
+def export_lot_recall():
+    """Recall lookup results as CSV, streamed in batches"""
+    try:
+        lot_keys = parse_lot_numbers(request.values.get('lots', ''))
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('inventory.lot_recall'))
     
-    expiring_90_days = db.session.query(
-        Location.name.label('location_name'),
-        Location.id.label('location_id'),
-        Item.name.label('item_name'),
-        InventoryItem.quantity,
-        InventoryItem.expiration_date,
-        InventoryItem.lot_number
-    ).select_from(InventoryItem).join(
-        Location, InventoryItem.location_id == Location.id
-    ).join(
-        Item, InventoryItem.item_id == Item.id
-    ).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date > today + timedelta(days=60),
-        InventoryItem.expiration_date <= today + timedelta(days=90),
-        InventoryItem.expiration_date.isnot(None)
-    ).all()
+    if not lot_keys:
+        flash('Enter at least one lot number.', 'error')
+        return redirect(url_for('inventory.lot_recall'))
     
-    expiring_180_days = db.session.query(
-        Location.name.label('location_name'),
-        Location.id.label('location_id'),
-        Item.name.label('item_name'),
-        InventoryItem.quantity,
-        InventoryItem.expiration_date,
-        InventoryItem.lot_number
-    ).select_from(InventoryItem).join(
-        Location, InventoryItem.location_id == Location.id
-    ).join(
-        Item, InventoryItem.item_id == Item.id
-    ).filter(
-        InventoryItem.is_active == True,
-        InventoryItem.deleted_at == None,
-        InventoryItem.expiration_date > today + timedelta(days=90),
-        InventoryItem.expiration_date <= today + timedelta(days=180),
-        InventoryItem.expiration_date.isnot(None)
-    ).all()
+    filename = f"lot_recall_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+    return Response(
+        stream_with_context(iter_csv(recall_table(lot_keys))),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@inventory_bp.route('/reports')
+@login_required
+@conditional('inventory', 'catalog')
+def reports():
+    today = date.today()
     
-    # Get low stock items (combined regardless of expiration date) - ONLY for Supply Room locations
-    low_stock = db.session.query(
-        Location.name.label('location_name'),
-        Location.id.label('location_id'),
-        Item.name.label('item_name'),
-        func.coalesce(func.sum(InventoryItem.quantity), 0).label('total_quantity'),
-        Item.minimum_threshold,
-        Item.required_quantity
-    ).select_from(Item).join(
-        Location, Location.location_type == 'supply_room'
-    ).outerjoin(
-        InventoryItem, db.and_(
-            InventoryItem.item_id == Item.id,
-            InventoryItem.location_id == Location.id,
+    def load_report():
+        # Get expired items
+        expired_items = db.session.query(
+            Location.name.label('location_name'),
+            Location.id.label('location_id'),
+            Item.name.label('item_name'),
+            InventoryItem.quantity,
+            InventoryItem.expiration_date,
+            InventoryItem.lot_number
+        ).select_from(InventoryItem).join(
+            Location, InventoryItem.location_id == Location.id
+        ).join(
+            Item, InventoryItem.item_id == Item.id
+        ).filter(
             InventoryItem.is_active == True,
-            InventoryItem.deleted_at == None
-        )
-    ).filter(
-        Item.is_active == True,
-        Item.deleted_at == None,
-        Item.minimum_threshold > 0,
-        Location.is_active == True,
-        Location.deleted_at == None
-    ).group_by(
-        Location.name, Location.id, Item.name, Item.minimum_threshold, Item.required_quantity
-    ).having(
-        func.coalesce(func.sum(InventoryItem.quantity), 0) <= Item.minimum_threshold
-    ).all()
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date < today,
+            InventoryItem.expiration_date.isnot(None)
+        ).all()
+        
+        # Get items expiring in different time periods
+        expiring_30_days = db.session.query(
+            Location.name.label('location_name'),
+            Location.id.label('location_id'),
+            Item.name.label('item_name'),
+            InventoryItem.quantity,
+            InventoryItem.expiration_date,
+            InventoryItem.lot_number
+        ).select_from(InventoryItem).join(
+            Location, InventoryItem.location_id == Location.id
+        ).join(
+            Item, InventoryItem.item_id == Item.id
+        ).filter(
+            InventoryItem.is_active == True,
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date >= today,
+            InventoryItem.expiration_date <= today + timedelta(days=30),
+            InventoryItem.expiration_date.isnot(None)
+        ).all()
+        
+        expiring_60_days = db.session.query(
+            Location.name.label('location_name'),
+            Location.id.label('location_id'),
+            Item.name.label('item_name'),
+            InventoryItem.quantity,
+            InventoryItem.expiration_date,
+            InventoryItem.lot_number
+        ).select_from(InventoryItem).join(
+            Location, InventoryItem.location_id == Location.id
+        ).join(
+            Item, InventoryItem.item_id == Item.id
+        ).filter(
+            InventoryItem.is_active == True,
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date > today + timedelta(days=30),
+            InventoryItem.expiration_date <= today + timedelta(days=60),
+            InventoryItem.expiration_date.isnot(None)
+        ).all()
+        
+        expiring_90_days = db.session.query(
+            Location.name.label('location_name'),
+            Location.id.label('location_id'),
+            Item.name.label('item_name'),
+            InventoryItem.quantity,
+            InventoryItem.expiration_date,
+            InventoryItem.lot_number
+        ).select_from(InventoryItem).join(
+            Location, InventoryItem.location_id == Location.id
+        ).join(
+            Item, InventoryItem.item_id == Item.id
+        ).filter(
+            InventoryItem.is_active == True,
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date > today + timedelta(days=60),
+            InventoryItem.expiration_date <= today + timedelta(days=90),
+            InventoryItem.expiration_date.isnot(None)
+        ).all()
+        
+        expiring_180_days = db.session.query(
+            Location.name.label('location_name'),
+            Location.id.label('location_id'),
+            Item.name.label('item_name'),
+            InventoryItem.quantity,
+            InventoryItem.expiration_date,
+            InventoryItem.lot_number
+        ).select_from(InventoryItem).join(
+            Location, InventoryItem.location_id == Location.id
+        ).join(
+            Item, InventoryItem.item_id == Item.id
+        ).filter(
+            InventoryItem.is_active == True,
+            InventoryItem.deleted_at == None,
+            InventoryItem.expiration_date > today + timedelta(days=90),
+            InventoryItem.expiration_date <= today + timedelta(days=180),
+            InventoryItem.expiration_date.isnot(None)
+        ).all()
+        
+        # Get low stock items (combined regardless of expiration date) - ONLY for Supply Room locations
+        low_stock = db.session.query(
+            Location.name.label('location_name'),
+            Location.id.label('location_id'),
+            Item.name.label('item_name'),
+            func.coalesce(func.sum(InventoryItem.quantity), 0).label('total_quantity'),
+            Item.minimum_threshold,
+            Item.required_quantity
+        ).select_from(Item).join(
+            Location, Location.location_type == 'supply_room'
+        ).outerjoin(
+            InventoryItem, db.and_(
+                InventoryItem.item_id == Item.id,
+                InventoryItem.location_id == Location.id,
+                InventoryItem.is_active == True,
+                InventoryItem.deleted_at == None
+            )
+        ).filter(
+            Item.is_active == True,
+            Item.deleted_at == None,
+            Item.minimum_threshold > 0,
+            Location.is_active == True,
+            Location.deleted_at == None
+        ).group_by(
+            Location.name, Location.id, Item.name, Item.minimum_threshold, Item.required_quantity
+        ).having(
+            func.coalesce(func.sum(InventoryItem.quantity), 0) <= Item.minimum_threshold
+        ).all()
+        
+        return {
+            'expired_items': expired_items,
+            'expiring_30_days': expiring_30_days,
+            'expiring_60_days': expiring_60_days,
+            'expiring_90_days': expiring_90_days,
+            'expiring_180_days': expiring_180_days,
+            'low_stock': low_stock
+        }
+        
+    report = result_cache.get_or_set('inventory.reports', {}, ('inventory', 'catalog'), load_report)
     
-    return render_template('inventory/reports.html', 
-                         expired_items=expired_items,
-                         expiring_30_days=expiring_30_days,
-                         expiring_60_days=expiring_60_days,
-                         expiring_90_days=expiring_90_days,
-                         expiring_180_days=expiring_180_days,
-                         low_stock=low_stock,
-                         today=today)
+    return render_template('inventory/reports.html', today=today, **report)
 
 # Import functionality
 @inventory_bp.route('/import')
@@ -2388,6 +3107,7 @@ def commit_import():
             # Import inventory counts
             inventory_items_created = 0
             inventory_items_updated = 0
+            latest_inventories = {}
             
             for row in import_data['data']:
                 item_number = row.get('Item Number', '').strip()
@@ -2413,11 +3133,14 @@ def commit_import():
                 
                 if existing_inv_item:
                     # Update existing inventory item
+                    previous_quantity = existing_inv_item.quantity
                     existing_inv_item.quantity = quantity
                     if expiration_date_str:
                         existing_inv_item.expiration_date = datetime.strptime(expiration_date_str, '%Y-%m-%d').date()
                     existing_inv_item.lot_number = lot_number
                     inventory_items_updated += 1
+                    imported_line = existing_inv_item
+                    import_delta = quantity - previous_quantity
                 else:
                     # Create new inventory item
                     new_inv_item = InventoryItem(
@@ -2429,6 +3152,18 @@ def commit_import():
                     )
                     db.session.add(new_inv_item)
                     inventory_items_created += 1
+                    imported_line = new_inv_item
+                    import_delta = quantity
+                
+                # Imported lines belong to the location's current count, if it has one
+                if location.id not in latest_inventories:
+                    latest_inventories[location.id] = get_latest_inventory(location.id)
+                if latest_inventories[location.id]:
+                    record_inventory_detail(latest_inventories[location.id], imported_line)
+                if imported_line.id is None:
+                    db.session.flush()
+                record_stock_change('adjust', imported_line, import_delta,
+                                    notes=f"Imported from {import_data.get('filename')}")
             
             db.session.commit()
             
@@ -2458,6 +3193,27 @@ def get_default_organization():
         db.session.commit()
     return org
 
+def record_check_in(org_id, event_id, member_id, method):
+    """Save a member's self check-in and its audit entry; False if it failed.
+    
+    A check-in never downgrades a record already marked late or excused.
+    """
+    try:
+        results = upsert_attendance(org_id, event_id, [{'member_id': member_id, 'method': method}],
+                                    user_id=current_user.id if current_user.is_authenticated else None)
+        for result in results:
+            log_audit('CREATE' if result.created else 'UPDATE', 'attendance_record', result.record_id,
+                      new_values={'event_id': event_id, 'member_id': member_id,
+                                  'status': result.status, 'method': method},
+                      commit=False)
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Could not save %s check-in of member %s to event %s',
+                                     method, member_id, event_id)
+        return False
+
 @attendance_bp.route('/')
 @login_required
 def dashboard():
@@ -2497,10 +3253,14 @@ def dashboard():
 
 @attendance_bp.route('/events')
 @login_required
+@conditional('attendance')
 def events_list():
     """List all events"""
     org = get_default_organization()
     
+    # The rolling horizon moves daily; schedule the occurrences it now covers
+    extend_series_daily()
+    
     # Get filter parameters
     event_type = request.args.get('type', '').strip()
     search = request.args.get('search', '').strip()
@@ -2516,12 +3276,7 @@ def events_list():
         query = query.filter(Event.type == event_type)
     
     if search:
-        query = query.filter(
-            or_(
-                Event.title.ilike(f'%{search}%'),
-                Event.description.ilike(f'%{search}%')
-            )
-        )
+        query = query.filter(text_match(Event, search))
     
     events = query.order_by(Event.starts_at.desc()).all()
     
@@ -2539,7 +3294,7 @@ def new_event():
     
     # Populate location choices
     form.location_id.choices = [(0, 'None')] + [
-        (l.id, l.name) for l in Location.query.filter_by(deleted_at=None, is_active=True).all()
+        (l.id, l.name) for l in catalog.locations()
     ]
     
     if form.validate_on_submit():
@@ -2547,6 +3302,13 @@ def new_event():
         starts_at = datetime.strptime(form.starts_at.data, '%Y-%m-%dT%H:%M') if form.starts_at.data else datetime.now()
         ends_at = datetime.strptime(form.ends_at.data, '%Y-%m-%dT%H:%M') if form.ends_at.data else None
         
+        recurrence = form.recurrence.data or None
+        recurrence_until = None
+        if recurrence and form.recurrence_until.data:
+            recurrence_until = datetime.combine(
+                datetime.strptime(form.recurrence_until.data, '%Y-%m-%d').date(), datetime.max.time()
+            )
+        
         event = Event(
             org_id=org.id,
             type=form.type.data,
@@ -2555,13 +3317,26 @@ def new_event():
             starts_at=starts_at,
             ends_at=ends_at,
             location_id=form.location_id.data if form.location_id.data != 0 else None,
-            created_by=current_user.id
+            created_by=current_user.id,
+            recurrence=recurrence,
+            recurrence_until=recurrence_until
         )
         db.session.add(event)
+        
+        db.session.flush()
+        
+        # Schedule the series' upcoming occurrences in the same transaction
+        occurrences = 0
+        if recurrence:
+            occurrences = expand_series(event, horizon_end())
+        
+        log_audit('CREATE', 'event', event.id, new_values=form.data, commit=False)
         db.session.commit()
         
-        log_audit('CREATE', 'event', event.id, new_values=form.data)
-        flash('Event created successfully.', 'success')
+        if occurrences:
+            flash(f'Event created successfully with {occurrences} upcoming occurrences.', 'success')
+        else:
+            flash('Event created successfully.', 'success')
         return redirect(url_for('attendance.events_list'))
     
     return render_template('attendance/event_form.html', form=form, title='New Event')
@@ -2604,62 +3379,190 @@ def record_attendance(event_id):
         
         data = request.get_json()
         member_id = data.get('member_id')
-        status = data.get('status', 'present')
-        method = data.get('method', 'admin')
-        notes = data.get('notes', '')
-        
-        # Check if attendance record already exists
-        existing_record = AttendanceRecord.query.filter_by(
-            event_id=event.id,
-            member_id=member_id,
-            org_id=org.id
-        ).first()
-        
-        if existing_record:
-            # Update existing record
-            existing_record.status = status
-            existing_record.method = method
-            existing_record.notes = notes
-            existing_record.updated_at = datetime.now()
-            if status == 'present' and not existing_record.check_in_time:
-                existing_record.check_in_time = datetime.now()
-            action = 'UPDATE'
-        else:
-            # Create new record
-            new_record = AttendanceRecord(
-                org_id=org.id,
-                event_id=event.id,
-                member_id=member_id,
-                status=status,
-                method=method,
-                notes=notes,
-                created_by=current_user.id
-            )
-            if status == 'present':
-                new_record.check_in_time = datetime.now()
-            db.session.add(new_record)
-            action = 'CREATE'
+        status = data.get('status')
         
+        try:
+            member_id = int(member_id)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Invalid member_id'}), 400
+        
+        # One INSERT ... ON CONFLICT DO UPDATE; it also returns the member's name
+        results = upsert_attendance(org.id, event.id, [{
+            'member_id': member_id,
+            'status': status,
+            'method': data.get('method', 'admin'),
+            'notes': data.get('notes', '')
+        }], user_id=current_user.id)
+        
+        if not results or results[0].member_name is None:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Member not found'}), 404
+        record = results[0]
+        
+        log_audit('CREATE' if record.created else 'UPDATE', 'attendance_record', record.record_id,
+                  new_values={'event_id': event.id, 'member_id': member_id, 'status': record.status},
+                  commit=False)
         db.session.commit()
         
-        # Get the member for response
-        member = Member.query.get(member_id)
+        return jsonify({
+            'success': True,
+            'message': f'Attendance recorded for {record.member_name}',
+            'member_name': record.member_name
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@attendance_bp.route('/events/<int:event_id>/attendance/bulk', methods=['POST'])
+@login_required
+@idempotent
+def record_attendance_bulk(event_id):
+    """Record attendance for many members of an event in one transaction"""
+    try:
+        org = get_default_organization()
+        event = Event.query.filter_by(id=event_id, org_id=org.id, deleted_at=None).first_or_404()
+        
+        data = request.get_json() or {}
+        records = data.get('records')
+        if not isinstance(records, list) or not records:
+            return jsonify({'success': False, 'error': 'records must be a non-empty list'}), 400
         
-        log_audit(action, 'attendance_record', new_record.id if action == 'CREATE' else existing_record.id,
-                  new_values={'event_id': event.id, 'member_id': member_id, 'status': status})
+        entries = []
+        for record in records:
+            try:
+                member_id = int(record.get('member_id'))
+            except (ValueError, TypeError, AttributeError):
+                return jsonify({'success': False, 'error': 'Each record needs a valid member_id'}), 400
+            entries.append({
+                'member_id': member_id,
+                'status': record.get('status'),
+                'method': record.get('method', 'roster'),
+                'notes': record.get('notes', '')
+            })
+        
+        results = upsert_attendance(org.id, event.id, entries, user_id=current_user.id)
+        
+        missing = [result.member_id for result in results if result.member_name is None]
+        if missing:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Members not found', 'member_ids': missing}), 404
+        
+        for result in results:
+            log_audit('CREATE' if result.created else 'UPDATE', 'attendance_record', result.record_id,
+                      new_values={'event_id': event.id, 'member_id': result.member_id,
+                                  'status': result.status, 'bulk': True},
+                      commit=False)
+        db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': f'Attendance recorded for {member.get_full_name()}',
-            'member_name': member.get_full_name()
+            'message': f'Attendance recorded for {len(results)} members',
+            'records': [{
+                'record_id': result.record_id,
+                'member_id': result.member_id,
+                'member_name': result.member_name,
+                'status': result.status
+            } for result in results]
         })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@attendance_bp.route('/events/<int:event_id>/kiosk')
+@login_required
+def kiosk(event_id):
+    """Self check-in screen where members scan or type their badge number"""
+    org = get_default_organization()
+    event = Event.query.filter_by(id=event_id, org_id=org.id, deleted_at=None).first_or_404()
+    return render_template('attendance/kiosk.html', event=event)
+
+@attendance_bp.route('/events/<int:event_id>/kiosk/check-in', methods=['POST'])
+@login_required
+def kiosk_check_in(event_id):
+    """Check a member in by badge number.
+    
+    The badge resolves from the in-memory index; the record is saved before
+    the kiosk welcomes the member.
+    """
+    data = request.get_json() or {}
+    badge_number = (data.get('badge_number') or '').strip()
+    if not badge_number:
+        return jsonify({'success': False, 'error': 'badge_number is required'}), 400
+    
+    event = Event.query.filter_by(id=event_id, deleted_at=None).first_or_404()
+    
+    member = badge_index.lookup(event.org_id, badge_number)
+    if not member:
+        return jsonify({'success': False, 'error': f'Badge {badge_number} not recognized'}), 404
+    
+    if not record_check_in(event.org_id, event.id, member.member_id, 'kiosk'):
+        return jsonify({'success': False, 'error': 'Check-in failed - please try again'}), 500
+    
+    return jsonify({
+        'success': True,
+        'message': f'Welcome, {member.name}',
+        'member_id': member.member_id,
+        'member_name': member.name
+    })
+
+@attendance_bp.route('/events/<int:event_id>/qr')
+@login_required
+def event_qr_code(event_id):
+    """QR code members scan with their phones to check in to an event"""
+    org = get_default_organization()
+    event = Event.query.filter_by(id=event_id, org_id=org.id, deleted_at=None).first_or_404()
+    
+    not_before = event.starts_at - timedelta(seconds=current_app.config['QR_CHECKIN_EARLY_SECONDS'])
+    expires = event.ends_at or event.starts_at + timedelta(seconds=current_app.config['QR_CHECKIN_DEFAULT_DURATION'])
+    token = make_qr_token(current_app.config['SECRET_KEY'], event.id, event.org_id,
+                          not_before.timestamp(), expires.timestamp())
+    
+    return render_template('attendance/event_qr.html',
+                         event=event,
+                         checkin_url=url_for('attendance.qr_check_in', token=token, _external=True),
+                         not_before=not_before,
+                         expires=expires)
+
+@attendance_bp.route('/qr/<token>', methods=['GET', 'POST'])
+@login_required
+def qr_check_in(token):
+    """Check the signed-in member in from a scanned event QR code.
+    
+    The signed token proves the scan happened while check-in was open; it
+    is verified without touching the database. Members can only check
+    themselves in, through the member profile linked to their account.
+    """
+    try:
+        claims = verify_qr_token(current_app.config['SECRET_KEY'], token)
+    except ValueError as e:
+        if request.method == 'POST':
+            return jsonify({'success': False, 'error': str(e)}), 403
+        return render_template('attendance/qr_checkin.html', error=str(e), member=None), 403
+    
+    member = Member.query.filter_by(user_id=current_user.id, org_id=claims.org_id,
+                                    deleted_at=None, is_active=True).first()
+    if not member:
+        error = 'Your account is not linked to an active member profile'
+        if request.method == 'POST':
+            return jsonify({'success': False, 'error': error}), 403
+        return render_template('attendance/qr_checkin.html', error=error, member=None), 403
+    
+    if request.method == 'GET':
+        return render_template('attendance/qr_checkin.html', error=None, member=member)
+    
+    if not record_check_in(claims.org_id, claims.event_id, member.id, 'qr'):
+        return jsonify({'success': False, 'error': 'Check-in failed - please try again'}), 500
+    
+    return jsonify({
+        'success': True,
+        'message': f'You are checked in, {member.first_name} {member.last_name}'
+    })
+
 @attendance_bp.route('/members')
 @login_required
+@conditional('attendance')
 def members_list():
     """List all members"""
     org = get_default_organization()
@@ -2672,16 +3575,15 @@ def members_list():
     )
     
     if search:
-        query = query.filter(
-            or_(
-                Member.first_name.ilike(f'%{search}%'),
-                Member.last_name.ilike(f'%{search}%'),
-                Member.badge_number.ilike(f'%{search}%')
-            )
-        )
+        query = query.filter(text_match(Member, search)).order_by(text_rank(Member, search).desc())
     
     members = query.order_by(Member.last_name, Member.first_name).all()
     
+    if is_fragment_request():
+        return render_template('attendance/_member_results.html',
+                             members=members,
+                             search=search)
+    
     return render_template('attendance/members_list.html',
                          members=members,
                          search=search)
@@ -2768,6 +3670,100 @@ def new_member():
     
     return render_template('attendance/member_form.html', form=form, title='New Member')
 
+@attendance_bp.route('/members/import')
+@login_required
+def import_members():
+    """Member roster import - upload, review, then commit"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('attendance.members_list'))
+    
+    return render_template('attendance/members_import.html', columns=MEMBER_IMPORT_COLUMNS,
+                           membership_types=MEMBERSHIP_TYPES)
+
+@attendance_bp.route('/members/import/template')
+@login_required
+def download_member_template():
+    """Download the member roster import template"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(MEMBER_IMPORT_COLUMNS)
+    writer.writerow(['123', 'Jane', 'Smith', 'jane.smith@example.com', '555-0100', 'active'])
+    
+    output.seek(0)
+    return Response(
+        output.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=members_import_template.csv'}
+    )
+
+@attendance_bp.route('/members/import/upload', methods=['POST'])
+@login_required
+@idempotent
+def upload_member_import():
+    """Validate a roster file and, when commit=1, import its valid rows.
+    
+    Without commit the response is a preview of what would be created and
+    updated plus every row error, so the file can be fixed before importing.
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    
+    if not file.filename.lower().endswith(('.csv', '.tsv')):
+        return jsonify({'success': False, 'error': 'Invalid file format. Please use CSV or TSV.'}), 400
+    
+    raw = file.read()
+    if not raw:
+        return jsonify({'success': False, 'error': 'File is empty.'}), 400
+    if len(raw) > 5 * 1024 * 1024:
+        return jsonify({'success': False, 'error': 'File too large. Please keep files under 5MB.'}), 400
+    
+    try:
+        content = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        content = raw.decode('latin-1')
+    
+    org = get_default_organization()
+    try:
+        delimiter = ',' if file.filename.lower().endswith('.csv') else '\t'
+        rows = read_member_file(content, delimiter)
+        if not rows:
+            return jsonify({'success': False, 'error': 'No data rows found in the file.'}), 400
+        
+        plan = plan_member_import(org.id, rows)
+        result = {
+            'success': True,
+            'total_rows': plan.total_rows,
+            'create_count': len(plan.creates),
+            'update_count': len(plan.updates),
+            'errors': [error._asdict() for error in plan.errors],
+            'committed': False
+        }
+        if request.form.get('commit') != '1':
+            return jsonify(result)
+        
+        apply_member_import(plan)
+        log_audit('IMPORT', 'member', None, new_values={
+            'filename': file.filename,
+            'created': len(plan.creates),
+            'updated': len(plan.updates),
+            'errors': len(plan.errors)
+        }, commit=False)
+        db.session.commit()
+        
+        result['committed'] = True
+        return jsonify(result)
+    
+    except (ValueError, csv.Error) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @attendance_bp.route('/members/<int:member_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_member(member_id):
@@ -2799,34 +3795,39 @@ def edit_member(member_id):
     
     return render_template('attendance/member_form.html', form=form, title='Edit Member', member=member)
 
+def parse_report_range():
+    """Start and end (inclusive of the whole end day) from the report filters"""
+    start_date = request.args.get('start_date', '')
+    end_date = request.args.get('end_date', '')
+    start = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1, microseconds=-1) if end_date else None
+    return start_date, end_date, start, end
+
 @attendance_bp.route('/reports')
 @login_required
+@conditional('attendance')
 def reports():
     """Attendance reports"""
     org = get_default_organization()
     
     # Get parameters
     member_id = request.args.get('member_id', type=int)
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
+    start_date, end_date, start, end = parse_report_range()
     
-    # Build attendance query
-    query = AttendanceRecord.query.filter_by(org_id=org.id).join(
-        Member, AttendanceRecord.member_id == Member.id
-    ).join(
-        Event, AttendanceRecord.event_id == Event.id
-    )
+    summary = member_summary(org.id, start, end, member_id=member_id)
+    type_breakdown = event_type_breakdown(org.id, start, end, member_id=member_id)
     
+    # Individual records only for a single member's report
+    attendance_records = []
     if member_id:
-        query = query.filter(AttendanceRecord.member_id == member_id)
-    
-    if start_date:
-        query = query.filter(Event.starts_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-    
-    if end_date:
-        query = query.filter(Event.starts_at <= datetime.strptime(end_date, '%Y-%m-%d'))
-    
-    attendance_records = query.order_by(Event.starts_at.desc()).all()
+        query = AttendanceRecord.query.filter_by(org_id=org.id, member_id=member_id).join(
+            Event, AttendanceRecord.event_id == Event.id
+        ).options(contains_eager(AttendanceRecord.event))
+        if start:
+            query = query.filter(Event.starts_at >= start)
+        if end:
+            query = query.filter(Event.starts_at <= end)
+        attendance_records = query.order_by(Event.starts_at.desc()).all()
     
     # Get members for filter
     members = Member.query.filter(
@@ -2835,10 +3836,114 @@ def reports():
     ).order_by(Member.last_name, Member.first_name).all()
     
     return render_template('attendance/reports.html',
+                         summary=summary,
+                         type_breakdown=type_breakdown,
                          attendance_records=attendance_records,
                          members=members,
                          selected_member_id=member_id,
                          start_date=start_date,
+                         end_date=end_date,
+                         xlsx_enabled=xlsx_available())
+
+def parse_matrix_range():
+    """Report range for the attendance matrix, defaulting to the last 90 days"""
+    start_date, end_date, start, end = parse_report_range()
+    if not end:
+        end = datetime.combine(date.today(), datetime.max.time())
+        end_date = end.strftime('%Y-%m-%d')
+    if not start:
+        start = datetime.combine(end.date() - timedelta(days=90), datetime.min.time())
+        start_date = start.strftime('%Y-%m-%d')
+    return start_date, end_date, start, end
+
+@attendance_bp.route('/reports/matrix')
+@login_required
+@conditional('attendance')
+def attendance_matrix_report():
+    """Members x events heat map of attendance status"""
+    org = get_default_organization()
+    start_date, end_date, start, end = parse_matrix_range()
+    
+    matrix = attendance_matrix(org.id, start, end)
+    
+    return render_template('attendance/matrix.html',
+                         matrix=matrix,
+                         labels=matrix_labels(matrix).tolist(),
+                         member_attended=matrix.member_attended.tolist(),
+                         event_attended=matrix.event_attended.tolist(),
+                         start_date=start_date,
                          end_date=end_date)
 
+@attendance_bp.route('/reports/matrix/export')
+@login_required
+@conditional('attendance')
+def export_attendance_matrix():
+    """Attendance matrix as CSV: one row per member, one column per event"""
+    org = get_default_organization()
+    start_date, end_date, start, end = parse_matrix_range()
+    
+    matrix = attendance_matrix(org.id, start, end)
+    labels = matrix_labels(matrix)
+    
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Member'] + [f"{event.starts_at.strftime('%Y-%m-%d')} {event.title}" for event in matrix.events] + ['Attended'])
+    writer.writerows(
+        [name] + row + [attended]
+        for (_, name), row, attended in zip(matrix.members, labels.tolist(), matrix.member_attended.tolist())
+    )
+    
+    output.seek(0)
+    return Response(
+        output.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=attendance_matrix_{start_date}_{end_date}.csv'}
+    )
+
+def attendance_export_response(table, filename):
+    """Stream an attendance ExportTable as CSV, or as XLSX with ?format=xlsx"""
+    if request.args.get('format') == 'xlsx':
+        if not xlsx_available():
+            flash('Excel export is not available on this server. Please export CSV instead.', 'warning')
+            return redirect(url_for('attendance.reports', **request.args.to_dict(flat=True)))
+        return Response(
+            stream_with_context(iter_xlsx(table)),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={'Content-Disposition': f'attachment; filename={filename}.xlsx'}
+        )
+    
+    return Response(
+        stream_with_context(iter_csv(table)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}.csv'}
+    )
+
+@attendance_bp.route('/reports/export')
+@login_required
+@conditional('attendance')
+def export_reports():
+    """Per-member attendance summary as CSV or XLSX"""
+    org = get_default_organization()
+    member_id = request.args.get('member_id', type=int)
+    start_date, end_date, start, end = parse_report_range()
+    
+    return attendance_export_response(
+        summary_table(org.id, start, end, member_id=member_id),
+        f"attendance_summary_{start_date or 'all'}_{end_date or 'all'}"
+    )
+
+@attendance_bp.route('/reports/export/records')
+@login_required
+@conditional('attendance')
+def export_attendance_records():
+    """Individual attendance records as CSV or XLSX, streamed in batches"""
+    org = get_default_organization()
+    member_id = request.args.get('member_id', type=int)
+    start_date, end_date, start, end = parse_report_range()
+    
+    return attendance_export_response(
+        records_table(org.id, start, end, member_id=member_id),
+        f"attendance_records_{start_date or 'all'}_{end_date or 'all'}"
+    )
+
 
@@ -0,0 +1,339 @@
+"""
+Indexed text search for the EMS Inventory System
+
+Substring searches (``ilike('%term%')``) can't use an ordinary index, so
+they scan every row. This module backs them with trigram indexes instead,
+chosen from the database in use:
+
+- PostgreSQL: pg_trgm GIN indexes on the searched columns, which the
+  planner uses for ILIKE '%term%' directly; results rank by
+  word_similarity.
+- SQLite: an FTS5 table per searched table using the trigram tokenizer,
+  kept in sync by triggers; results rank by bm25.
+- Anything else (or SEARCH_BACKEND=like): plain ILIKE, unranked.
+
+Trigram indexes only help with terms of three or more characters; shorter
+terms fall back to ILIKE, which on these small result sets is fine.
+
+The navbar typeahead doesn't query the database at all: GlobalSearchIndex
+keeps every searchable name in memory as a sorted word list, so each
+keystroke is a few binary searches.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+import heapq
+from bisect import bisect_left
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import or_, select, func, literal, literal_column, table, column, text, event, inspect
+
+from models import db, Item, Location, InventoryItem, Member, Event
+
+# Columns searched per table
+SEARCH_COLUMNS = {
+    'item': ('name', 'item_number', 'manufacturer'),
+    'location': ('name',),
+    'inventory_item': ('lot_number', 'section'),
+    'member': ('first_name', 'last_name', 'badge_number'),
+    'event': ('title', 'description'),
+}
+
+SEARCH_BACKENDS = ('pg_trgm', 'fts5', 'like')
+MIN_INDEXED_TERM_LENGTH = 3
+
+def search_backend_for(database_uri):
+    """The search backend to use for a SQLAlchemy database URI"""
+    if database_uri.startswith('postgresql'):
+        return 'pg_trgm'
+    if database_uri.startswith('sqlite') and sqlite3.sqlite_version_info >= (3, 34, 0):
+        # The FTS5 trigram tokenizer arrived in SQLite 3.34
+        return 'fts5'
+    return 'like'
+
+def _backend(term):
+    backend = current_app.config.get('SEARCH_BACKEND') or 'like'
+    if backend == 'fts5' and len(term) < MIN_INDEXED_TERM_LENGTH:
+        return 'like'
+    return backend
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+def _fts_query(columns, term):
+    # A quoted string is matched as a substring by the trigram tokenizer
+    phrase = '"' + term.replace('"', '""') + '"'
+    return '{' + ' '.join(columns) + '} : ' + phrase
+
+def _fts_table(table_name):
+    return table(f'{table_name}_fts', column('rowid'))
+
+def text_match(model, term, columns=None):
+    """Clause selecting rows of ``model`` with ``term`` in any of ``columns``.
+
+    ``columns`` defaults to all of the table's SEARCH_COLUMNS. Matching is
+    case-insensitive substring matching, like ilike('%term%').
+    """
+    base = model.__table__
+    columns = columns or SEARCH_COLUMNS[base.name]
+
+    if _backend(term) == 'fts5':
+        fts = _fts_table(base.name)
+        matches = select(fts.c.rowid).where(
+            literal_column(fts.name).op('MATCH')(_fts_query(columns, term))
+        )
+        return base.c.id.in_(matches)
+
+    pattern = _like_pattern(term)
+    return or_(*[base.c[name].ilike(pattern, escape='\\') for name in columns])
+
+def text_rank(model, term, columns=None):
+    """Relevance of each row of ``model`` to ``term``, higher is better.
+
+    Meant for ORDER BY alongside text_match; the like backend doesn't rank
+    and returns a constant.
+    """
+    base = model.__table__
+    columns = columns or SEARCH_COLUMNS[base.name]
+    backend = _backend(term)
+
+    if backend == 'pg_trgm':
+        return func.greatest(*[
+            func.word_similarity(term, func.coalesce(base.c[name], '')) for name in columns
+        ])
+
+    if backend == 'fts5':
+        fts = _fts_table(base.name)
+        # bm25 is lower for better matches
+        return select(-func.bm25(literal_column(fts.name))).where(
+            literal_column(fts.name).op('MATCH')(_fts_query(columns, term)),
+            fts.c.rowid == base.c.id
+        ).scalar_subquery()
+
+    return literal(0)
+
+def _sqlite_index_ddl(table_name, columns):
+    fts = f'{table_name}_fts'
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column_list}, content='{table_name}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table_name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+        # Only searched columns, so quantity updates don't touch the index
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column_list} ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END",
+    ]
+
+def install_search_indexes(connection, rebuild=False):
+    """Create the search indexes for the connection's database.
+
+    SQLite FTS tables are filled from their tables when first created; pass
+    rebuild=True to repopulate existing ones.
+    """
+    dialect_name = connection.dialect.name
+
+    if dialect_name == 'postgresql':
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for table_name, columns in SEARCH_COLUMNS.items():
+            for name in columns:
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{name}_trgm "
+                    f"ON {table_name} USING gin ({name} gin_trgm_ops)"
+                ))
+
+    elif dialect_name == 'sqlite' and search_backend_for('sqlite') == 'fts5':
+        for table_name, columns in SEARCH_COLUMNS.items():
+            exists = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+            ), {'name': f'{table_name}_fts'}).first() is not None
+            for statement in _sqlite_index_ddl(table_name, columns):
+                connection.execute(text(statement))
+            # A new index starts empty, even if its table already has rows
+            if rebuild or not exists:
+                connection.execute(text(f"INSERT INTO {table_name}_fts({table_name}_fts) VALUES ('rebuild')"))
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_indexes(target, connection, **kw):
+    # New databases get their search indexes along with their tables. A
+    # failure (e.g. no permission to create pg_trgm) leaves searches
+    # unindexed rather than failing table creation.
+    try:
+        with connection.begin_nested():
+            install_search_indexes(connection)
+    except Exception as e:
+        print(f"Warning: Could not create search indexes: {e}")
+
+SearchEntry = namedtuple('SearchEntry', 'kind record_id org_id label detail')
+
+# Result order for equally good matches
+SEARCH_KINDS = ('item', 'lot', 'location', 'member', 'event')
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+def _words(*values):
+    words = set()
+    for value in values:
+        if value:
+            words.update(_WORD.findall(value.lower()))
+    return words
+
+class GlobalSearchIndex:
+    """Prefix search over items, lots, locations, members and events.
+
+    Every word of every searchable field is kept in one sorted list, so the
+    entries matching a prefix are a contiguous slice found by binary search.
+    Each word of a query must prefix-match a word of the entry. Writes to
+    the indexed models in this process invalidate the index; changes made
+    by other workers are picked up when it is rebuilt, at most every
+    ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        # (entries, normalized labels, sorted words, entry positions per word),
+        # replaced as a whole so searches never see a half-built index
+        self._snapshot = ([], [], [], [])
+        self._built_at = 0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._stale = True
+
+    def search(self, query, org_id=None, limit=10, per_kind=5):
+        """Best SearchEntry matches for ``query``, at most ``per_kind`` of each kind"""
+        query_words = sorted(_words(query), key=len, reverse=True)
+        if not query_words:
+            return []
+        self._refresh()
+        entries, labels, words, postings = self._snapshot
+
+        matches = None
+        # Longest word first: its slice is the smallest
+        for word in query_words:
+            start = bisect_left(words, word)
+            end = bisect_left(words, word + '\uffff', start)
+            found = set()
+            for position in range(start, end):
+                found.update(postings[position])
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+
+        query_text = ' '.join(_WORD.findall(query.lower()))
+
+        def rank(index):
+            label = labels[index]
+            return (0 if label.startswith(query_text) else 1 if query_text in label else 2, len(label), label)
+
+        # Best few of each kind; ranking every match of a one-letter query
+        # would blow the keystroke budget
+        by_kind = {kind: [] for kind in SEARCH_KINDS}
+        for index in matches:
+            entry = entries[index]
+            if entry.org_id is None or org_id is None or entry.org_id == org_id:
+                by_kind[entry.kind].append(index)
+        best = []
+        for kind_order, kind in enumerate(SEARCH_KINDS):
+            for index in heapq.nsmallest(per_kind, by_kind[kind], key=rank):
+                quality, length, label = rank(index)
+                best.append((quality, kind_order, length, label, index))
+        return [entries[key[-1]] for key in sorted(best)[:limit]]
+
+    def _refresh(self):
+        if not self._stale and time.monotonic() - self._built_at < self.ttl:
+            return
+
+        with self._lock:
+            if not self._stale and time.monotonic() - self._built_at < self.ttl:
+                return
+            # Cleared before reading, so an invalidation during the rebuild
+            # triggers another one
+            self._stale = False
+            self._snapshot = self._build()
+            self._built_at = time.monotonic()
+
+    def _build(self):
+        entries = []
+        index = {}
+
+        def add(entry, *fields):
+            position = len(entries)
+            entries.append(entry)
+            for word in _words(entry.label, *fields):
+                index.setdefault(word, []).append(position)
+
+        for item_id, name, item_number, manufacturer in db.session.query(
+            Item.id, Item.name, Item.item_number, Item.manufacturer
+        ).filter(Item.deleted_at == None, Item.is_active == True):
+            detail = ' · '.join(value for value in (item_number, manufacturer) if value)
+            add(SearchEntry('item', item_id, None, name, detail), item_number, manufacturer)
+
+        for location_id, name, location_type in db.session.query(
+            Location.id, Location.name, Location.location_type
+        ).filter(Location.deleted_at == None, Location.is_active == True):
+            add(SearchEntry('location', location_id, None, name, (location_type or '').replace('_', ' ').title()))
+
+        lots = db.session.query(
+            InventoryItem.lot_number, Item.name, Location.name
+        ).join(Item, InventoryItem.item_id == Item.id).join(
+            Location, InventoryItem.location_id == Location.id
+        ).filter(
+            InventoryItem.deleted_at == None,
+            InventoryItem.is_active == True,
+            InventoryItem.lot_number != None,
+            InventoryItem.lot_number != ''
+        ).distinct()
+        for position, (lot_number, item_name, location_name) in enumerate(lots):
+            add(SearchEntry('lot', position, None, lot_number, f'{item_name} · {location_name}'))
+
+        for member_id, org_id, first_name, last_name, badge_number in db.session.query(
+            Member.id, Member.org_id, Member.first_name, Member.last_name, Member.badge_number
+        ).filter(Member.deleted_at == None):
+            detail = f'Badge {badge_number}' if badge_number else ''
+            add(SearchEntry('member', member_id, org_id, f'{first_name} {last_name}', detail), badge_number)
+
+        for event_id, org_id, title, event_type, starts_at in db.session.query(
+            Event.id, Event.org_id, Event.title, Event.type, Event.starts_at
+        ).filter(Event.deleted_at == None):
+            add(SearchEntry('event', event_id, org_id, title,
+                            f"{event_type.title()} · {starts_at.strftime('%b %d, %Y')}"))
+
+        words = sorted(index)
+        labels = [' '.join(_WORD.findall(entry.label.lower())) for entry in entries]
+        return entries, labels, words, [index[word] for word in words]
+
+search_index = GlobalSearchIndex()
+
+# Attributes whose changes affect the global search index
+_INDEXED_ATTRIBUTES = {
+    Item: ('name', 'item_number', 'manufacturer', 'is_active', 'deleted_at'),
+    Location: ('name', 'location_type', 'is_active', 'deleted_at'),
+    InventoryItem: ('lot_number', 'item_id', 'location_id', 'is_active', 'deleted_at'),
+    Member: ('first_name', 'last_name', 'badge_number', 'deleted_at'),
+    Event: ('title', 'type', 'starts_at', 'deleted_at'),
+}
+
+def _indexed_row_written(mapper, connection, target):
+    search_index.invalidate()
+
+def _indexed_row_updated(mapper, connection, target):
+    # Inventory lines are updated on every count; only some updates matter
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in _INDEXED_ATTRIBUTES[mapper.class_]):
+        search_index.invalidate()
+
+for _model in _INDEXED_ATTRIBUTES:
+    event.listen(_model, 'after_insert', _indexed_row_written)
+    event.listen(_model, 'after_delete', _indexed_row_written)
+    event.listen(_model, 'after_update', _indexed_row_updated)
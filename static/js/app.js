@@ -197,6 +197,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Export functionality - let the existing routes handle the exports
     // No JavaScript intervention needed - the links work directly
+
+    // Filter forms that can reload just their results
+    document.querySelectorAll('form[data-fragment-target]').forEach(setupFragmentFilter);
 });
 
 // Utility functions
@@ -212,6 +215,12 @@ function formatDateTime(dateString) {
     return date.toLocaleString();
 }
 
+function escapeHtml(value) {
+    var div = document.createElement('div');
+    div.textContent = value == null ? '' : String(value);
+    return div.innerHTML;
+}
+
 function showNotification(message, type = 'info') {
     var alertDiv = document.createElement('div');
     alertDiv.className = 'alert alert-' + type + ' alert-dismissible fade show';
@@ -229,3 +238,339 @@ function showNotification(message, type = 'info') {
         bsAlert.close();
     }, 5000);
 }
+
+function generateRequestKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).substr(2, 12);
+}
+
+// POST JSON with an Idempotency-Key, retrying network failures and 5xx
+// responses with backoff. Every attempt sends the same key, so the server
+// replays the first successful response instead of writing twice.
+function postJSON(url, payload, options = {}) {
+    var retries = options.retries !== undefined ? options.retries : 4;
+    var key = options.idempotencyKey || generateRequestKey();
+    var attempt = 0;
+
+    function send() {
+        return fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Idempotency-Key': key
+            },
+            body: JSON.stringify(payload)
+        }).then(function(response) {
+            var inProgress = response.status === 409 && response.headers.get('Retry-After');
+            if ((response.status >= 500 || inProgress) && attempt < retries) {
+                return retry();
+            }
+            return response;
+        }, function(error) {
+            if (attempt < retries) {
+                return retry();
+            }
+            throw error;
+        });
+    }
+
+    function retry() {
+        var delay = Math.min(250 * Math.pow(2, attempt), 4000);
+        attempt++;
+        return new Promise(function(resolve) { setTimeout(resolve, delay); }).then(send);
+    }
+
+    return send();
+}
+
+function registerServiceWorker(url) {
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register(url, {scope: '/'}).catch(function(error) {
+            console.error('Service worker registration failed:', error);
+        });
+    }
+}
+
+function clearOfflineCache() {
+    if ('serviceWorker' in navigator && navigator.serviceWorker.controller) {
+        navigator.serviceWorker.controller.postMessage('clear-cache');
+    }
+}
+
+// Local queue of line edits for one inventory count, kept in localStorage so
+// edits survive losing signal or closing the tab. Edits to the same line are
+// coalesced; flush() sends everything queued to the sync endpoint in one
+// batch and hands the applied and conflicting operations to the callbacks.
+function OfflineEditQueue(inventoryId, syncUrl, callbacks) {
+    this.storageKey = 'inventory-queue-' + inventoryId;
+    this.syncUrl = syncUrl;
+    this.callbacks = callbacks || {};
+    this.flushing = false;
+    this.flushTimeout = null;
+
+    var queue = this;
+    window.addEventListener('online', function() { queue.flush(); });
+}
+
+OfflineEditQueue.prototype.load = function() {
+    try {
+        return JSON.parse(localStorage.getItem(this.storageKey)) || {};
+    } catch (e) {
+        return {};
+    }
+};
+
+OfflineEditQueue.prototype.save = function(operations) {
+    localStorage.setItem(this.storageKey, JSON.stringify(operations));
+    if (this.callbacks.onChange) {
+        this.callbacks.onChange(Object.keys(operations).length, this.flushing);
+    }
+};
+
+OfflineEditQueue.prototype.size = function() {
+    return Object.keys(this.load()).length;
+};
+
+OfflineEditQueue.prototype.enqueue = function(inventoryItemId, values) {
+    var operations = this.load();
+    operations[inventoryItemId] = Object.assign({}, values, {
+        op_id: generateRequestKey(),
+        inventory_item_id: inventoryItemId,
+        client_timestamp: Date.now() / 1000
+    });
+    this.save(operations);
+
+    // Give a counter typing through a row a moment before sending
+    var queue = this;
+    clearTimeout(this.flushTimeout);
+    this.flushTimeout = setTimeout(function() { queue.flush(); }, 1000);
+};
+
+OfflineEditQueue.prototype.flush = function() {
+    var queue = this;
+    var sent = this.load();
+    var opIds = Object.keys(sent).map(function(key) { return sent[key].op_id; });
+    if (this.flushing || !opIds.length || !navigator.onLine) {
+        return Promise.resolve();
+    }
+
+    this.flushing = true;
+    return postJSON(this.syncUrl, {operations: Object.values(sent)}, {retries: 2})
+        .then(function(response) { return response.json(); })
+        .then(function(data) {
+            if (!data.success) {
+                throw new Error(data.error || 'Sync failed');
+            }
+            // Drop what was sent unless the line was edited again meanwhile;
+            // then the newer edit goes out on top of the version just saved
+            var operations = queue.load();
+            data.applied.forEach(function(result) {
+                var pending = operations[result.inventory_item_id];
+                if (pending && opIds.indexOf(pending.op_id) === -1) {
+                    pending.version = result.version;
+                } else {
+                    delete operations[result.inventory_item_id];
+                }
+            });
+            data.conflicts.forEach(function(conflict) {
+                var pending = operations[conflict.inventory_item_id];
+                if (pending && opIds.indexOf(pending.op_id) !== -1) {
+                    delete operations[conflict.inventory_item_id];
+                }
+            });
+            queue.flushing = false;
+            queue.save(operations);
+
+            if (queue.callbacks.onApplied) {
+                data.applied.forEach(function(result) {
+                    queue.callbacks.onApplied(result, sent[result.inventory_item_id]);
+                });
+            }
+            if (queue.callbacks.onConflict) {
+                data.conflicts.forEach(function(conflict) {
+                    var ours = sent[conflict.inventory_item_id];
+                    queue.callbacks.onConflict(conflict, ours);
+                });
+            }
+            if (Object.keys(operations).length) {
+                return queue.flush();
+            }
+        })
+        .catch(function(error) {
+            // Keep everything queued; the next edit or 'online' event retries
+            queue.flushing = false;
+            queue.save(queue.load());
+            console.error('Sync error:', error);
+        });
+};
+
+// Navbar typeahead. Requests are debounced and a newer keystroke aborts the
+// request still in flight, so results never arrive out of order.
+function setupGlobalSearch(input, menu, url) {
+    var icons = {
+        item: 'fa-box', lot: 'fa-barcode', location: 'fa-map-marker-alt',
+        member: 'fa-user', event: 'fa-calendar-alt'
+    };
+    var timer = null;
+    var controller = null;
+    var active = -1;
+
+    function close() {
+        menu.classList.remove('show');
+        active = -1;
+    }
+
+    function highlight(index) {
+        var links = menu.querySelectorAll('a.dropdown-item');
+        links.forEach(function(link, i) { link.classList.toggle('active', i === index); });
+        active = index;
+    }
+
+    function render(results) {
+        menu.innerHTML = '';
+        if (!results.length) {
+            var empty = document.createElement('li');
+            empty.className = 'dropdown-item-text text-muted';
+            empty.textContent = 'No matches';
+            menu.appendChild(empty);
+        }
+        results.forEach(function(result) {
+            var link = document.createElement('a');
+            link.className = 'dropdown-item';
+            link.href = result.url;
+            var icon = document.createElement('i');
+            icon.className = 'fas ' + (icons[result.type] || 'fa-search') + ' me-2 text-muted';
+            var label = document.createElement('span');
+            label.textContent = result.label;
+            link.appendChild(icon);
+            link.appendChild(label);
+            if (result.detail) {
+                var detail = document.createElement('small');
+                detail.className = 'text-muted ms-2';
+                detail.textContent = result.detail;
+                link.appendChild(detail);
+            }
+            var item = document.createElement('li');
+            item.appendChild(link);
+            menu.appendChild(item);
+        });
+        menu.classList.add('show');
+        active = -1;
+    }
+
+    function lookup() {
+        var query = input.value.trim();
+        if (controller) {
+            controller.abort();
+        }
+        if (!query) {
+            close();
+            return;
+        }
+        controller = new AbortController();
+        fetch(url + '?q=' + encodeURIComponent(query), {signal: controller.signal})
+            .then(function(response) { return response.json(); })
+            .then(function(data) {
+                if (data.success) {
+                    render(data.results);
+                }
+            })
+            .catch(function(error) {
+                if (error.name !== 'AbortError') {
+                    console.error('Search error:', error);
+                }
+            });
+    }
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(lookup, 120);
+    });
+
+    input.addEventListener('keydown', function(event) {
+        var links = menu.querySelectorAll('a.dropdown-item');
+        if (event.key === 'ArrowDown' && links.length) {
+            event.preventDefault();
+            highlight((active + 1) % links.length);
+        } else if (event.key === 'ArrowUp' && links.length) {
+            event.preventDefault();
+            highlight((active - 1 + links.length) % links.length);
+        } else if (event.key === 'Enter') {
+            event.preventDefault();
+            var target = links[active >= 0 ? active : 0];
+            if (target) {
+                window.location.href = target.href;
+            }
+        } else if (event.key === 'Escape') {
+            close();
+        }
+    });
+
+    document.addEventListener('click', function(event) {
+        if (!menu.contains(event.target) && event.target !== input) {
+            close();
+        }
+    });
+}
+
+// Filter form that swaps in just its results. The form's GET URL is fetched
+// with fragment=1, which the server answers with the results partial only,
+// and the address bar is updated so reloading or sharing keeps the filters.
+// Without JavaScript (or if the fetch fails) the form loads the full page.
+function setupFragmentFilter(form) {
+    var target = document.querySelector(form.getAttribute('data-fragment-target'));
+    var base = form.getAttribute('action') || window.location.pathname;
+    var timer = null;
+    var controller = null;
+    if (!target) {
+        return;
+    }
+
+    function load() {
+        var query = new URLSearchParams(new FormData(form)).toString();
+        var pageUrl = base + (query ? '?' + query : '');
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+        target.classList.add('fragment-loading');
+        fetch(base + '?' + (query ? query + '&' : '') + 'fragment=1', {signal: controller.signal})
+            .then(function(response) {
+                // A redirect means the session ended; let the full page handle it
+                if (!response.ok || response.redirected) {
+                    throw new Error('Fragment request failed: ' + response.status);
+                }
+                return response.text();
+            })
+            .then(function(html) {
+                target.innerHTML = html;
+                target.classList.remove('fragment-loading');
+                history.replaceState(null, '', pageUrl);
+                form.querySelectorAll('a[data-filter-href]').forEach(function(link) {
+                    link.href = link.getAttribute('data-filter-href') + (query ? '?' + query : '');
+                });
+            })
+            .catch(function(error) {
+                if (error.name !== 'AbortError') {
+                    window.location.href = pageUrl;
+                }
+            });
+    }
+
+    form.addEventListener('submit', function(event) {
+        event.preventDefault();
+        clearTimeout(timer);
+        load();
+    });
+    form.querySelectorAll('select').forEach(function(select) {
+        select.addEventListener('change', load);
+    });
+    form.querySelectorAll('input[type="text"], input[type="search"]').forEach(function(input) {
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(load, 250);
+        });
+    });
+}
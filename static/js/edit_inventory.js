@@ -0,0 +1,588 @@
+// Inventory count page (inventory/edit_inventory.html): live line edits,
+// offline edit queue, and adding, duplicating and removing lines.
+
+// Global variables
+let allItemsData = [];
+// Inventory ID, endpoint URLs and item list, rendered into #editInventoryData
+let pageData = null;
+let selectedItem = null;
+let updateTimeout = null;
+// Last saved state of each line (keyed by inventory item ID), used to merge
+// our edits with changes other counters saved at the same time
+let savedLines = {};
+// Line edits waiting to be synced; counting keeps working without signal
+let editQueue = null;
+
+// Initialize
+document.addEventListener('DOMContentLoaded', function() {
+    pageData = JSON.parse(document.getElementById('editInventoryData').textContent);
+    allItemsData = pageData.allItems;
+    
+    document.querySelectorAll('#inventoryTableBody tr').forEach(row => {
+        savedLines[row.getAttribute('data-inventory-item-id')] = readRowValues(row);
+    });
+    
+    setupOfflineQueue();
+    
+    setupSearch();
+    setupRealTimeUpdates();
+    updateInventorySummary();
+    setupModalEnterKeySupport();
+});
+
+function setupModalEnterKeySupport() {
+    // Add Enter key support for all modals
+    const modals = ['addExistingItemModal', 'editItemModal', 'newItemModal'];
+    
+    modals.forEach(modalId => {
+        const modal = document.getElementById(modalId);
+        if (modal) {
+            // Handle Enter key on form inputs
+            const form = modal.querySelector('form');
+            if (form) {
+                form.addEventListener('keypress', function(e) {
+                    if (e.key === 'Enter') {
+                        e.preventDefault();
+                        // Find the submit button and click it
+                        const submitBtn = modal.querySelector('.btn-primary, .btn-success');
+                        if (submitBtn) {
+                            submitBtn.click();
+                        }
+                    }
+                });
+            }
+            
+            // Handle Enter key on individual inputs for better UX
+            const inputs = modal.querySelectorAll('input, select, textarea');
+            inputs.forEach(input => {
+                input.addEventListener('keypress', function(e) {
+                    if (e.key === 'Enter') {
+                        e.preventDefault();
+                        // Find the submit button and click it
+                        const submitBtn = modal.querySelector('.btn-primary, .btn-success');
+                        if (submitBtn) {
+                            submitBtn.click();
+                        }
+                    }
+                });
+            });
+        }
+    });
+}
+
+function setupSearch() {
+    const searchInput = document.getElementById('itemSearchInput');
+    const searchResults = document.getElementById('searchResults');
+    
+    searchInput.addEventListener('input', function() {
+        const query = this.value.toLowerCase();
+        if (query.length < 2) {
+            searchResults.style.display = 'none';
+            return;
+        }
+        
+        const filteredItems = allItemsData.filter(item => 
+            item.name.toLowerCase().includes(query) ||
+            (item.item_number && item.item_number.toLowerCase().includes(query)) ||
+            (item.manufacturer && item.manufacturer.toLowerCase().includes(query))
+        );
+        
+        displaySearchResults(filteredItems);
+    });
+    
+    document.addEventListener('click', function(e) {
+        if (!searchInput.contains(e.target) && !searchResults.contains(e.target)) {
+            searchResults.style.display = 'none';
+        }
+    });
+}
+
+function displaySearchResults(items) {
+    const searchResults = document.getElementById('searchResults');
+    
+    if (items.length === 0) {
+        searchResults.innerHTML = '<div class="list-group-item text-muted">No items found</div>';
+        searchResults.style.display = 'block';
+        return;
+    }
+    
+    let html = '';
+    items.forEach(item => {
+        const displayName = item.item_number ? `${item.name} (${item.item_number})` : item.name;
+        html += `
+            <div class="list-group-item list-group-item-action" 
+                 onclick="selectItem(${item.id})" 
+                 style="cursor: pointer;">
+                <strong>${escapeHtml(item.name)}</strong>
+                ${item.item_number ? `<br><small class="text-muted">Item #: ${escapeHtml(item.item_number)}</small>` : ''}
+                ${item.manufacturer ? `<br><small class="text-muted">Manufacturer: ${escapeHtml(item.manufacturer)}</small>` : ''}
+            </div>
+        `;
+    });
+    
+    searchResults.innerHTML = html;
+    searchResults.style.display = 'block';
+}
+
+function selectItem(itemId) {
+    selectedItem = allItemsData.find(item => item.id === itemId);
+    const searchInput = document.getElementById('itemSearchInput');
+    const searchResults = document.getElementById('searchResults');
+    
+    if (selectedItem) {
+        searchInput.value = selectedItem.name;
+        searchResults.style.display = 'none';
+        showToast(`Selected: ${selectedItem.name}`, 'success');
+    }
+}
+
+function addSelectedItem() {
+    if (!selectedItem) {
+        showToast('Please search and select an item first', 'warning');
+        return;
+    }
+    
+    // Populate the existing item modal with selected item data
+    document.getElementById('existingItemName').value = selectedItem.name;
+    document.getElementById('existingItemNumber').value = selectedItem.item_number || '';
+    document.getElementById('existingItemManufacturer').value = selectedItem.manufacturer || '';
+    document.getElementById('existingItemRequired').value = selectedItem.is_required ? 'Yes' : 'No';
+    document.getElementById('existingItemQuantity').value = '1';
+    document.getElementById('existingItemExpiration').value = '';
+    document.getElementById('existingItemLotNumber').value = '';
+    if (pageData.hasSections) {
+        document.getElementById('existingItemSection').value = '';
+    }
+    
+    // Show the modal
+    const modal = new bootstrap.Modal(document.getElementById('addExistingItemModal'));
+    modal.show();
+}
+
+function addItemToInventory(itemId, quantity, section = '', expirationDate = '', lotNumber = '') {
+    postJSON(pageData.urls.addItem, {
+        item_id: itemId,
+        quantity: quantity,
+        expiration_date: expirationDate,
+        lot_number: lotNumber,
+        section: section
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Refresh the page to show the new item
+            location.reload();
+        } else {
+            showToast(data.error || 'Failed to add item', 'danger');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showToast('Failed to add item to inventory', 'danger');
+    });
+}
+
+function addExistingItemToInventory() {
+    const quantity = parseInt(document.getElementById('existingItemQuantity').value) || 0;
+    const expirationDate = document.getElementById('existingItemExpiration').value;
+    const lotNumber = document.getElementById('existingItemLotNumber').value.trim();
+    const section = pageData.hasSections ? document.getElementById('existingItemSection').value.trim() : '';
+    
+    if (quantity <= 0) {
+        showToast('Please enter a valid quantity', 'warning');
+        return;
+    }
+    
+    // Add item to inventory via API
+    addItemToInventory(selectedItem.id, quantity, section, expirationDate, lotNumber);
+    
+    // Close modal and reset selection
+    const modal = bootstrap.Modal.getInstance(document.getElementById('addExistingItemModal'));
+    modal.hide();
+    selectedItem = null;
+    document.getElementById('itemSearchInput').value = '';
+}
+
+function editItemRow(button) {
+    const row = button.closest('tr');
+    const itemId = row.getAttribute('data-item-id');
+    
+    // Find the item data from allItemsData
+    const itemData = allItemsData.find(item => item.id == itemId);
+    if (!itemData) {
+        showToast('Item data not found', 'error');
+        return;
+    }
+    
+    // Populate the edit modal with item definition data
+    document.getElementById('editItemId').value = itemId;
+    document.getElementById('editItemName').value = itemData.name;
+    document.getElementById('editItemNumber').value = itemData.item_number || '';
+    document.getElementById('editItemManufacturer').value = itemData.manufacturer || '';
+    document.getElementById('editItemRequired').checked = itemData.is_required;
+    document.getElementById('editItemRequiredQty').value = itemData.required_quantity || 0;
+    document.getElementById('editItemMinThreshold').value = itemData.minimum_threshold || 0;
+    
+    // Show the modal
+    const modal = new bootstrap.Modal(document.getElementById('editItemModal'));
+    modal.show();
+}
+
+function saveEditedItemDefinition() {
+    const itemId = document.getElementById('editItemId').value;
+    const name = document.getElementById('editItemName').value.trim();
+    const itemNumber = document.getElementById('editItemNumber').value.trim();
+    const manufacturer = document.getElementById('editItemManufacturer').value.trim();
+    const isRequired = document.getElementById('editItemRequired').checked;
+    const requiredQty = parseInt(document.getElementById('editItemRequiredQty').value) || 0;
+    const minThreshold = parseInt(document.getElementById('editItemMinThreshold').value) || 0;
+    
+    if (!name) {
+        showToast('Item name is required', 'warning');
+        return;
+    }
+    
+    // Update item definition via API
+    fetch(pageData.urls.updateItemDefinition, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            item_id: itemId,
+            name: name,
+            item_number: itemNumber,
+            manufacturer: manufacturer,
+            is_required: isRequired,
+            required_quantity: requiredQty,
+            minimum_threshold: minThreshold
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showToast('Item definition updated successfully', 'success');
+            
+            // Update the local allItemsData array
+            const itemIndex = allItemsData.findIndex(item => item.id == itemId);
+            if (itemIndex !== -1) {
+                allItemsData[itemIndex] = data.item;
+            }
+            
+            // Close modal and refresh page to show updated data
+            const modal = bootstrap.Modal.getInstance(document.getElementById('editItemModal'));
+            modal.hide();
+            location.reload();
+        } else {
+            showToast(data.error || 'Failed to update item definition', 'danger');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showToast('Failed to update item definition', 'danger');
+    });
+}
+
+function createAndAddNewItem() {
+    const name = document.getElementById('newItemName').value.trim();
+    const itemNumber = document.getElementById('newItemNumber').value.trim();
+    const manufacturer = document.getElementById('newItemManufacturer').value.trim();
+    const isRequired = document.getElementById('newItemRequired').checked;
+    const requiredQty = parseInt(document.getElementById('newItemRequiredQty').value) || 0;
+    const minThreshold = parseInt(document.getElementById('newItemMinThreshold').value) || 0;
+    const quantity = parseInt(document.getElementById('newItemQuantity').value) || 1;
+    const expiration = document.getElementById('newItemExpiration').value;
+    const lotNumber = document.getElementById('newItemLotNumber').value.trim();
+    
+    if (!name) {
+        showToast('Item name is required', 'warning');
+        return;
+    }
+    
+    if (quantity <= 0) {
+        showToast('Quantity must be greater than 0', 'warning');
+        return;
+    }
+    
+    // Create and add item via API
+    postJSON(pageData.urls.createAndAddItem, {
+        name: name,
+        item_number: itemNumber,
+        manufacturer: manufacturer,
+        is_required: isRequired,
+        required_quantity: requiredQty,
+        minimum_threshold: minThreshold,
+        quantity: quantity,
+        expiration_date: expiration,
+        lot_number: lotNumber
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showToast('Item created and added successfully', 'success');
+            // Close modal and refresh page
+            const modal = bootstrap.Modal.getInstance(document.getElementById('newItemModal'));
+            modal.hide();
+            document.getElementById('newItemForm').reset();
+            location.reload();
+        } else {
+            showToast(data.error || 'Failed to create item', 'danger');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showToast('Failed to create and add item', 'danger');
+    });
+}
+
+function removeItemRow(button) {
+    const row = button.closest('tr');
+    const itemId = row.getAttribute('data-item-id');
+    
+    if (confirm('Are you sure you want to remove this item from the inventory?')) {
+        // Remove via API
+        fetch(pageData.urls.removeItem, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                item_id: itemId
+            })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                row.remove();
+                updateInventorySummary();
+                showToast('Item removed from inventory', 'success');
+            } else {
+                showToast(data.error || 'Failed to remove item', 'danger');
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showToast('Failed to remove item', 'danger');
+        });
+    }
+}
+
+function duplicateItemRow(button) {
+    const row = button.closest('tr');
+    const itemId = row.getAttribute('data-item-id');
+    const inventoryItemId = row.getAttribute('data-inventory-item-id');
+    
+    if (confirm('Are you sure you want to duplicate this item?')) {
+        postJSON(pageData.urls.duplicateItem, {
+            item_id: itemId,
+            inventory_item_id: inventoryItemId
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                showToast('Item duplicated successfully', 'success');
+                location.reload(); // Refresh to show the new item
+            } else {
+                showToast(data.error || 'Failed to duplicate item', 'danger');
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showToast('Failed to duplicate item', 'danger');
+        });
+    }
+}
+
+function setupRealTimeUpdates() {
+    // Add event listeners to all input fields
+    document.addEventListener('input', function(e) {
+        if (e.target.classList.contains('quantity-input') || 
+            e.target.classList.contains('expiration-input') || 
+            e.target.classList.contains('lot-number-input') ||
+            e.target.classList.contains('section-input')) { // Added section-input
+            
+            // Debounce updates to avoid too many API calls
+            clearTimeout(updateTimeout);
+            updateTimeout = setTimeout(() => {
+                updateInventoryItem(e.target);
+            }, 500);
+        }
+    });
+}
+
+function readRowValues(row) {
+    const sectionInput = row.querySelector('.section-input');
+    return {
+        quantity: parseInt(row.querySelector('.quantity-input').value) || 0,
+        expiration_date: row.querySelector('.expiration-input').value,
+        lot_number: row.querySelector('.lot-number-input').value.trim(),
+        // Get section value if it exists (only for locations with sections)
+        section: sectionInput ? sectionInput.value.trim() : '',
+        version: parseInt(row.getAttribute('data-version')) || null
+    };
+}
+
+function writeRowValues(row, values) {
+    row.querySelector('.quantity-input').value = values.quantity;
+    row.querySelector('.expiration-input').value = values.expiration_date;
+    row.querySelector('.lot-number-input').value = values.lot_number;
+    const sectionInput = row.querySelector('.section-input');
+    if (sectionInput) {
+        sectionInput.value = values.section;
+    }
+}
+
+function updateInventoryItem(input) {
+    saveInventoryRow(input.closest('tr'));
+}
+
+function saveInventoryRow(row) {
+    // Queue the edit locally; the queue syncs it whenever there is signal
+    editQueue.enqueue(row.getAttribute('data-inventory-item-id'), readRowValues(row));
+}
+
+function findInventoryRow(inventoryItemId) {
+    return document.querySelector(`#inventoryTableBody tr[data-inventory-item-id="${inventoryItemId}"]`);
+}
+
+function setupOfflineQueue() {
+    editQueue = new OfflineEditQueue(pageData.inventoryId, pageData.urls.sync, {
+        onChange: updateSyncStatus,
+        onApplied: function(result, sent) {
+            const row = findInventoryRow(result.inventory_item_id);
+            savedLines[result.inventory_item_id] = Object.assign({}, sent, {version: result.version});
+            if (!row) {
+                return;
+            }
+            row.setAttribute('data-version', result.version);
+            // A quantity of 0 removed the line
+            if (!result.is_active) {
+                row.remove();
+                delete savedLines[result.inventory_item_id];
+            }
+            updateInventorySummary();
+        },
+        onConflict: function(conflict, ours) {
+            const row = findInventoryRow(conflict.inventory_item_id);
+            if (row) {
+                reconcileInventoryRow(row, ours, conflict.current);
+            }
+        }
+    });
+    
+    // Edits queued before a reload (e.g. the page came from the offline
+    // cache) are shown on top of the counts the page was rendered with
+    const pending = editQueue.load();
+    Object.keys(pending).forEach(inventoryItemId => {
+        const row = findInventoryRow(inventoryItemId);
+        if (row) {
+            writeRowValues(row, pending[inventoryItemId]);
+        }
+    });
+    
+    window.addEventListener('online', () => updateSyncStatus(editQueue.size(), false));
+    window.addEventListener('offline', () => updateSyncStatus(editQueue.size(), false));
+    updateSyncStatus(editQueue.size(), false);
+    editQueue.flush();
+}
+
+function updateSyncStatus(pendingCount, syncing) {
+    const status = document.getElementById('syncStatus');
+    if (!pendingCount) {
+        status.className = 'badge bg-light text-dark ms-2';
+        status.innerHTML = '<i class="fas fa-check me-1"></i>All changes saved';
+    } else if (!navigator.onLine) {
+        status.className = 'badge bg-warning text-dark ms-2';
+        status.innerHTML = `<i class="fas fa-wifi me-1"></i>Offline - ${pendingCount} change${pendingCount === 1 ? '' : 's'} saved on this device`;
+    } else {
+        status.className = 'badge bg-info text-dark ms-2';
+        status.innerHTML = `<i class="fas fa-sync me-1"></i>Syncing ${pendingCount} change${pendingCount === 1 ? '' : 's'}`;
+    }
+}
+
+function reconcileInventoryRow(row, ours, theirs) {
+    // Three-way merge of a line someone else saved while we were editing it:
+    // fields only they changed take their value, fields only we changed keep
+    // ours, and fields we both changed differently take theirs and are flagged.
+    const inventoryItemId = row.getAttribute('data-inventory-item-id');
+    const base = savedLines[inventoryItemId] || ours;
+    
+    if (!theirs || !theirs.is_active) {
+        row.remove();
+        delete savedLines[inventoryItemId];
+        updateInventorySummary();
+        showToast('This item was removed by another counter', 'warning');
+        return;
+    }
+    
+    const fields = ['quantity', 'expiration_date', 'lot_number', 'section'];
+    const merged = {};
+    const clashes = [];
+    fields.forEach(field => {
+        if (ours[field] === base[field]) {
+            merged[field] = theirs[field];
+        } else if (theirs[field] === base[field] || theirs[field] === ours[field]) {
+            merged[field] = ours[field];
+        } else {
+            merged[field] = theirs[field];
+            clashes.push(field.replace('_', ' '));
+        }
+    });
+    
+    savedLines[inventoryItemId] = theirs;
+    row.setAttribute('data-version', theirs.version);
+    writeRowValues(row, merged);
+    updateInventorySummary();
+    
+    if (clashes.length) {
+        row.classList.add('table-warning');
+        showToast(`Another counter also changed ${clashes.join(', ')} - their value was kept`, 'warning');
+    }
+    
+    // Save whatever we still have to add on top of their version
+    if (fields.some(field => merged[field] !== theirs[field])) {
+        saveInventoryRow(row);
+    }
+}
+
+function updateInventorySummary() {
+    const tbody = document.getElementById('inventoryTableBody');
+    const rows = tbody.querySelectorAll('tr');
+    
+    let totalItems = 0;
+    let totalQuantity = 0;
+    
+    rows.forEach(row => {
+        const quantityInput = row.querySelector('.quantity-input');
+        if (quantityInput && quantityInput.value) {
+            const quantity = parseInt(quantityInput.value) || 0;
+            if (quantity > 0) {
+                totalItems++;
+                totalQuantity += quantity;
+            }
+        }
+    });
+    
+    document.getElementById('itemCount').textContent = totalItems;
+    document.getElementById('totalQuantity').textContent = totalQuantity;
+}
+
+function showToast(message, type = 'info') {
+    const toast = document.createElement('div');
+    toast.className = `alert alert-${type} alert-dismissible fade show position-fixed`;
+    toast.style.top = '20px';
+    toast.style.right = '20px';
+    toast.style.zIndex = '9999';
+    toast.innerHTML = `
+        <i class="fas fa-${type === 'success' ? 'check' : type === 'warning' ? 'exclamation-triangle' : type === 'danger' ? 'times' : 'info-circle'} me-2"></i>${message}
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+    document.body.appendChild(toast);
+    
+    // Auto-remove toast after 3 seconds
+    setTimeout(() => {
+        if (toast.parentNode) {
+            toast.parentNode.removeChild(toast);
+        }
+    }, 3000);
+}
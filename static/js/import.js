@@ -0,0 +1,111 @@
+// Import tool (inventory/import.html): choose an import type and upload
+// the file for review.
+
+let currentImportType = 'items';
+// Endpoint URLs, rendered into #importData
+const importUrls = JSON.parse(document.getElementById('importData').textContent);
+
+function startImport(type) {
+    currentImportType = type;
+    document.getElementById('itemsImport').checked = (type === 'items');
+    document.getElementById('inventoryImport').checked = (type === 'inventory');
+    
+    const modal = new bootstrap.Modal(document.getElementById('uploadModal'));
+    modal.show();
+}
+
+function uploadFile() {
+    const fileInput = document.getElementById('importFile');
+    const file = fileInput.files[0];
+    
+    if (!file) {
+        showToast('Please select a file to upload.', 'error');
+        return;
+    }
+    
+    // Check file size (10MB limit)
+    if (file.size > 10 * 1024 * 1024) {
+        showToast('File size exceeds 10MB limit.', 'error');
+        return;
+    }
+    
+    // Show progress modal
+    const progressModal = new bootstrap.Modal(document.getElementById('progressModal'));
+    progressModal.show();
+    
+    // Hide upload modal
+    const uploadModal = bootstrap.Modal.getInstance(document.getElementById('uploadModal'));
+    uploadModal.hide();
+    
+    // Create FormData and upload
+    const formData = new FormData();
+    formData.append('file', file);
+    
+    fetch(importUrls.upload, {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        progressModal.hide();
+        
+        if (data.success) {
+            showToast(`File processed successfully! ${data.total_rows} rows found.`, 'success');
+            
+            if (data.has_duplicates) {
+                showToast(`${data.duplicate_count} duplicate items found. You'll need to review these.`, 'warning');
+            }
+            
+            // Redirect to review page
+            setTimeout(() => {
+                window.location.href = importUrls.review;
+            }, 1500);
+        } else {
+            showToast(`Error: ${data.error}`, 'error');
+        }
+    })
+    .catch(error => {
+        progressModal.hide();
+        showToast('Upload failed. Please try again.', 'error');
+        console.error('Error:', error);
+    });
+}
+
+// Show toast notification
+function showToast(message, type = 'info') {
+    const toastContainer = document.getElementById('toastContainer') || createToastContainer();
+    
+    const toast = document.createElement('div');
+    toast.className = `toast align-items-center text-white bg-${type === 'error' ? 'danger' : type === 'success' ? 'success' : type === 'warning' ? 'warning' : 'info'} border-0`;
+    toast.setAttribute('role', 'alert');
+    toast.setAttribute('aria-live', 'assertive');
+    toast.setAttribute('aria-atomic', 'true');
+    
+    toast.innerHTML = `
+        <div class="d-flex">
+            <div class="toast-body">
+                ${message}
+            </div>
+            <button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast" aria-label="Close"></button>
+        </div>
+    `;
+    
+    toastContainer.appendChild(toast);
+    
+    const bsToast = new bootstrap.Toast(toast);
+    bsToast.show();
+    
+    // Remove toast after it's hidden
+    toast.addEventListener('hidden.bs.toast', () => {
+        toast.remove();
+    });
+}
+
+function createToastContainer() {
+    const container = document.createElement('div');
+    container.id = 'toastContainer';
+    container.className = 'toast-container position-fixed top-0 end-0 p-3';
+    container.style.zIndex = '9999';
+    document.body.appendChild(container);
+    return container;
+}
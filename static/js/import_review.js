@@ -0,0 +1,134 @@
+// Import review (inventory/import_review.html): resolve duplicate items,
+// then commit the import.
+
+// Duplicate count and endpoint URLs, rendered into #importReviewData
+const importReview = JSON.parse(document.getElementById('importReviewData').textContent);
+
+function processDuplicates() {
+    // Collect all duplicate decisions
+    const decisions = {};
+    let allDecisionsMade = true;
+    
+    for (let index = 0; index < importReview.duplicateCount; index++) {
+        const selectedRadio = document.querySelector(`input[name="duplicate_${index}"]:checked`);
+        
+        if (selectedRadio) {
+            decisions[String(index)] = selectedRadio.value;
+        } else {
+            allDecisionsMade = false;
+        }
+    }
+    
+    if (!allDecisionsMade) {
+        showToast('Please make a decision for all duplicate items.', 'warning');
+        return;
+    }
+    
+    // Send decisions to server
+    fetch(importReview.urls.processDuplicates, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ decisions: decisions })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showToast('Duplicate decisions processed successfully!', 'success');
+            
+            // Enable commit button
+            document.getElementById('commitBtn').disabled = false;
+            document.getElementById('commitBtn').innerHTML = '<i class="fas fa-check me-2"></i>Commit Import';
+            document.getElementById('commitBtn').className = 'btn btn-success';
+            
+            // Hide duplicate section
+            setTimeout(() => {
+                location.reload();
+            }, 1500);
+        } else {
+            showToast(`Error: ${data.error}`, 'error');
+        }
+    })
+    .catch(error => {
+        showToast('Error processing duplicates. Please try again.', 'error');
+        console.error('Error:', error);
+    });
+}
+
+function commitImport() {
+    if (!confirm('Are you sure you want to commit this import? This action cannot be undone.')) {
+        return;
+    }
+    
+    // Show progress modal
+    const commitModal = new bootstrap.Modal(document.getElementById('commitModal'));
+    commitModal.show();
+    
+    // Send commit request
+    fetch(importReview.urls.commit, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        commitModal.hide();
+        
+        if (data.success) {
+            showToast(data.message, 'success');
+            
+            // Redirect to dashboard after successful import
+            setTimeout(() => {
+                window.location.href = importReview.urls.dashboard;
+            }, 2000);
+        } else {
+            showToast(`Error: ${data.error}`, 'error');
+        }
+    })
+    .catch(error => {
+        commitModal.hide();
+        showToast('Error committing import. Please try again.', 'error');
+        console.error('Error:', error);
+    });
+}
+
+// Show toast notification
+function showToast(message, type = 'info') {
+    const toastContainer = document.getElementById('toastContainer') || createToastContainer();
+    
+    const toast = document.createElement('div');
+    toast.className = `toast align-items-center text-white bg-${type === 'error' ? 'danger' : type === 'success' ? 'success' : type === 'warning' ? 'warning' : 'info'} border-0`;
+    toast.setAttribute('role', 'alert');
+    toast.setAttribute('aria-live', 'assertive');
+    toast.setAttribute('aria-atomic', 'true');
+    
+    toast.innerHTML = `
+        <div class="d-flex">
+            <div class="toast-body">
+                ${message}
+            </div>
+            <button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast" aria-label="Close"></button>
+        </div>
+    `;
+    
+    toastContainer.appendChild(toast);
+    
+    const bsToast = new bootstrap.Toast(toast);
+    bsToast.show();
+    
+    // Remove toast after it's hidden
+    toast.addEventListener('hidden.bs.toast', () => {
+        toast.remove();
+    });
+}
+
+function createToastContainer() {
+    const container = document.createElement('div');
+    container.id = 'toastContainer';
+    container.className = 'toast-container position-fixed top-0 end-0 p-3';
+    container.style.zIndex = '9999';
+    document.body.appendChild(container);
+    return container;
+}
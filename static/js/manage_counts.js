@@ -0,0 +1,117 @@
+// Inventory count management (inventory/manage_counts.html): delete one
+// count or clear them all.
+
+// Endpoint URLs, rendered into #manageCountsData
+const manageCountsUrls = JSON.parse(document.getElementById('manageCountsData').textContent);
+
+let countToDelete = null;
+
+function confirmDeleteCount(inventoryId, locationName, date) {
+    countToDelete = inventoryId;
+    document.getElementById('deleteLocationName').textContent = locationName;
+    document.getElementById('deleteDate').textContent = date;
+    
+    const modal = new bootstrap.Modal(document.getElementById('deleteCountModal'));
+    modal.show();
+}
+
+document.getElementById('confirmDeleteBtn').addEventListener('click', function() {
+    // Hide first modal and show final confirmation
+    bootstrap.Modal.getInstance(document.getElementById('deleteCountModal')).hide();
+    
+    const finalModal = new bootstrap.Modal(document.getElementById('finalDeleteModal'));
+    finalModal.show();
+});
+
+document.getElementById('deleteConfirmationInput').addEventListener('input', function() {
+    const deleteBtn = document.getElementById('finalDeleteBtn');
+    deleteBtn.disabled = this.value !== 'DELETE';
+});
+
+document.getElementById('finalDeleteBtn').addEventListener('click', function() {
+    if (countToDelete) {
+        deleteInventoryCount(countToDelete);
+    }
+});
+
+function deleteInventoryCount(inventoryId) {
+    fetch(manageCountsUrls.deleteCount.replace('0', inventoryId), {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showToast('Inventory count deleted successfully', 'success');
+            // Close modal and refresh page
+            bootstrap.Modal.getInstance(document.getElementById('finalDeleteModal')).hide();
+            location.reload();
+        } else {
+            showToast(data.error || 'Failed to delete inventory count', 'danger');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showToast('Failed to delete inventory count', 'danger');
+    });
+}
+
+function showToast(message, type = 'info') {
+    // Create toast notification
+    const toastDiv = document.createElement('div');
+    toastDiv.className = `alert alert-${type} alert-dismissible fade show position-fixed`;
+    toastDiv.style.cssText = 'top: 20px; right: 20px; z-index: 9999; min-width: 300px;';
+    toastDiv.innerHTML = `
+        ${message}
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+    
+    document.body.appendChild(toastDiv);
+    
+    // Auto-remove after 5 seconds
+    setTimeout(() => {
+        if (toastDiv.parentNode) {
+            toastDiv.parentNode.removeChild(toastDiv);
+        }
+    }, 5000);
+}
+
+function confirmClearAllInventories() {
+    const modal = new bootstrap.Modal(document.getElementById('clearAllInventoriesModal'));
+    modal.show();
+}
+
+document.getElementById('clearAllConfirmationInput').addEventListener('input', function() {
+    const clearBtn = document.getElementById('confirmClearAllBtn');
+    clearBtn.disabled = this.value !== 'CLEAR ALL';
+});
+
+document.getElementById('confirmClearAllBtn').addEventListener('click', function() {
+    clearAllInventories();
+});
+
+function clearAllInventories() {
+    fetch(manageCountsUrls.clearAll, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showToast(data.message, 'success');
+            // Close modal and refresh page
+            bootstrap.Modal.getInstance(document.getElementById('clearAllInventoriesModal')).hide();
+            location.reload();
+        } else {
+            showToast(data.error || 'Failed to clear inventories', 'danger');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showToast('Failed to clear inventories', 'danger');
+    });
+}
@@ -0,0 +1,97 @@
+// Service worker for offline inventory counting.
+// Pages are fetched network-first and fall back to the last copy seen, so a
+// count page opened with signal keeps working once the signal drops. Static
+// assets are served from cache and refreshed in the background, except
+// fingerprinted ones (app.<hash>.js), which never change. Writes are
+// never intercepted; the count page queues them itself (see app.js).
+
+const CACHE_NAME = 'ems-offline-v1';
+const FINGERPRINTED = /\.[0-9a-f]{12}\.[a-z0-9]+$/;
+
+self.addEventListener('install', function(event) {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', function(event) {
+    event.waitUntil(
+        caches.keys().then(function(names) {
+            return Promise.all(names
+                .filter(function(name) { return name !== CACHE_NAME; })
+                .map(function(name) { return caches.delete(name); }));
+        }).then(function() {
+            return self.clients.claim();
+        })
+    );
+});
+
+self.addEventListener('message', function(event) {
+    // Sent on logout so one member's pages are not left for the next
+    if (event.data === 'clear-cache') {
+        event.waitUntil(caches.delete(CACHE_NAME));
+    }
+});
+
+self.addEventListener('fetch', function(event) {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    const url = new URL(request.url);
+    if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request));
+    } else if (url.pathname.startsWith('/static/') && FINGERPRINTED.test(url.pathname)) {
+        event.respondWith(cacheFirst(request));
+    } else if (url.origin !== self.location.origin || url.pathname.startsWith('/static/')) {
+        event.respondWith(staleWhileRevalidate(request));
+    }
+});
+
+function networkFirst(request) {
+    return fetch(request).then(function(response) {
+        // Don't keep redirects (e.g. to the login page) in place of the page
+        if (response.ok && !response.redirected) {
+            const copy = response.clone();
+            caches.open(CACHE_NAME).then(function(cache) { cache.put(request, copy); });
+        }
+        return response;
+    }).catch(function() {
+        return caches.match(request).then(function(cached) {
+            return cached || new Response(
+                '<h3 style="font-family: sans-serif">You are offline and this page has not been opened before.</h3>',
+                {status: 503, headers: {'Content-Type': 'text/html'}}
+            );
+        });
+    });
+}
+
+function cacheFirst(request) {
+    return caches.open(CACHE_NAME).then(function(cache) {
+        return cache.match(request).then(function(cached) {
+            return cached || fetch(request).then(function(response) {
+                if (response.ok) {
+                    cache.put(request, response.clone());
+                }
+                return response;
+            });
+        });
+    });
+}
+
+function staleWhileRevalidate(request) {
+    return caches.open(CACHE_NAME).then(function(cache) {
+        return cache.match(request).then(function(cached) {
+            const fetched = fetch(request).then(function(response) {
+                if (response.ok || response.type === 'opaque') {
+                    cache.put(request, response.clone());
+                }
+                return response;
+            });
+            if (cached) {
+                fetched.catch(function() {});
+                return cached;
+            }
+            return fetched;
+        });
+    });
+}
@@ -0,0 +1,178 @@
+"""
+Stock movement ledger for the EMS Inventory System
+
+Every change to the quantity at a location is recorded as a typed, signed
+StockMovement row. Balances are derived from the newest StockSnapshot for a
+location/item plus the movements recorded after it; compact_ledger()
+periodically folds those movements into fresh snapshots so balance lookups
+stay cheap and history queries only walk a bounded tail.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import func, and_
+
+from models import db, StockMovement, StockSnapshot
+
+MOVEMENT_TYPES = ('receive', 'use', 'transfer', 'adjust', 'expire')
+
+# Movements younger than this are left for the next compaction run, so rows
+# from transactions still in flight are never skipped over
+COMPACTION_SETTLE_SECONDS = 60
+
+def record_movement(movement_type, location_id, item_id, quantity, inventory_item_id=None,
+                    lot_number=None, notes=None, user_id=None):
+    """Add a movement to the current session (the caller commits).
+
+    Zero-quantity movements are skipped and None is returned.
+    """
+    if movement_type not in MOVEMENT_TYPES:
+        raise ValueError(f'Unknown movement type: {movement_type}')
+
+    if not quantity:
+        return None
+
+    movement = StockMovement(
+        location_id=location_id,
+        item_id=item_id,
+        inventory_item_id=inventory_item_id,
+        movement_type=movement_type,
+        quantity=quantity,
+        lot_number=lot_number,
+        notes=notes,
+        user_id=user_id,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(movement)
+    return movement
+
+def _latest_snapshot(location_id, item_id):
+    return StockSnapshot.query.filter_by(
+        location_id=location_id,
+        item_id=item_id
+    ).order_by(StockSnapshot.last_movement_id.desc()).first()
+
+def get_balance(location_id, item_id):
+    """Current balance for one item at one location"""
+    snapshot = _latest_snapshot(location_id, item_id)
+    base_quantity = snapshot.quantity if snapshot else 0
+    after_id = snapshot.last_movement_id if snapshot else 0
+
+    tail = db.session.query(func.coalesce(func.sum(StockMovement.quantity), 0)).filter(
+        StockMovement.location_id == location_id,
+        StockMovement.item_id == item_id,
+        StockMovement.id > after_id
+    ).scalar()
+
+    return base_quantity + (tail or 0)
+
+def _latest_snapshots_query(location_id=None):
+    """Newest snapshot row per location/item, optionally for one location"""
+    newest = db.session.query(
+        StockSnapshot.location_id,
+        StockSnapshot.item_id,
+        func.max(StockSnapshot.last_movement_id).label('last_movement_id')
+    )
+    if location_id is not None:
+        newest = newest.filter(StockSnapshot.location_id == location_id)
+    newest = newest.group_by(StockSnapshot.location_id, StockSnapshot.item_id).subquery()
+
+    return db.session.query(StockSnapshot).join(
+        newest, and_(
+            StockSnapshot.location_id == newest.c.location_id,
+            StockSnapshot.item_id == newest.c.item_id,
+            StockSnapshot.last_movement_id == newest.c.last_movement_id
+        )
+    )
+
+def _compacted_through():
+    """Highest movement id already folded into snapshots"""
+    return db.session.query(func.max(StockSnapshot.last_movement_id)).scalar() or 0
+
+def get_balances(location_id):
+    """Current balance of every item ever moved at a location, as {item_id: quantity}"""
+    balances = {
+        snapshot.item_id: snapshot.quantity
+        for snapshot in _latest_snapshots_query(location_id).all()
+    }
+
+    tails = db.session.query(
+        StockMovement.item_id,
+        func.sum(StockMovement.quantity)
+    ).filter(
+        StockMovement.location_id == location_id,
+        StockMovement.id > _compacted_through()
+    ).group_by(StockMovement.item_id).all()
+
+    for item_id, quantity in tails:
+        balances[item_id] = balances.get(item_id, 0) + (quantity or 0)
+
+    return balances
+
+def get_movement_history(location_id, item_id, limit=100):
+    """Most recent movements, newest first, each with the balance after it"""
+    movements = StockMovement.query.filter_by(
+        location_id=location_id,
+        item_id=item_id
+    ).order_by(StockMovement.id.desc()).limit(limit).all()
+
+    balance = get_balance(location_id, item_id)
+    history = []
+    for movement in movements:
+        history.append({
+            'id': movement.id,
+            'movement_type': movement.movement_type,
+            'quantity': movement.quantity,
+            'balance': balance,
+            'lot_number': movement.lot_number,
+            'inventory_item_id': movement.inventory_item_id,
+            'notes': movement.notes,
+            'user_id': movement.user_id,
+            'created_at': movement.created_at.isoformat() if movement.created_at else None
+        })
+        balance -= movement.quantity
+
+    return history
+
+def compact_ledger():
+    """Fold unfolded movements into new snapshot rows.
+
+    Movements are never deleted, so history stays complete; compaction only
+    bounds how many of them a balance lookup has to sum. Returns the number
+    of snapshots written.
+    """
+    floor_id = _compacted_through()
+    settled_before = datetime.utcnow() - timedelta(seconds=COMPACTION_SETTLE_SECONDS)
+    high_water_mark = db.session.query(func.max(StockMovement.id)).filter(
+        StockMovement.id > floor_id,
+        StockMovement.created_at <= settled_before
+    ).scalar()
+    if not high_water_mark:
+        return 0
+
+    totals = db.session.query(
+        StockMovement.location_id,
+        StockMovement.item_id,
+        func.sum(StockMovement.quantity),
+        func.max(StockMovement.id)
+    ).filter(
+        StockMovement.id > floor_id,
+        StockMovement.id <= high_water_mark
+    ).group_by(StockMovement.location_id, StockMovement.item_id).all()
+
+    snapshots = {
+        (snapshot.location_id, snapshot.item_id): snapshot
+        for snapshot in _latest_snapshots_query().all()
+    }
+
+    for location_id, item_id, total, last_id in totals:
+        snapshot = snapshots.get((location_id, item_id))
+        db.session.add(StockSnapshot(
+            location_id=location_id,
+            item_id=item_id,
+            quantity=(snapshot.quantity if snapshot else 0) + total,
+            last_movement_id=last_id,
+            created_at=datetime.utcnow()
+        ))
+
+    db.session.commit()
+    return len(totals)
@@ -0,0 +1,44 @@
+"""
+Template bytecode cache for the EMS Inventory System
+
+Compiled templates are written to TEMPLATE_CACHE_DIR, so a new gunicorn
+worker loads them instead of compiling every template on its first hit.
+Jinja keys each file by the template's source checksum and Python version,
+so edited templates are recompiled on their own. precompile_templates.py
+fills the cache at deploy time, and with TEMPLATE_PRELOAD each worker
+loads every template while it starts, before taking requests.
+"""
+
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+def init_template_cache(app):
+    directory = app.config.get('TEMPLATE_CACHE_DIR')
+    if not directory:
+        return
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        print(f"Warning: Could not create template cache directory {directory}: {e}")
+        return
+    # Jinja fails the render if it can't write a compiled template
+    if not os.access(directory, os.W_OK):
+        print(f"Warning: Template cache directory {directory} is not writable; templates will compile in memory")
+        return
+
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    if app.config.get('TEMPLATE_PRELOAD'):
+        try:
+            preload_templates(app)
+        except Exception as e:
+            print(f"Warning: Could not preload templates: {e}")
+
+def preload_templates(app):
+    """Load (and compile, if not cached yet) every template; returns how many"""
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for the member roster import (run with pytest)
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_member_import.db')
+
+from app import app
+from models import db, Organization, Member
+from member_import import plan_member_import, apply_member_import
+
+def _row(row_number, badge, first_name, last_name):
+    return (row_number, {'Badge Number': badge, 'First Name': first_name, 'Last Name': last_name,
+                         'Email': '', 'Phone': '', 'Membership Type': ''})
+
+def test_rows_without_badge_never_match_a_blank_badge():
+    with app.app_context():
+        db.create_all()
+        org = Organization(name='Import Test', is_active=True)
+        db.session.add(org)
+        db.session.commit()
+        # new_member and the member edit form save an empty badge as ''
+        blank = Member(org_id=org.id, first_name='Blank', last_name='Badge', badge_number='')
+        badged = Member(org_id=org.id, first_name='Old', last_name='Name', badge_number='B7')
+        db.session.add_all([blank, badged])
+        db.session.commit()
+
+        plan = plan_member_import(org.id, [
+            _row(2, '', 'Ann', 'Lee'),
+            _row(3, '', 'Bob', 'Ray'),
+            _row(4, ' b7 ', 'New', 'Name'),
+        ])
+        assert len(plan.creates) == 2
+        assert [update['id'] for update in plan.updates] == [badged.id]
+        assert not plan.errors
+
+        apply_member_import(plan)
+        db.session.commit()
+        db.session.expire_all()
+        assert (blank.first_name, blank.last_name) == ('Blank', 'Badge')
+        assert badged.first_name == 'New'
+        assert Member.query.filter_by(org_id=org.id).count() == 4
+
+if __name__ == '__main__':
+    test_rows_without_badge_never_match_a_blank_badge()
+    print("✅ Member import tests passed")